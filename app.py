@@ -1,6 +1,5 @@
-import os, re, json
+import os, json
 from datetime import datetime
-from html import unescape, escape
 from flask import Flask, render_template, abort, request, redirect, url_for, flash, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.exc import IntegrityError
@@ -32,98 +31,25 @@ class Article(db.Model):
     text = db.Column(db.Text, default="")              # ПОЛНЫЙ текст / HTML
     section = db.Column(db.String(20), default="list") # main | side | list
     tags = db.Column(db.Text)                          # "economy, МВД, коррупция"
+    content_hash = db.Column(db.String(64))            # sha256 для sync_articles; NULL — пересчитать
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 with app.app_context():
     db.create_all()
+    # create_all не меняет существующие таблицы: колонку из поздней миграции добавляем сами
+    from scripts.migrate_add_content_hash import add_column as _add_content_hash
+    _add_content_hash(db.engine)
 
-# ── helpers: тизер и форматирование plain-текста ─────────────────────────────
-TAG_RE = re.compile(r"<[^>]+>")
-WS_RE  = re.compile(r"\s+")
-FIGURE_BLOCK_RE = re.compile(
-    r'<figure[^>]*class="[^"]*article-hero[^"]*"[^>]*>.*?</figure>',
-    re.I | re.S
-)
-TAG_PRESENT_RE = re.compile(
-    r"</?(p|br|ul|ol|li|h[1-6]|figure|img|blockquote|pre|code|div|span)\b",
-    re.I,
-)
-LIST_LINE_RE   = re.compile(r"^\s*([-*•])\s+")
-SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+")
-
-def strip_html(html_text: str) -> str:
-    if not html_text:
-        return ""
-    s = TAG_RE.sub(" ", html_text)
-    s = unescape(s)
-    return WS_RE.sub(" ", s).strip()
-
-def teaser_source_text(html_text: str) -> str:
-    cleaned = FIGURE_BLOCK_RE.sub("", html_text or "")
-    return strip_html(cleaned)
-
-def make_teaser(html_text: str, max_len: int = 220) -> str:
-    plain = teaser_source_text(html_text)
-    if len(plain) <= max_len:
-        return plain
-    cut = plain[:max_len].rsplit(" ", 1)[0]
-    return cut + "…"
-
-def _paragraphs_from_plain(s: str, target_len: int = 600):
-    sentences = SENTENCE_SPLIT.split(s.strip())
-    out, buf, cur_len = [], [], 0
-    for sent in sentences:
-        if not sent:
-            continue
-        buf.append(sent); cur_len += len(sent)
-        if cur_len >= target_len:
-            out.append(" ".join(buf).strip()); buf, cur_len = [], 0
-    if buf:
-        out.append(" ".join(buf).strip())
-    return out or ([s.strip()] if s.strip() else [])
-
-def ensure_html(text: str) -> str:
-    """Если нет HTML — делаем p/ul автоматически."""
-    if not text:
-        return ""
-    if TAG_PRESENT_RE.search(text):
-        return text
-    raw = text.replace("\r\n", "\n").replace("\r", "\n").strip()
-    blocks = re.split(r"\n{2,}", raw)
-    html_blocks = []
-    if len(blocks) == 1:
-        for para in _paragraphs_from_plain(raw):
-            html_blocks.append(f"<p>{escape(para)}</p>")
-        return "\n".join(html_blocks)
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-        lines = block.split("\n")
-        if all(LIST_LINE_RE.match(line or "") for line in lines):
-            items = []
-            for line in lines:
-                item = LIST_LINE_RE.sub("", line).strip()
-                if item:
-                    items.append(f"<li>{escape(item)}</li>")
-            if items:
-                html_blocks.append("<ul>\n" + "\n".join(items) + "\n</ul>")
-        else:
-            joined = " ".join(l.strip() for l in lines if l.strip())
-            if joined:
-                html_blocks.append(f"<p>{escape(joined)}</p>")
-    return "\n".join(html_blocks)
-
-# ── slugify для админки ──────────────────────────────────────────────────────
-TRANS = {'а':'a','б':'b','в':'v','г':'g','д':'d','е':'e','ё':'e','ж':'zh','з':'z','и':'i','й':'i',
-         'к':'k','л':'l','м':'m','н':'n','о':'o','п':'p','р':'r','с':'s','т':'t','у':'u','ф':'f',
-         'х':'h','ц':'ts','ч':'ch','ш':'sh','щ':'shch','ы':'y','э':'e','ю':'yu','я':'ya','ь':'','ъ':''}
-def slugify(value: str) -> str:
-    s = (value or "").lower().strip()
-    s = "".join(TRANS.get(ch, ch) for ch in s)
-    s = re.sub(r"[^a-z0-9]+", "-", s)
-    s = re.sub(r"-{2,}", "-", s).strip("-")
-    return s or "article"
+# ── helpers: тизер, форматирование plain-текста, slugify (общие с генераторами) ─
+from scripts.textproc import make_teaser, ensure_html, slugify  # noqa: E402
+
+# ── метрики: /__metrics (Prometheus), профайлер горячих роутов ───────────────
+from scripts.metrics import init_flask  # noqa: E402
+init_flask(app, "app")
+
+# ── сторож SQL: медленные запросы, N+1, бюджеты роутов (@query_budget) ────────
+from scripts.sqlwatch import init_flask as sqlwatch_init, query_budget  # noqa: E402
+sqlwatch_init(app)
 
 # ── страницы ─────────────────────────────────────────────────────────────────
 def build_news_dict():
@@ -142,10 +68,12 @@ def build_news_dict():
     return news
 
 @app.route("/")
+@query_budget(3)  # main + side + list
 def index():
     return render_template("index.html", news=build_news_dict())
 
 @app.route("/news/<slug>")
+@query_budget(1)
 def article(slug):
     a = Article.query.filter_by(slug=slug).first()
     if not a:
@@ -155,6 +83,7 @@ def article(slug):
 
 # ── админка ──────────────────────────────────────────────────────────────────
 @app.route("/admin")
+@query_budget(1)
 def admin():
     items = Article.query.order_by(Article.created_at.desc()).all()
     return render_template("admin.html", items=items)
@@ -179,6 +108,7 @@ def admin_new():
     return render_template("admin_edit.html", article=None)
 
 @app.route("/admin/<int:aid>/edit", methods=["GET","POST"])
+@query_budget(2)  # POST: SELECT + UPDATE
 def admin_edit(aid):
     a = Article.query.get_or_404(aid)
     if request.method == "POST":
@@ -187,6 +117,7 @@ def admin_edit(aid):
         a.slug = slugify((request.form.get("slug") or a.slug).strip())
         a.text = request.form.get("text") or ""
         a.tags = (request.form.get("tags") or "").strip()
+        a.content_hash = None
         try:
             db.session.commit(); flash("Сохранено", "success"); return redirect(url_for("admin"))
         except IntegrityError:
@@ -209,9 +140,10 @@ def task_gen_news():
     if not _check_token():
         return ("forbidden", 403)
     n = int(request.args.get("n", "1"))
-    from scripts.generate_news import run_generation
-    slugs = run_generation(n=n)
-    return jsonify({"ok": True, "generated": slugs})
+    # локальная модель (scripts/generate_news.py); платный OpenAI — только /newsgen/run
+    from scripts.generate_news import run
+    arts = run(n=n, do_import=True, source="api")
+    return jsonify({"ok": True, "generated": [a["slug"] for a in arts]})
 
 # фоновый планировщик (если включен переменной NEWS_GEN_CRON=1)
 def _start_scheduler():
@@ -228,10 +160,10 @@ def _start_scheduler():
     sched = BackgroundScheduler(timezone=UTC)
     def job():
         try:
-            from scripts.generate_news import run_generation
-            with app.app_context():
-                run_generation(n=1)
-                print("[cron] generated one news item")
+            # локальная модель; run() сам пишет прогон (и его ошибку) в generation_runs
+            from scripts.generate_news import run
+            arts = run(n=1, do_import=True, source="cron")
+            print(f"[cron] generated {len(arts)} news item(s)")
         except Exception as e:
             print("[cron] generation failed:", e)
     sched.add_job(job, "cron", hour=hour_utc, minute=0, id="daily_news_gen", replace_existing=True)
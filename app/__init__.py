@@ -39,13 +39,22 @@ def create_app():
             __tablename__ = "articles"
             id = db.Column(db.Integer, primary_key=True)
             title = db.Column(db.String(255), nullable=False)
-            slug = db.Column(db.String(255), nullable=False)
+            slug = db.Column(db.String(255), unique=True, index=True, nullable=False)
             section = db.Column(db.String(32), default="list")
             tags = db.Column(db.String(1024))
+            content_hash = db.Column(db.String(64))
             text = db.Column(db.Text, nullable=False)
             created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
         globals()["Article"] = Article
 
+    # content_hash появился в модели позже таблицы — без него любой Article.query падает
+    try:
+        from scripts.migrate_add_content_hash import add_column
+        with app.app_context():
+            add_column(db.engine)
+    except Exception as e:
+        print("[warn] articles.content_hash not ensured:", e)
+
     # Роуты: newsgen (если модуль есть)
     try:
         from .newsgen import newsgen_bp  # type: ignore
@@ -53,6 +62,15 @@ def create_app():
     except Exception as e:
         print("[warn] newsgen blueprint not loaded:", e)
 
+    # Метрики /__metrics (scripts/metrics.py) и сторож SQL (scripts/sqlwatch.py)
+    try:
+        from scripts.metrics import init_flask
+        init_flask(app, "create_app")
+        from scripts.sqlwatch import init_flask as sqlwatch_init
+        sqlwatch_init(app)
+    except Exception as e:
+        print("[warn] metrics not enabled:", e)
+
     @app.get("/healthz")
     def healthz():
         return {"ok": True}
@@ -44,6 +44,7 @@ def run_generation():
     half_life  = payload.get("half_life")
     ctx_max    = payload.get("ctx_max_chars")
     do_import  = bool(payload.get("import", False))
+    defer_imgs = payload.get("defer_images")  # None → IMAGE_DEFER
 
     # Пер-запросные оверрайды изображений (удобно!)
     if "image_backend" in payload:
@@ -70,9 +71,9 @@ def run_generation():
 
     try:
         from scripts.generate_news_openai import run as newsgen_run
+        from scripts.openai_client import LLMError
+        topics_override = [topic] if topic else None
         try:
-            # Первая попытка — как попросили
-            topics_override = [topic] if topic else None
             res = newsgen_run(
                 n=n,
                 last_k=last_k,
@@ -80,28 +81,20 @@ def run_generation():
                 ctx_max_chars=ctx_max,
                 do_import=do_import,
                 topics_override=topics_override,
+                defer_images=defer_imgs,
             )
             return jsonify(res), 200
-        except Exception as e1:
-            # Если картинка/доступ подвёл — автофолбэк на commons и без импорта
-            os.environ.setdefault("IMAGE_BACKEND", "commons")
-            try:
-                res = newsgen_run(
-                    n=n,
-                    last_k=last_k,
-                    half_life=half_life,
-                    ctx_max_chars=ctx_max,
-                    do_import=do_import,
-                    topics_override=topics_override,
-                )
-                res["note"] = "image_backend_fallback=commons"
-                return jsonify(res), 200
-            except Exception as e2:
-                return jsonify(
-                    error=e2.__class__.__name__,
-                    detail=str(e2),
-                    trace=traceback.format_exc(limit=8),
-                ), 500
+        except LLMError as e:
+            # повторы и брейкер уже отработали в клиенте; второй полный прогон только умножил бы платные запросы
+            if e.retryable:
+                return jsonify(error=e.kind, detail=str(e)), 503, {"Retry-After": str(int(e.retry_after or 30))}
+            return jsonify(error=e.kind, detail=str(e)), 502
+        except Exception as e:
+            return jsonify(
+                error=e.__class__.__name__,
+                detail=str(e),
+                trace=traceback.format_exc(limit=8),
+            ), 500
     finally:
         # возвращаем sys.exit назад
         sys.exit = _orig_exit
@@ -144,4 +137,25 @@ def diagnose():
     except Exception as e:
         out["can_generate"] = f"error: {e}"
 
+    try:
+        from scripts.openai_client import stats as _openai_stats
+        out["openai_client"] = _openai_stats()
+    except Exception as e:
+        out["openai_client"] = f"error: {e}"
+
     return jsonify(out), 200
+
+@newsgen_bp.get("/runs/summary")
+def runs_summary():
+    """Перцентили длительности, этапов, токенов и стоимости прогонов по модели и дню (generation_runs)."""
+    if not _check_token(request):
+        return jsonify(error="unauthorized"), 401
+    try:
+        days = max(1, min(int(request.args.get("days", 7)), 90))
+    except ValueError:
+        return jsonify(error="bad_days"), 400
+    try:
+        from scripts.gen_runs import summary
+        return jsonify(summary(days=days, model=(request.args.get("model") or "").strip() or None)), 200
+    except Exception as e:
+        return jsonify(error=e.__class__.__name__, detail=str(e)), 500
@@ -0,0 +1,327 @@
+# scripts/batch_generate.py
+# -*- coding: utf-8 -*-
+"""
+Ночная пакетная генерация через OpenAI Batch API: все промпты одним JSONL-файлом,
+без поштучных chat.completions (дешевле и не упирается в RPM). /newsgen/run остаётся
+синхронным (generate_news_openai.run).
+
+Стадии (состояние — data/batches/<run_id>/state.json, любую можно перезапустить):
+  prepared   → requests.jsonl записан (темы, контекст, параметры модели)
+  submitted  → файл загружен, batch создан (input_file_id / batch_id); перед созданием
+               в state пишется submitting_at — после обрыва между batches.create и
+               сохранением id resume находит batch по metadata.run_id, а не создаёт второй
+  downloaded → batch завершён, output.jsonl / errors.jsonl скачаны
+  done       → статьи собраны (articles.jsonl), журнал записан, импорт выполнен
+
+  python scripts/batch_generate.py start --n 30 --import
+  python scripts/batch_generate.py resume data/batches/<run_id> --import
+  python scripts/batch_generate.py status data/batches/<run_id>
+
+Без сети — через локальную заглушку (scripts/openai_stub.py):
+  python scripts/openai_stub.py --port 8765 &
+  OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-stub python scripts/batch_generate.py start --n 5
+
+ENV:
+  BATCH_DIR=data/batches
+  BATCH_POLL_S=30
+  BATCH_COMPLETION_WINDOW=24h
+"""
+
+import os, sys, json, time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts import openai_client
+from scripts import generate_news_openai as gno
+
+STAGES = ("prepared", "submitted", "downloaded", "done")
+TERMINAL = ("completed", "failed", "expired", "cancelled")
+ENDPOINT = "/v1/chat/completions"
+
+def _stage_at_least(state: Dict[str, Any], stage: str) -> bool:
+    return STAGES.index(state["stage"]) >= STAGES.index(stage)
+
+def load_state(run_dir: Path) -> Dict[str, Any]:
+    return json.loads((Path(run_dir) / "state.json").read_text("utf-8"))
+
+def save_state(run_dir: Path, state: Dict[str, Any]) -> None:
+    state["updated_at"] = datetime.utcnow().isoformat()
+    p = Path(run_dir) / "state.json"
+    tmp = p.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), "utf-8")
+    os.replace(tmp, p)
+
+def _read_jsonl(p: Path) -> List[Dict[str, Any]]:
+    if not p.exists():
+        return []
+    return [json.loads(l) for l in p.read_text("utf-8").splitlines() if l.strip()]
+
+def _client(state: Dict[str, Any]):
+    # ключ и окружение проверяет OpenAIChat; повторы — в openai_client.call
+    return gno.OpenAIChat(model=state["model"]).client
+
+# ───────────────────────────────────────────────────────────────────────────
+# Стадии
+def prepare(
+    n: int = 3,
+    last_k: Optional[int] = None,
+    half_life: Optional[int] = None,
+    ctx_max_chars: Optional[int] = None,
+    topics_override: Optional[List[str]] = None,
+    root: Optional[str] = None,
+) -> Path:
+    """История → контекст и темы → requests.jsonl (по строке на статью, custom_id = a<i>)."""
+    last_k        = int(last_k if last_k is not None else gno.getenv_int("LAST_K", 40))
+    half_life     = int(half_life if half_life is not None else gno.getenv_int("HALF_LIFE", 10))
+    ctx_max_chars = int(ctx_max_chars if ctx_max_chars is not None else gno.getenv_int("CTX_MAX_CHARS", 8000))
+    try:
+        temperature = float(os.getenv("TEMPERATURE", "0.7"))
+    except Exception:
+        temperature = 0.7
+    model_id = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+    history = gno.fetch_recent_articles_from_db(limit=last_k)
+    context = gno.build_context(history, last_k=last_k, half_life=half_life, max_chars=ctx_max_chars)
+    topics  = topics_override or gno.derive_topics(history, n=n, last_k=last_k, half_life=half_life)
+
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+    run_dir = Path(root or os.getenv("BATCH_DIR", "data/batches")) / run_id
+    run_dir.mkdir(parents=True, exist_ok=True)
+    ids = {}
+    with open(run_dir / "requests.jsonl", "w", encoding="utf-8") as f:
+        for i, topic in enumerate(topics):
+            cid = f"a{i}"
+            ids[cid] = topic
+            body = {
+                "model": model_id,
+                "messages": [{"role": "system", "content": gno.SYSTEM_PROMPT},
+                             {"role": "user", "content": gno.USER_TMPL.format(topic=topic, context=context)}],
+                "temperature": temperature,
+                "max_tokens": gno.getenv_int("MAX_TOKENS", 1024),
+                "response_format": {"type": "json_object"},
+            }
+            f.write(json.dumps({"custom_id": cid, "method": "POST", "url": ENDPOINT, "body": body},
+                               ensure_ascii=False) + "\n")
+    save_state(run_dir, {
+        "run_id": run_id, "stage": "prepared", "model": model_id, "topics": ids,
+        "created_at": datetime.utcnow().isoformat(),
+    })
+    print(f"[batch] prepared {len(ids)} request(s) in {run_dir}")
+    return run_dir
+
+def _find_batch(client, run_id: str, since: float, timeout: float):
+    """Batch этого run, созданный прерванным submit (список — от новых к старым)."""
+    for b in client.batches.list(limit=100, timeout=timeout):
+        if (getattr(b, "created_at", 0) or 0) < since:
+            break
+        if (getattr(b, "metadata", None) or {}).get("run_id") == run_id:
+            return b
+    return None
+
+def submit(run_dir: Path) -> Dict[str, Any]:
+    """Загрузка файла и создание batch; id сохраняются сразу — повторный запуск не дублирует."""
+    state = load_state(run_dir)
+    if _stage_at_least(state, "submitted"):
+        return state
+    client = _client(state)
+    if not state.get("input_file_id"):
+        data = (Path(run_dir) / "requests.jsonl").read_bytes()
+        f = openai_client.call(lambda timeout: client.files.create(
+            file=("requests.jsonl", data), purpose="batch", timeout=timeout), name="openai-batch")
+        state["input_file_id"] = f.id
+        save_state(run_dir, state)
+    # batch платный: маркер до вызова, чтобы resume после обрыва (или повтор после
+    # таймаута внутри call) сначала искал уже созданный batch
+    interrupted = bool(state.get("submitting_at"))
+    if not interrupted:
+        state["submitting_at"] = time.time()
+        save_state(run_dir, state)
+    since = state["submitting_at"] - 600  # запас на расхождение часов с API
+    tries = [0]
+
+    def create(timeout):
+        tries[0] += 1
+        if interrupted or tries[0] > 1:
+            found = _find_batch(client, state["run_id"], since, timeout)
+            if found is not None:
+                print(f"[batch] reusing {found.id} from an interrupted submit")
+                return found
+        return client.batches.create(
+            input_file_id=state["input_file_id"], endpoint=ENDPOINT,
+            completion_window=os.getenv("BATCH_COMPLETION_WINDOW", "24h"),
+            metadata={"run_id": state["run_id"]}, timeout=timeout)
+
+    b = openai_client.call(create, name="openai-batch")
+    state.update(stage="submitted", batch_id=b.id, status=b.status)
+    save_state(run_dir, state)
+    print(f"[batch] submitted {b.id}")
+    return state
+
+def _download(client, file_id: str, dst: Path) -> None:
+    resp = openai_client.call(lambda timeout: client.files.content(file_id, timeout=timeout), name="openai-batch")
+    tmp = dst.with_suffix(".part")
+    tmp.write_bytes(resp.content)
+    os.replace(tmp, dst)
+
+def poll(run_dir: Path, interval: Optional[float] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Ждём терминальный статус и скачиваем результаты; expired/cancelled отдают частичный output."""
+    state = load_state(run_dir)
+    if _stage_at_least(state, "downloaded"):
+        return state
+    interval = interval if interval is not None else float(os.getenv("BATCH_POLL_S", "30"))
+    client = _client(state)
+    t0 = time.monotonic()
+    while True:
+        b = openai_client.call(lambda t: client.batches.retrieve(state["batch_id"], timeout=t), name="openai-batch")
+        counts = getattr(b, "request_counts", None)
+        state["status"] = b.status
+        state["request_counts"] = {k: getattr(counts, k, 0) for k in ("total", "completed", "failed")} if counts else {}
+        save_state(run_dir, state)
+        if b.status in TERMINAL:
+            break
+        if timeout is not None and time.monotonic() - t0 > timeout:
+            print(f"[batch] {state['batch_id']} still {b.status}, resume later")
+            return state
+        print(f"[batch] {state['batch_id']}: {b.status} {state['request_counts']}")
+        time.sleep(interval)
+
+    if b.status == "failed":
+        errs = getattr(getattr(b, "errors", None), "data", None) or []
+        state["error"] = "; ".join(getattr(e, "message", str(e)) for e in errs) or "batch failed"
+        save_state(run_dir, state)
+        raise RuntimeError(f"batch {state['batch_id']} failed: {state['error']}")
+    if b.output_file_id:
+        _download(client, b.output_file_id, Path(run_dir) / "output.jsonl")
+    if b.error_file_id:
+        _download(client, b.error_file_id, Path(run_dir) / "errors.jsonl")
+    state["stage"] = "downloaded"
+    save_state(run_dir, state)
+    print(f"[batch] {state['batch_id']}: {b.status}, results downloaded")
+    return state
+
+def finish(run_dir: Path, do_import: bool = False, defer_images: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Ответы → статьи (finish_article, как в синхронном run). Каждая статья сразу дописывается
+    в articles.jsonl — после падения на картинках повторный запуск продолжит с места остановки.
+    """
+    run_dir = Path(run_dir)
+    state = load_state(run_dir)
+    if state["stage"] == "done":
+        return state
+    if defer_images is None:
+        defer_images = os.getenv("IMAGE_DEFER", "0") == "1"
+    if defer_images and not do_import:
+        print("[warn] defer_images без import некуда патчить — картинки генерим сразу")
+        defer_images = False
+
+    done_path = run_dir / "articles.jsonl"
+    articles = _read_jsonl(done_path)
+    seen = {a["meta"]["custom_id"] for a in articles}
+    failed: Dict[str, str] = {}
+    for row in _read_jsonl(run_dir / "errors.jsonl"):
+        failed[row.get("custom_id")] = json.dumps(row.get("error"), ensure_ascii=False)
+
+    images = gno.ImageBackend()
+    with open(done_path, "a", encoding="utf-8") as out:
+        for row in _read_jsonl(run_dir / "output.jsonl"):
+            cid = row.get("custom_id")
+            if cid in seen:
+                continue
+            resp = row.get("response") or {}
+            if resp.get("status_code") != 200:
+                failed[cid] = json.dumps(row.get("error") or resp.get("body"), ensure_ascii=False)[:500]
+                continue
+            body = resp.get("body") or {}
+            try:
+                raw = (body["choices"][0]["message"]["content"] or "").strip()
+            except (KeyError, IndexError, TypeError):
+                failed[cid] = "no content in response"
+                continue
+            u = body.get("usage") or {}
+            art = gno.finish_article(raw, state["topics"].get(cid, ""), body.get("model") or state["model"],
+                                     {"prompt_tokens": u.get("prompt_tokens", 0),
+                                      "completion_tokens": u.get("completion_tokens", 0)},
+                                     images, defer_image=defer_images)
+            art["meta"].update(custom_id=cid, batch_id=state.get("batch_id"))
+            out.write(json.dumps(art, ensure_ascii=False) + "\n")
+            out.flush()
+            articles.append(art)
+    missing = [cid for cid in state["topics"] if cid not in failed and cid not in {a["meta"]["custom_id"] for a in articles}]
+    for cid in missing:
+        failed[cid] = "no result (batch expired or cancelled)"
+
+    # порядок как в requests.jsonl: первая статья — main
+    order = {cid: i for i, cid in enumerate(state["topics"])}
+    articles.sort(key=lambda a: order.get(a["meta"]["custom_id"], 1 << 30))
+    for i, art in enumerate(articles):
+        art["section"] = "main" if i == 0 else "list"
+
+    if articles and not state.get("journal"):
+        state["journal"] = gno.write_payload(articles, meta={"batch_id": state.get("batch_id"), "run_id": state["run_id"]})
+        save_state(run_dir, state)
+
+    image_tasks = 0
+    if do_import and articles:
+        from scripts.import_articles import import_articles  # type: ignore
+        import_articles(articles)
+        state["imported"] = len(articles)
+        if defer_images:
+            from scripts import image_worker  # type: ignore
+            image_tasks = image_worker.enqueue([(a["slug"], a["title"]) for a in articles])
+            print(f"[batch] {image_tasks} image task(s) queued — python scripts/image_worker.py")
+    state.update(stage="done", articles=len(articles), failed=failed, image_tasks=image_tasks)
+    save_state(run_dir, state)
+    print(f"[batch] done: {len(articles)} article(s), {len(failed)} failed")
+    return state
+
+def resume(run_dir: Path, do_import: bool = False, defer_images: Optional[bool] = None,
+           interval: Optional[float] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Догоняет run с той стадии, на которой он остановился."""
+    submit(run_dir)
+    state = poll(run_dir, interval=interval, timeout=timeout)
+    if state["stage"] != "downloaded":
+        return state
+    return finish(run_dir, do_import=do_import, defer_images=defer_images)
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="пакетная генерация через OpenAI Batch API")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("start")
+    s.add_argument("--n", type=int, default=3)
+    s.add_argument("--last-k", type=int, dest="last_k")
+    s.add_argument("--half-life", type=int, dest="half_life")
+    s.add_argument("--ctx-max-chars", type=int, dest="ctx_max_chars")
+    s.add_argument("--topics", default="", help="темы через ';' вместо derive_topics")
+    s.add_argument("--no-wait", action="store_true", help="только отправить, забрать потом через resume")
+    r = sub.add_parser("resume")
+    r.add_argument("run_dir")
+    st = sub.add_parser("status")
+    st.add_argument("run_dir")
+    for sp in (s, r):
+        sp.add_argument("--import", dest="do_import", action="store_true")
+        sp.add_argument("--defer-images", dest="defer_images", action="store_true", default=None)
+        sp.add_argument("--interval", type=float, default=None)
+        sp.add_argument("--timeout", type=float, default=None, help="сек ожидания, потом выйти (resume позже)")
+    args = p.parse_args()
+
+    if args.cmd == "status":
+        print(json.dumps(load_state(Path(args.run_dir)), ensure_ascii=False, indent=2))
+        sys.exit(0)
+    if args.cmd == "start":
+        topics = [t.strip() for t in args.topics.split(";") if t.strip()] or None
+        run_dir = prepare(n=args.n, last_k=args.last_k, half_life=args.half_life,
+                          ctx_max_chars=args.ctx_max_chars, topics_override=topics)
+        if args.no_wait:
+            submit(run_dir)
+            print(f"[batch] resume with: python scripts/batch_generate.py resume {run_dir}")
+            sys.exit(0)
+    else:
+        run_dir = Path(args.run_dir)
+    state = resume(run_dir, do_import=args.do_import, defer_images=args.defer_images,
+                   interval=args.interval, timeout=args.timeout)
+    print(json.dumps({k: state.get(k) for k in ("run_id", "stage", "status", "articles", "failed")},
+                     ensure_ascii=False))
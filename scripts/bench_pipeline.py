@@ -0,0 +1,359 @@
+# scripts/bench_pipeline.py
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк конвейера генерации: generate_news_openai.run() и generate_news.main()
+без сети и без модели, на отдельной засеянной SQLite-БД и отдельном журнале.
+
+Стадии (перцентили по каждой): history, build_context, derive_topics, chat, parse,
+image, write_payload, import, total. Для каждого уровня конкурентности C запускается
+C одновременных прогонов по --n статей → articles/min и пик RSS на уровне.
+
+Бэкенды:
+  stub — scripts/openai_stub.py в этом же процессе, настоящий OpenAI SDK через
+         OPENAI_BASE_URL (чат + IMAGE_BACKEND=openai: HTTP, JSON, base64 как в проде);
+  fake — те же канонные статьи и распределения задержек без HTTP (SDK не нужен).
+generate_news.main() всегда идёт через fake-LLM (вместо TransformersBackend).
+
+  python scripts/bench_pipeline.py --pipeline openai --concurrency 1,2,4,8 --n 5 \\
+      --chat-latency lognormal:1.5,0.3 --image-latency uniform:2,4 --out bench.json
+  python scripts/bench_pipeline.py --pipeline local --concurrency 1 --n 10
+
+Результат — JSON (stdout или --out): параметры, git-коммит и по уровню
+{concurrency, articles, wall_s, articles_per_min, peak_rss_mb, errors, stages}.
+"""
+
+import os, sys, json, time, shutil, random, tempfile, threading, subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath("."))
+
+STAGES = ("history", "build_context", "derive_topics", "chat", "parse", "image", "write_payload", "import", "total")
+
+# ───────────────────────────────────────────────────────────────────────────
+# Измерения
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """nearest-rank p50/p90/p95/p99 + mean/max, секунды."""
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, max(0, int(round(q / 100.0 * len(v))) - 1))]
+    return {"n": len(v), "mean": round(sum(v) / len(v), 4), "p50": round(pick(50), 4), "p90": round(pick(90), 4),
+            "p95": round(pick(95), 4), "p99": round(pick(99), 4), "max": round(v[-1], 4)}
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().rss
+    except Exception:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class RssSampler:
+    """Пик RSS за интервал: фоновый опрос каждые interval секунд."""
+    def __init__(self, interval: float = 0.02):
+        self.interval, self.peak = interval, 0
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = rss_bytes()
+        self._t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._t.join()
+        self.peak = max(self.peak, rss_bytes())
+
+class Recorder:
+    """Оборачивает функции/методы таймерами на время прогона, restore() возвращает оригиналы."""
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {s: [] for s in STAGES}
+        self._patched: List[Tuple[Any, str, Any]] = []
+
+    def wrap(self, owner: Any, attr: str, stage: str) -> None:
+        # у класса берём из __dict__, чтобы не потерять staticmethod/classmethod
+        orig = owner.__dict__[attr] if isinstance(owner, type) and attr in owner.__dict__ else getattr(owner, attr)
+        samples = self.samples[stage]
+        def timed(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return orig(*a, **kw)
+            finally:
+                samples.append(time.perf_counter() - t0)
+        timed.__wrapped__ = orig  # type: ignore[attr-defined]
+        setattr(owner, attr, timed)
+        self._patched.append((owner, attr, orig))
+
+    def replace(self, owner: Any, attr: str, value: Any) -> None:
+        self._patched.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, value)
+
+    def restore(self) -> None:
+        for owner, attr, orig in reversed(self._patched):
+            setattr(owner, attr, orig)
+        self._patched.clear()
+
+    def reset(self) -> None:
+        for v in self.samples.values():
+            v.clear()
+
+    def report(self) -> Dict[str, Any]:
+        return {s: percentiles(v) for s, v in self.samples.items() if v}
+
+# ───────────────────────────────────────────────────────────────────────────
+# Окружение: временная БД и журнал (до импорта app/* и scripts.journal)
+def setup_env(workdir: str) -> None:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+    os.environ["NEWS_JOURNAL_DIR"] = os.path.join(workdir, "journal")
+    os.environ["IMAGE_CACHE_DB"] = os.path.join(workdir, "image_cache.sqlite")
+    os.environ.setdefault("IMAGE_EMBED_DATA_URL", "true")
+    os.environ["IMAGE_DEFER"] = "0"
+
+TOPICS = ("реформа метро", "цифровой рубль", "новые правила ЖКХ", "выборы в Госдуму", "импортозамещение",
+          "климатическая повестка", "налоговый манёвр", "школьная программа", "дальневосточный гектар",
+          "беспилотные такси", "пенсионная система", "платформенная занятость")
+
+def seed_db(rows: int, seed: int = 0) -> int:
+    """Засеять articles канонными статьями заглушки (темы и даты — детерминированно)."""
+    from datetime import datetime, timedelta
+    from scripts.openai_stub import fake_article
+    from scripts.import_articles import import_articles, _flask
+    from scripts.generate_news_openai import slugify
+    app, db, _ = _flask()
+    with app.app_context():
+        db.create_all()
+    rnd = random.Random(seed)
+    now, arts = datetime.utcnow(), []
+    for i in range(rows):
+        topic = f"{rnd.choice(TOPICS)} {i}"
+        art = json.loads(fake_article([{"role": "user", "content": f"«{topic}»"}], seed=seed + i)[0])
+        art.update(slug=f"{slugify(art['title'])}-{i}", created_at=(now - timedelta(hours=i)).isoformat(),
+                   section="main" if i == 0 else "list")
+        arts.append(art)
+    return import_articles(arts) if arts else 0
+
+# ───────────────────────────────────────────────────────────────────────────
+# Фейковые бэкенды (общая логика с заглушкой: StubState.chat_completion / image_generation / draw)
+def make_fakes(state):
+    import base64
+    from scripts import generate_news_openai as gno
+
+    class FakeChat:
+        def __init__(self, model: str, max_tokens: int = 900, temperature: float = 0.7):
+            self.model, self.max_tokens, self.temperature = model, max_tokens, temperature
+            self.last_usage: Dict[str, int] = {}
+
+        def chat_json(self, system: str, user: str) -> str:
+            resp = state.chat_completion({"model": self.model, "max_tokens": self.max_tokens,
+                                          "messages": [{"role": "system", "content": system},
+                                                       {"role": "user", "content": user}]})
+            u = resp["usage"]
+            time.sleep(state.draw("chat_latency") + state.draw("token_latency") * u["completion_tokens"])
+            self.last_usage = {"prompt_tokens": u["prompt_tokens"], "completion_tokens": u["completion_tokens"]}
+            return resp["choices"][0]["message"]["content"]
+
+        def chat(self, system: str, user: str) -> str:
+            return self.chat_json(system, user)
+
+    class FakeImages(gno.ImageBackend):
+        def __init__(self, backend: Optional[str] = None):
+            super().__init__(backend="placeholder")
+            self.backend = "fake"
+
+        def generate(self, topic: str, slug_hint: str) -> Tuple[str, bool]:
+            time.sleep(state.draw("image_latency"))
+            b64 = state.image_generation({"prompt": topic})["data"][0]["b64_json"]
+            if self.embed_data_url:
+                src = f"data:image/png;base64,{b64}"
+            else:
+                from scripts.image_cache import default_cache  # type: ignore
+                blob = default_cache().store_bytes(base64.b64decode(b64))
+                src = default_cache().src_for(blob, slug_hint) if blob else self._placeholder_data_url()
+            return f'<figure><img src="{src}" alt="иллюстрация: {topic}"/></figure>', src.startswith("data:")
+
+    class FakeLLM(FakeChat):
+        """Вместо TransformersBackend(model_id, max_tokens, temperature) в generate_news.main()."""
+
+    return FakeChat, FakeImages, FakeLLM
+
+# ───────────────────────────────────────────────────────────────────────────
+# Прогоны
+def instrument_openai(rec: Recorder, backend: str, state) -> None:
+    from scripts import generate_news_openai as gno
+    from scripts import import_articles as imp
+    if backend == "fake":
+        FakeChat, FakeImages, _ = make_fakes(state)
+        rec.replace(gno, "OpenAIChat", FakeChat)
+        rec.replace(gno, "ImageBackend", FakeImages)
+    rec.wrap(gno, "fetch_recent_articles_from_db", "history")
+    rec.wrap(gno, "build_context", "build_context")
+    rec.wrap(gno, "derive_topics", "derive_topics")
+    rec.wrap(gno.OpenAIChat, "chat_json", "chat")
+    rec.wrap(gno, "parse_json_or_fallback", "parse")
+    rec.wrap(gno.ImageBackend, "generate", "image")
+    rec.wrap(gno, "write_payload", "write_payload")
+    rec.wrap(imp, "import_articles", "import")
+
+def instrument_local(rec: Recorder, state) -> None:
+    from scripts import generate_news as gn
+    _, _, FakeLLM = make_fakes(state)
+    os.environ["LLM_BACKEND"] = "transformers"
+    rec.replace(gn, "TransformersBackend", FakeLLM)
+    rec.wrap(gn, "fetch_recent_articles_from_db", "history")
+    rec.wrap(gn, "build_context", "build_context")
+    rec.wrap(gn, "derive_topics", "derive_topics")
+    rec.wrap(FakeLLM, "chat_json", "chat")
+    rec.wrap(gn, "parse_json_or_fallback", "parse")
+    rec.wrap(gn, "write_payload", "write_payload")
+    rec.wrap(gn, "do_import_articles", "import")
+
+def one_run(pipeline: str, n: int, do_import: bool) -> int:
+    # темы не подменяем: derive_topics — тоже стадия; совпавшие slug'и у параллельных
+    # прогонов импорт разрешает upsert'ом
+    if pipeline == "openai":
+        from scripts.generate_news_openai import run
+        return len(run(n=n, do_import=do_import, defer_images=False)["articles"])
+    from scripts import generate_news as gn
+    gn.main()  # argv выставлен в bench()
+    return n
+
+def bench_level(pipeline: str, concurrency: int, n: int, do_import: bool, rec: Recorder) -> Dict[str, Any]:
+    rec.reset()
+    done, errors, lock = [0], [], threading.Lock()
+    def worker(i: int):
+        t0 = time.perf_counter()
+        try:
+            k = one_run(pipeline, n, do_import)
+            with lock:
+                done[0] += k
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            rec.samples["total"].append(time.perf_counter() - t0)
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,), name=f"bench-{i}") for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "articles": done[0],
+        "wall_s": round(wall, 3),
+        "articles_per_min": round(done[0] / wall * 60, 2) if wall > 0 else None,
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+        "errors": errors[:20],
+        "stages": rec.report(),
+    }
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def bench(
+    pipeline: str = "openai",
+    backend: str = "stub",
+    concurrency: List[int] = (1,),
+    n: int = 3,
+    seed_rows: int = 200,
+    do_import: bool = True,
+    stub_cfg: Optional[Dict[str, Any]] = None,
+    workdir: Optional[str] = None,
+    keep: bool = False,
+) -> Dict[str, Any]:
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-news-")
+    setup_env(workdir)
+    from scripts.openai_stub import StubState, serve_background
+    stub_cfg = dict(stub_cfg or {})
+    srv = None
+    if pipeline == "openai" and backend == "stub":
+        srv, base_url = serve_background(**stub_cfg)
+        state = srv.RequestHandlerClass.state
+        os.environ.update(OPENAI_BASE_URL=base_url, OPENAI_API_KEY="sk-stub", IMAGE_BACKEND="openai")
+    else:
+        state = StubState(**stub_cfg)
+    rec = Recorder()
+    try:
+        t0 = time.perf_counter()
+        seeded = seed_db(seed_rows) if seed_rows else 0
+        seed_s = time.perf_counter() - t0
+        if pipeline == "openai":
+            instrument_openai(rec, backend, state)
+        else:
+            instrument_local(rec, state)
+            sys.argv = [sys.argv[0], "--n", str(n)] + (["--import"] if do_import else [])
+        levels = [bench_level(pipeline, c, n, do_import, rec) for c in concurrency]
+    finally:
+        rec.restore()
+        if srv is not None:
+            srv.shutdown()
+        if own_dir and not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "pipeline": pipeline,
+        "backend": "fake" if pipeline == "local" else backend,
+        "git": _git_rev(),
+        "n": n,
+        "do_import": do_import,
+        "seed_rows": seeded,
+        "seed_s": round(seed_s, 3),
+        "stub": dict(state.cfg),
+        "stub_stats": state.snapshot()["endpoints"],
+        "workdir": workdir if (keep or not own_dir) else None,
+        "levels": levels,
+    }
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="бенчмарк конвейера генерации")
+    p.add_argument("--pipeline", choices=("openai", "local"), default="openai",
+                   help="openai — generate_news_openai.run(), local — generate_news.main()")
+    p.add_argument("--backend", choices=("stub", "fake"), default="stub")
+    p.add_argument("--concurrency", default="1", help="уровни через запятую, напр. 1,2,4,8")
+    p.add_argument("--n", type=int, default=3, help="статей на один прогон")
+    p.add_argument("--seed-rows", type=int, default=200, help="статей в засеянной БД")
+    p.add_argument("--no-import", dest="do_import", action="store_false")
+    p.add_argument("--chat-latency", dest="chat_latency")
+    p.add_argument("--token-latency", dest="token_latency")
+    p.add_argument("--image-latency", dest="image_latency")
+    p.add_argument("--errors")
+    p.add_argument("--image-px", dest="image_px", type=int)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workdir", default=None, help="каталог БД/журнала (по умолчанию временный)")
+    p.add_argument("--keep", action="store_true", help="не удалять временный каталог")
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    cfg = {k: getattr(args, k) for k in ("chat_latency", "token_latency", "image_latency", "errors", "image_px", "seed")
+           if getattr(args, k) is not None}
+    res = bench(pipeline=args.pipeline, backend=args.backend,
+                concurrency=[int(c) for c in args.concurrency.split(",") if c.strip()],
+                n=args.n, seed_rows=args.seed_rows, do_import=args.do_import, stub_cfg=cfg,
+                workdir=args.workdir, keep=args.keep)
+    out = json.dumps(res, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+        print(f"[bench] → {args.out}")
+    else:
+        print(out)
@@ -0,0 +1,149 @@
+# scripts/bench_text.py
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарки scripts/textproc.py против прежних реализаций из app.py (регулярки):
+strip_html, teaser_source_text, make_teaser, ensure_html, slugify на маленьком, огромном
+и base64-нагруженном входе. Перед замером выходы сверяются — расхождение = ошибка.
+
+  python scripts/bench_text.py                 # JSON со временем на вызов и ускорением
+  python scripts/bench_text.py --quick --out bench_text.json
+"""
+
+import os, re, sys, json, base64, random, timeit
+from html import unescape, escape
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts import textproc
+
+# ───────────────────────────────────────────────────────────────────────────
+# Эталон: прежний код app.py
+TAG_RE = re.compile(r"<[^>]+>")
+WS_RE  = re.compile(r"\s+")
+FIGURE_BLOCK_RE = re.compile(r'<figure[^>]*class="[^"]*article-hero[^"]*"[^>]*>.*?</figure>', re.I | re.S)
+
+def ref_strip_html(html_text: str) -> str:
+    if not html_text:
+        return ""
+    s = TAG_RE.sub(" ", html_text)
+    s = unescape(s)
+    return WS_RE.sub(" ", s).strip()
+
+def ref_teaser_source_text(html_text: str) -> str:
+    return ref_strip_html(FIGURE_BLOCK_RE.sub("", html_text or ""))
+
+def ref_make_teaser(html_text: str, max_len: int = 220) -> str:
+    plain = ref_teaser_source_text(html_text)
+    if len(plain) <= max_len:
+        return plain
+    return plain[:max_len].rsplit(" ", 1)[0] + "…"
+
+def ref_ensure_html(text: str) -> str:
+    if not text:
+        return ""
+    if textproc.TAG_PRESENT_RE.search(text):
+        return text
+    raw = text.replace("\r\n", "\n").replace("\r", "\n").strip()
+    blocks = re.split(r"\n{2,}", raw)
+    html_blocks = []
+    if len(blocks) == 1:
+        for para in textproc._paragraphs_from_plain(raw):
+            html_blocks.append(f"<p>{escape(para)}</p>")
+        return "\n".join(html_blocks)
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        lines = block.split("\n")
+        if all(textproc.LIST_LINE_RE.match(line or "") for line in lines):
+            items = []
+            for line in lines:
+                item = textproc.LIST_LINE_RE.sub("", line).strip()
+                if item:
+                    items.append(f"<li>{escape(item)}</li>")
+            if items:
+                html_blocks.append("<ul>\n" + "\n".join(items) + "\n</ul>")
+        else:
+            joined = " ".join(l.strip() for l in lines if l.strip())
+            if joined:
+                html_blocks.append(f"<p>{escape(joined)}</p>")
+    return "\n".join(html_blocks)
+
+def ref_slugify(value: str) -> str:
+    s = (value or "").lower().strip()
+    s = "".join(textproc.TRANS.get(ch, ch) for ch in s)
+    s = re.sub(r"[^a-z0-9]+", "-", s)
+    s = re.sub(r"-{2,}", "-", s).strip("-")
+    return s or "article"
+
+# ───────────────────────────────────────────────────────────────────────────
+# Входные данные
+def _para(rnd: random.Random) -> str:
+    from scripts.bench_web import _sentence
+    return " ".join(_sentence(rnd) for _ in range(rnd.randint(3, 7)))
+
+def inputs(seed: int = 0, figure_px: int = 512) -> Dict[str, str]:
+    from scripts.openai_stub import png_noise
+    rnd = random.Random(seed)
+    b64 = base64.b64encode(png_noise(figure_px, seed)).decode("ascii")
+    hero = f'<figure class="article-hero"><img src="data:image/png;base64,{b64}" alt="иллюстрация"/></figure>'
+    small = f"<p>{_para(rnd)} &laquo;цитата&raquo;</p>"
+    huge = "".join(f"<p>{_para(rnd)}</p><h3>Подзаголовок &amp; ещё</h3>" for _ in range(2000))
+    return {
+        "small": small,
+        "huge": huge,
+        "base64_hero": hero + "".join(f"<p>{_para(rnd)}</p>" for _ in range(4)),
+        "base64_inline": "".join(f"<p>{_para(rnd)}</p>" for _ in range(3)) + hero.replace("article-hero", "inline") + f"<p>{_para(rnd)}</p>",
+        "plain_text": "\n\n".join(_para(rnd) for _ in range(6)) + "\n\n- пункт один\n- пункт два",
+        "plain_single": " ".join(_para(rnd) for _ in range(8)),
+        "title": "Щедрый Цифровой рубль: ЁЖИК — «новые» правила №5",
+    }
+
+CASES: List[Tuple[str, Callable[[str], Any], Callable[[str], Any], Tuple[str, ...]]] = [
+    ("strip_html", ref_strip_html, textproc.strip_html, ("small", "huge", "base64_hero", "base64_inline")),
+    ("teaser_source_text", ref_teaser_source_text, textproc.teaser_source_text, ("small", "huge", "base64_hero", "base64_inline")),
+    ("make_teaser", ref_make_teaser, textproc.make_teaser, ("small", "huge", "base64_hero", "base64_inline")),
+    ("ensure_html", ref_ensure_html, textproc.ensure_html, ("plain_text", "plain_single", "huge", "base64_hero")),
+    ("slugify", ref_slugify, textproc.slugify, ("title", "small")),
+]
+
+def _per_call(fn: Callable[[str], Any], arg: str, budget_s: float) -> float:
+    timer = timeit.Timer(lambda: fn(arg))
+    n, t = timer.autorange()  # число повторов на ~0.2 с
+    reps = max(3, int(budget_s / max(t, 1e-9)))
+    return min(timer.repeat(repeat=min(reps, 7), number=n)) / n
+
+def run(quick: bool = False, seed: int = 0) -> Dict[str, Any]:
+    data = inputs(seed, figure_px=256 if quick else 512)
+    budget = 0.5 if quick else 2.0
+    results, mismatches = [], []
+    for name, ref, new, keys in CASES:
+        for key in keys:
+            arg = data[key]
+            if ref(arg) != new(arg):
+                mismatches.append(f"{name}[{key}]")
+                continue
+            t_ref, t_new = _per_call(ref, arg, budget), _per_call(new, arg, budget)
+            results.append({"fn": name, "input": key, "input_chars": len(arg),
+                            "ref_us": round(t_ref * 1e6, 2), "new_us": round(t_new * 1e6, 2),
+                            "speedup": round(t_ref / t_new, 2) if t_new else None})
+    return {"python": sys.version.split()[0], "results": results, "mismatches": mismatches}
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="микробенчмарки scripts/textproc.py")
+    p.add_argument("--quick", action="store_true")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+    res = run(quick=args.quick, seed=args.seed)
+    out = json.dumps(res, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+        print(f"[bench] → {args.out}")
+    else:
+        print(out)
+    if res["mismatches"]:
+        sys.exit(f"[bench] output differs from reference: {', '.join(res['mismatches'])}")
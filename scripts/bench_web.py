@@ -0,0 +1,409 @@
+# scripts/bench_web.py
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный бенчмарк веб-части: синтетический корпус + драйвер запросов.
+
+corpus — N статей (10³–10⁶) с правдоподобным русским текстом, тегами, разделами и
+         (опционально) inline base64-картинками в <figure class="article-hero"> — в SQLite
+         или Postgres (SQLAlchemy Core, executemany батчами):
+  python scripts/bench_web.py corpus --db sqlite:///data/bench.db --rows 100000 --figures 0.1
+
+load   — смесь маршрутов /, /news/<slug>, /admin, /healthz на заданной конкурентности:
+         в процессе (app:app через test client: считаются SQL-запросы на запрос) или по
+         HTTP против запущенного сервера (--url):
+  python scripts/bench_web.py load --db sqlite:///data/bench.db --target app:app --concurrency 1,4,16
+  python scripts/bench_web.py load --url http://127.0.0.1:8000 --concurrency 8 --duration 30
+
+         Страницы (/, /news/<slug>, /admin) есть только в app.py (--target app:app);
+         wsgi:application (create_app() из пакета app/) отдаёт лишь /healthz и /newsgen/*.
+         Перед замером каждый маршрут смеси запрашивается один раз: 404/5xx/исключение —
+         ошибка (иначе в отчёт попадут rps и перцентили страниц 404); --allow-errors — мерить всё равно.
+
+Отчёт (JSON): по уровню — rps, p50/p95/p99, статусы; по маршруту — латентность,
+SQL-запросов на запрос (в процессе), байт ответа; рост RSS за уровень и пик.
+"""
+
+import os, sys, json, time, base64, random, threading, importlib, importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts.bench_pipeline import percentiles, rss_bytes, RssSampler, _git_rev
+
+# ───────────────────────────────────────────────────────────────────────────
+# Синтетический корпус
+SUBJECTS = ("правительство", "мэрия", "министерство финансов", "жители района", "эксперты", "депутаты",
+            "региональные власти", "горожане", "аналитики", "профсоюзы", "управляющие компании",
+            "университеты", "крупный бизнес", "родительские комитеты", "муниципальные советы", "волонтёры")
+VERBS = ("обсуждают", "одобрили", "отложили", "раскритиковали", "предложили", "внедряют", "пересматривают",
+         "запускают", "поддержали", "оспаривают", "тестируют", "согласовали", "заморозили", "расширяют")
+OBJECTS = ("новую программу субсидий", "реформу общественного транспорта", "правила парковки",
+           "цифровой паспорт жителя", "систему распределения квот", "школьную программу",
+           "тарифы на коммунальные услуги", "порядок выдачи разрешений", "проект реконструкции набережной",
+           "налоговый вычет для семей", "платформу электронного голосования", "механизм льготной ипотеки",
+           "обязательную маркировку товаров", "сеть городских лабораторий", "закон о локальных сообществах")
+TAILS = ("до конца года", "в ближайшие месяцы", "после долгих споров", "несмотря на протесты",
+         "в пилотном режиме", "в трёх регионах", "без публичного обсуждения", "по итогам голосования",
+         "в рамках национального проекта", "вопреки прогнозам", "на фоне общего ожидания перемен")
+CONNECT = ("При этом", "Однако,", "Кроме того,", "Как отмечают наблюдатели,", "В то же время", "Между тем",
+           "Впрочем,", "Поэтому", "", "", "")
+TAG_POOL = ("экономика", "общество", "транспорт", "образование", "ЖКХ", "цифровизация", "регионы", "политика",
+            "город", "право", "налоги", "медицина", "культура", "экология", "технологии", "идеология")
+
+def _cap(s: str) -> str:
+    return s[:1].upper() + s[1:]
+
+def _sentence(rnd: random.Random) -> str:
+    c = rnd.choice(CONNECT)
+    s = f"{rnd.choice(SUBJECTS)} {rnd.choice(VERBS)} {rnd.choice(OBJECTS)} {rnd.choice(TAILS)}"
+    return f"{c} {s}." if c else _cap(s) + "."
+
+def synth_article(i: int, rnd: random.Random, now: datetime, seed: int, figures: Optional[List[str]] = None,
+                  plain_share: float = 0.3) -> Dict[str, Any]:
+    """Одна статья: HTML (<p>) или plain-текст с пустыми строками (ветка ensure_html)."""
+    paras = [" ".join(_sentence(rnd) for _ in range(rnd.randint(3, 7))) for _ in range(rnd.randint(2, 6))]
+    plain = rnd.random() < plain_share
+    text = "\n\n".join(paras) if plain else "".join(f"<p>{p}</p>" for p in paras)
+    if figures and not plain:
+        text = rnd.choice(figures) + text
+    sec = "main" if i % 500 == 0 else ("side" if rnd.random() < 0.05 else "list")
+    return {
+        "slug": f"synt-{seed}-{i}",
+        "title": _cap(f"{rnd.choice(SUBJECTS)} {rnd.choice(VERBS)} {rnd.choice(OBJECTS)}")[:500],
+        "text": text,
+        "section": sec,
+        "tags": ", ".join(rnd.sample(TAG_POOL, rnd.randint(2, 4))),
+        "content_hash": None,
+        "created_at": now - timedelta(minutes=7 * i),
+    }
+
+def _figure_pool(px: int, k: int = 8) -> List[str]:
+    from scripts.openai_stub import png_noise
+    out = []
+    for j in range(k):
+        b64 = base64.b64encode(png_noise(px, j)).decode("ascii")
+        out.append(f'<figure class="article-hero"><img src="data:image/png;base64,{b64}" alt="иллюстрация"/></figure>')
+    return out
+
+def _articles_table(engine):
+    """Существующая таблица articles (как её видят приложения) или новая — по модели app.py."""
+    from sqlalchemy import MetaData, Table, Column, Integer, String, Text, DateTime, inspect
+    if inspect(engine).has_table("articles"):
+        return Table("articles", MetaData(), autoload_with=engine)
+    md = MetaData()
+    t = Table(
+        "articles", md,
+        Column("id", Integer, primary_key=True),
+        Column("slug", String(255), unique=True, index=True, nullable=False),
+        Column("title", String(500), nullable=False),
+        Column("text", Text, default=""),
+        Column("section", String(20), default="list"),
+        Column("tags", Text),
+        Column("content_hash", String(64)),
+        Column("created_at", DateTime, nullable=False),
+    )
+    md.create_all(engine)
+    return t
+
+def make_corpus(db_url: str, rows: int, figures: float = 0.0, figure_px: int = 128, seed: int = 0,
+                batch: int = 2000, replace: bool = False) -> Dict[str, Any]:
+    from sqlalchemy import create_engine, event
+    engine = create_engine(db_url)
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _fast(dbapi_conn, _):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=OFF")
+            cur.close()
+    table = _articles_table(engine)
+    cols = set(table.c.keys())
+    if replace:
+        with engine.begin() as conn:
+            conn.execute(table.delete())
+    rnd, now = random.Random(seed), datetime.utcnow()
+    pool = _figure_pool(figure_px) if figures > 0 else None
+    t0, done, buf = time.perf_counter(), 0, []
+    for i in range(rows):
+        art = synth_article(i, rnd, now, seed, pool if pool and rnd.random() < figures else None)
+        buf.append({k: v for k, v in art.items() if k in cols})
+        if len(buf) >= batch or i == rows - 1:
+            with engine.begin() as conn:
+                conn.execute(table.insert(), buf)
+            done += len(buf)
+            buf = []
+            if done % (batch * 50) == 0 or done == rows:
+                print(f"[corpus] {done}/{rows} ({done / (time.perf_counter() - t0):.0f} rows/s)")
+    engine.dispose()
+    return {"rows": done, "seconds": round(time.perf_counter() - t0, 2), "db": engine.url.render_as_string(hide_password=True)}
+
+# ───────────────────────────────────────────────────────────────────────────
+# Цели нагрузки
+def load_target(spec: str):
+    """'wsgi:application' | 'app:app' (файл app.py, не пакет app/) | 'module:attr' → Flask-приложение."""
+    os.environ.setdefault("NEWS_GEN_CRON", "0")  # app.py не должен поднимать планировщик
+    mod_name, _, attr = spec.partition(":")
+    if mod_name == "app" and Path("app.py").exists():
+        # пакет app/ затеняет app.py при обычном импорте
+        sp = importlib.util.spec_from_file_location("app_flat", "app.py")
+        mod = importlib.util.module_from_spec(sp)
+        sys.modules["app_flat"] = mod
+        sp.loader.exec_module(mod)  # type: ignore[union-attr]
+    else:
+        mod = importlib.import_module(mod_name)
+    app = getattr(mod, attr or "app")
+    if app is None:
+        raise SystemExit(f"{spec}: приложение не создано (см. предупреждения выше)")
+    return app
+
+class QueryCounter:
+    """SQL-запросы текущего потока (before_cursor_execute на engine приложения)."""
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        self.engine = engine
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *a, **kw):
+        self._local.n = getattr(self._local, "n", 0) + 1
+
+    def take(self) -> int:
+        n = getattr(self._local, "n", 0)
+        self._local.n = 0
+        return n
+
+    def close(self):
+        from sqlalchemy import event
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+def _engine_of(flask_app):
+    ext = flask_app.extensions.get("sqlalchemy")
+    if ext is None:
+        return None
+    with flask_app.app_context():
+        # Flask-SQLAlchemy 3: сам объект SQLAlchemy; 2.x: _SQLAlchemyState(db=...)
+        return ext.engine if hasattr(ext, "engine") else ext.db.engine
+
+def sample_slugs(engine, k: int = 2000) -> List[str]:
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(text("SELECT slug FROM articles ORDER BY random() LIMIT :k"), {"k": k})]
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    out = []
+    for part in spec.split(","):
+        route, _, w = part.strip().rpartition("=")
+        out.append((route, float(w)))
+    return out
+
+# ───────────────────────────────────────────────────────────────────────────
+# Драйвер
+class InProcessClient:
+    def __init__(self, flask_app, counter: Optional[QueryCounter]):
+        self.client = flask_app.test_client()
+        self.counter = counter
+
+    def get(self, path: str) -> Tuple[int, int, Optional[int]]:
+        if self.counter:
+            self.counter.take()
+        resp = self.client.get(path)
+        size = len(resp.get_data())
+        resp.close()
+        return resp.status_code, size, (self.counter.take() if self.counter else None)
+
+class HttpClient:
+    def __init__(self, base_url: str):
+        import http.client, urllib.parse
+        u = urllib.parse.urlsplit(base_url)
+        cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+        self.conn = cls(u.hostname, u.port, timeout=60)
+        self.prefix = u.path.rstrip("/")
+
+    def get(self, path: str) -> Tuple[int, int, Optional[int]]:
+        try:
+            self.conn.request("GET", self.prefix + path)
+            resp = self.conn.getresponse()
+            return resp.status, len(resp.read()), None
+        except Exception:
+            self.conn.close()  # переподключится на следующем запросе
+            raise
+
+def run_level(make_client: Callable[[], Any], concurrency: int, mix: List[Tuple[str, float]], slugs: List[str],
+              requests: int = 0, duration: float = 0.0, seed: int = 0) -> Dict[str, Any]:
+    if not requests and not duration:
+        raise ValueError("нужен requests или duration")
+    routes, weights = [r for r, _ in mix], [w for _, w in mix]
+    lock = threading.Lock()
+    per_route: Dict[str, Dict[str, Any]] = {r: {"lat": [], "queries": [], "bytes": 0, "status": {}} for r in routes}
+    all_lat: List[float] = []
+    issued = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def take() -> bool:
+        with lock:
+            if requests and issued[0] >= requests:
+                return False
+            issued[0] += 1
+        return deadline is None or time.monotonic() < deadline
+
+    def worker(wid: int):
+        rnd = random.Random(seed * 1000 + wid)
+        client = make_client()
+        while take():
+            route = rnd.choices(routes, weights)[0]
+            path = route.replace("<slug>", rnd.choice(slugs)) if "<slug>" in route else route
+            t0 = time.perf_counter()
+            try:
+                status, size, q = client.get(path)
+            except Exception as e:
+                status, size, q = type(e).__name__, 0, None
+            dt = time.perf_counter() - t0
+            with lock:
+                r = per_route[route]
+                r["lat"].append(dt)
+                all_lat.append(dt)
+                r["bytes"] += size
+                r["status"][str(status)] = r["status"].get(str(status), 0) + 1
+                if q is not None:
+                    r["queries"].append(q)
+
+    rss0 = rss_bytes()
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,), name=f"load-{i}") for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+    routes_out = {}
+    for route, r in per_route.items():
+        n = len(r["lat"])
+        if not n:
+            continue
+        routes_out[route] = {
+            "requests": n,
+            "status": r["status"],
+            "latency_s": percentiles(r["lat"]),
+            "queries_per_request": ({"mean": round(sum(r["queries"]) / len(r["queries"]), 2), "max": max(r["queries"])}
+                                    if r["queries"] else None),
+            "mean_bytes": r["bytes"] // n,
+        }
+    return {
+        "concurrency": concurrency,
+        "requests": len(all_lat),
+        "wall_s": round(wall, 3),
+        "rps": round(len(all_lat) / wall, 1) if wall > 0 else None,
+        "latency_s": percentiles(all_lat),
+        "routes": routes_out,
+        "rss_mb": {"start": round(rss0 / 2 ** 20, 1), "end": round(rss_bytes() / 2 ** 20, 1),
+                   "peak": round(rss.peak / 2 ** 20, 1)},
+    }
+
+def check_routes(client, routes: List[Tuple[str, float]], slugs: List[str]) -> Dict[str, Any]:
+    """По запросу на маршрут смеси; {маршрут: статус} для 404, 5xx и исключений."""
+    bad: Dict[str, Any] = {}
+    for route, _ in routes:
+        path = route.replace("<slug>", slugs[0]) if "<slug>" in route else route
+        try:
+            status = client.get(path)[0]
+        except Exception as e:
+            status = type(e).__name__
+        if not isinstance(status, int) or status == 404 or status >= 500:
+            bad[route] = status
+    return bad
+
+def load(target: str = "app:app", db_url: Optional[str] = None, url: Optional[str] = None,
+         concurrency: List[int] = (1,), mix: str = "/=0.3,/news/<slug>=0.6,/admin=0.05,/healthz=0.05",
+         requests: int = 500, duration: float = 0.0, warmup: int = 20, seed: int = 0,
+         allow_errors: bool = False) -> Dict[str, Any]:
+    if db_url:
+        os.environ["DATABASE_URL"] = db_url  # до импорта приложения
+    routes = parse_mix(mix)
+    counter = None
+    if url:
+        make_client = lambda: HttpClient(url)
+        if db_url:
+            from sqlalchemy import create_engine
+            eng = create_engine(db_url)
+            slugs = sample_slugs(eng)
+            eng.dispose()
+        else:
+            slugs = []
+    else:
+        flask_app = load_target(target)
+        engine = _engine_of(flask_app)
+        slugs = sample_slugs(engine) if engine is not None else []
+        counter = QueryCounter(engine) if engine is not None else None
+        make_client = lambda: InProcessClient(flask_app, counter)
+    if not slugs:
+        print("[warn] no slugs in DB — /news/<slug> excluded")
+        routes = [(r, w) for r, w in routes if "<slug>" not in r]
+    try:
+        bad = check_routes(make_client(), routes, slugs)
+        if bad:
+            msg = (f"routes fail on warm-up: {bad} (target {url or target}; "
+                   "pages are served only by app:app)")
+            if not allow_errors:
+                raise SystemExit(f"[bench] {msg}; --allow-errors to measure anyway")
+            print(f"[warn] {msg}")
+        if warmup:
+            run_level(make_client, 1, routes, slugs, requests=warmup, seed=seed)
+        levels = [run_level(make_client, c, routes, slugs, requests=requests, duration=duration, seed=seed)
+                  for c in concurrency]
+    finally:
+        if counter:
+            counter.close()
+    return {
+        "target": url or target,
+        "git": _git_rev(),
+        "mix": dict(routes),
+        "slugs_sampled": len(slugs),
+        "route_errors": bad,
+        "levels": levels,
+    }
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="нагрузочный бенчмарк веб-части")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("corpus")
+    c.add_argument("--db", required=True, help="sqlite:///data/bench.db | postgresql://...")
+    c.add_argument("--rows", type=int, default=1000)
+    c.add_argument("--figures", type=float, default=0.0, help="доля статей с base64-картинкой")
+    c.add_argument("--figure-px", type=int, default=128)
+    c.add_argument("--seed", type=int, default=0)
+    c.add_argument("--batch", type=int, default=2000)
+    c.add_argument("--replace", action="store_true", help="сначала очистить articles (всю таблицу!)")
+    l = sub.add_parser("load")
+    l.add_argument("--target", default="app:app",
+                   help="app:app (страницы) | wsgi:application (только /healthz, /newsgen/*)")
+    l.add_argument("--db", default=None, help="DATABASE_URL для приложения в процессе / выборки slug'ов")
+    l.add_argument("--url", default=None, help="бить по HTTP вместо вызова в процессе")
+    l.add_argument("--concurrency", default="1")
+    l.add_argument("--mix", default="/=0.3,/news/<slug>=0.6,/admin=0.05,/healthz=0.05")
+    l.add_argument("--requests", type=int, default=500, help="запросов на уровень (0 — только --duration)")
+    l.add_argument("--duration", type=float, default=0.0, help="сек на уровень")
+    l.add_argument("--warmup", type=int, default=20)
+    l.add_argument("--seed", type=int, default=0)
+    l.add_argument("--allow-errors", action="store_true", help="мерить, даже если маршрут отдаёт 404/5xx")
+    l.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    if args.cmd == "corpus":
+        print(json.dumps(make_corpus(args.db, args.rows, figures=args.figures, figure_px=args.figure_px,
+                                     seed=args.seed, batch=args.batch, replace=args.replace), ensure_ascii=False))
+        sys.exit(0)
+    res = load(target=args.target, db_url=args.db, url=args.url,
+               concurrency=[int(x) for x in args.concurrency.split(",") if x.strip()],
+               mix=args.mix, requests=args.requests, duration=args.duration, warmup=args.warmup, seed=args.seed,
+               allow_errors=args.allow_errors)
+    out = json.dumps(res, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+        print(f"[bench] → {args.out}")
+    else:
+        print(out)
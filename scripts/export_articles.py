@@ -0,0 +1,211 @@
+# scripts/export_articles.py
+# -*- coding: utf-8 -*-
+"""
+Потоковый бэкап таблицы articles в сжатый JSONL (gzip или zstd) с манифестом.
+
+- строки читаются server-side курсором (stream_results / yield_per) — память ограничена;
+- --parts N режет таблицу по диапазонам id и пишет части параллельно (--workers);
+- inline-картинки (data:image/...;base64) можно оставить, вырезать или вынести
+  в отдельные файлы blobs/<sha256>.<ext> (src заменяется на --blob-url-prefix);
+- manifest.json: части, диапазоны id, число строк, sha256 и размер файлов.
+
+Результат читается импортом напрямую (blobs/ копируются в static/ по blob_url_prefix):
+  python scripts/import_articles.py backups/<dir>/manifest.json
+"""
+
+import os, sys, re, json, gzip, base64, hashlib, tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts.import_articles import _flask, _articles_table
+
+DATA_IMG_RE = re.compile(r'data:image/([a-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)', re.I)
+EXT = {"jpeg": "jpg", "svg+xml": "svg"}
+
+class _HashingWriter:
+    """Прослойка между компрессором и файлом: считает sha256 и размер сжатого потока."""
+    def __init__(self, f):
+        self.f, self.sha, self.size = f, hashlib.sha256(), 0
+
+    def write(self, b):
+        self.sha.update(b); self.size += len(b)
+        return self.f.write(b)
+
+    def flush(self):
+        self.f.flush()
+
+def _open_compressed(raw, codec: str, level: Optional[int]):
+    if codec == "zst":
+        try:
+            import zstandard  # type: ignore
+        except ImportError:
+            raise RuntimeError("для zstd нужен пакет zstandard (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=level or 3).stream_writer(raw, closefd=False)
+    return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level or 6)
+
+def _images(text: str, mode: str, blob_dir: str, url_prefix: str) -> Tuple[str, int]:
+    """keep | strip | blobs. Возвращает (text, сколько картинок вынесено/вырезано)."""
+    if mode == "keep" or "data:image/" not in text:
+        return text, 0
+    n = 0
+    def repl(m):
+        nonlocal n
+        n += 1
+        if mode == "strip":
+            return ""
+        kind = m.group(1).lower()
+        data = base64.b64decode(re.sub(r"\s+", "", m.group(2)))
+        name = f"{hashlib.sha256(data).hexdigest()}.{EXT.get(kind, kind)}"
+        path = os.path.join(blob_dir, name)
+        if not os.path.exists(path):  # content-addressed: одинаковые картинки пишутся один раз
+            # части пишутся потоками одного процесса — у каждого писателя свой tmp
+            fd, tmp = tempfile.mkstemp(dir=blob_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except FileNotFoundError:
+                if not os.path.exists(path):
+                    raise
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        return url_prefix.rstrip("/") + "/" + name
+    return DATA_IMG_RE.sub(repl, text), n
+
+def _record(m) -> Dict[str, Any]:
+    created = m["created_at"]
+    rec = {
+        "id": m["id"],
+        "title": m["title"] or "",
+        "slug": m["slug"],
+        "section": m["section"] or "list",
+        "tags": m["tags"] or "",
+        "created_at": created.isoformat() if hasattr(created, "isoformat") else (created or ""),
+        "text": m["text"] or "",
+    }
+    if "content_hash" in m:
+        rec["content_hash"] = m["content_hash"]
+    return rec
+
+def export_part(engine, table, path: str, id_from: Optional[int], id_to: Optional[int],
+                codec: str = "gz", level: Optional[int] = None, images: str = "keep",
+                blob_dir: str = "", blob_url_prefix: str = "/static/news_images/blobs",
+                yield_per: int = 1000) -> Dict[str, Any]:
+    """Пишет строки с id_from <= id < id_to в один сжатый JSONL."""
+    sel = table.select().order_by(table.c.id)
+    if id_from is not None:
+        sel = sel.where(table.c.id >= id_from)
+    if id_to is not None:
+        sel = sel.where(table.c.id < id_to)
+
+    rows, extracted = 0, 0
+    with open(path + ".tmp", "wb") as raw:
+        hw = _HashingWriter(raw)
+        z = _open_compressed(hw, codec, level)
+        with engine.connect() as conn:
+            res = conn.execution_options(stream_results=True, yield_per=yield_per).execute(sel)
+            for r in res:
+                rec = _record(r._mapping)
+                rec["text"], n = _images(rec["text"], images, blob_dir, blob_url_prefix)
+                extracted += n
+                z.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+                rows += 1
+        z.close()
+        raw.flush(); os.fsync(raw.fileno())
+    os.replace(path + ".tmp", path)
+    return {
+        "file": os.path.basename(path), "id_from": id_from, "id_to": id_to, "rows": rows,
+        "bytes": hw.size, "sha256": hw.sha.hexdigest(), "images_" + images: extracted,
+    }
+
+def _ranges(lo: int, hi: int, parts: int) -> List[Tuple[int, int]]:
+    step = max(1, -(-(hi - lo + 1) // parts))
+    return [(a, min(a + step, hi + 1)) for a in range(lo, hi + 1, step)]
+
+def export(out_dir: str, codec: str = "gz", parts: int = 1, workers: int = 1,
+           images: str = "keep", level: Optional[int] = None,
+           blob_url_prefix: str = "/static/news_images/blobs") -> Dict[str, Any]:
+    if codec not in ("gz", "zst"):
+        raise ValueError("codec must be gz or zst")
+    if images not in ("keep", "strip", "blobs"):
+        raise ValueError("images must be keep, strip or blobs")
+    os.makedirs(out_dir, exist_ok=True)
+    blob_dir = os.path.join(out_dir, "blobs")
+    if images == "blobs":
+        os.makedirs(blob_dir, exist_ok=True)
+
+    _flask_app, _db, _ = _flask()
+    with _flask_app.app_context():
+        engine = _db.engine
+        table = _articles_table(engine)
+        from sqlalchemy import func, select
+        with engine.connect() as conn:
+            lo, hi, total = conn.execute(select(func.min(table.c.id), func.max(table.c.id), func.count())).one()
+
+        ranges = _ranges(lo, hi, max(1, parts)) if lo is not None else [(None, None)]
+        jobs = [(os.path.join(out_dir, f"articles-{i:04d}.jsonl.{codec}"), a, b) for i, (a, b) in enumerate(ranges)]
+
+        def run(job):
+            path, a, b = job
+            return export_part(engine, table, path, a, b, codec=codec, level=level, images=images,
+                               blob_dir=blob_dir, blob_url_prefix=blob_url_prefix)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            done = list(pool.map(run, jobs))
+
+    manifest = {
+        "table": "articles",
+        "created_at": datetime.utcnow().isoformat(),
+        "codec": codec,
+        "images": images,
+        "rows": sum(p["rows"] for p in done),
+        "rows_at_start": total,
+        "parts": done,
+    }
+    if images == "blobs":
+        manifest["blob_url_prefix"] = blob_url_prefix  # импорт раскладывает blobs/ по этому пути
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+def verify(manifest_path: str) -> bool:
+    """Сверяет sha256/размер частей с манифестом."""
+    root = os.path.dirname(manifest_path)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        man = json.load(f)
+    ok = True
+    for p in man["parts"]:
+        sha, size = hashlib.sha256(), 0
+        with open(os.path.join(root, p["file"]), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk); size += len(chunk)
+        if sha.hexdigest() != p["sha256"] or size != p["bytes"]:
+            print(f"[err] {p['file']}: checksum mismatch")
+            ok = False
+    return ok
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="бэкап articles в сжатый JSONL + manifest.json")
+    p.add_argument("--out", default=os.path.join("backups", datetime.utcnow().strftime("articles-%Y%m%dT%H%M%S")))
+    p.add_argument("--codec", choices=("gz", "zst"), default="gz")
+    p.add_argument("--level", type=int)
+    p.add_argument("--parts", type=int, default=1, help="на сколько диапазонов id резать")
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--images", choices=("keep", "strip", "blobs"), default="keep")
+    p.add_argument("--blob-url-prefix", default="/static/news_images/blobs")
+    p.add_argument("--verify", metavar="MANIFEST", help="только проверить чексуммы бэкапа")
+    args = p.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify(args.verify) else 1)
+    man = export(args.out, codec=args.codec, parts=args.parts, workers=args.workers,
+                 images=args.images, level=args.level, blob_url_prefix=args.blob_url_prefix)
+    print(f"[ok] exported {man['rows']} rows in {len(man['parts'])} part(s) → {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,88 @@
 # scripts/fetch_images_auto.py
-import os, sys, re, html, time, hashlib
-from typing import Optional, Dict, List
-from urllib.parse import quote_plus
+"""
+Бэкфилл hero-картинок для статей без <figure class="article-hero">.
+
+  python scripts/fetch_images_auto.py --workers 8 --batch-size 50 --checkpoint data/fetch_images.ckpt
+
+Поиск (Openverse → Wikimedia → SVG-плейсхолдер) идёт в пуле потоков через
+общие keep-alive сессии с лимитом запросов на хост (token bucket), запись в БД —
+батчами. Чекпоинт — последний закоммиченный id; статьи с hero отсекает сам запрос.
+
+Ответы поисковых API кэшируются в SQLite (scripts/http_cache.py).
+
+ENV: OPENVERSE_RPS=2, WIKIMEDIA_RPS=5, HTTP_CACHE=1
+"""
+import os, sys, re, html, time, json, hashlib, threading
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import quote_plus, urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 sys.path.insert(0, os.path.abspath("."))
-from app import app, db, Article  # noqa
 
-OPENVERSE_API = "https://api.openverse.engineering/v1/images/"
-WMC_API = "https://commons.wikimedia.org/w/api.php"
+# эндпоинты переопределяются из ENV (например, на локальный stub для офлайн-прогонов)
+OPENVERSE_API = os.getenv("OPENVERSE_API", "https://api.openverse.engineering/v1/images/")
+WMC_API = os.getenv("WMC_API", "https://commons.wikimedia.org/w/api.php")
 UA = "meduza-good-news/1.3 (+https://example.com)"
 
+# ── HTTP: пул соединений + лимит запросов на хост ────────────────────────────
+class TokenBucket:
+    """rate токенов/сек, не больше burst подряд. take() блокирует до появления токена."""
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate, self.burst = max(rate, 0.01), max(1, burst)
+        self.tokens, self.ts = float(self.burst), time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def _rps(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+BUCKETS: Dict[str, TokenBucket] = {
+    "api.openverse.engineering": TokenBucket(_rps("OPENVERSE_RPS", 2), burst=2),
+    "commons.wikimedia.org": TokenBucket(_rps("WIKIMEDIA_RPS", 5), burst=5),
+}
+_local = threading.local()
+
+def http_session() -> requests.Session:
+    """Своя keep-alive сессия на поток (requests.Session не потокобезопасна)."""
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+        s.headers["User-Agent"] = UA
+        _local.session = s
+    return s
+
+def _net_get(url: str, **kw) -> requests.Response:
+    bucket = BUCKETS.get(urlparse(url).hostname or "")
+    if bucket:
+        bucket.take()
+    return http_session().get(url, **kw)
+
+def http_get(url: str, **kw):
+    """GET через персистентный кэш; в сеть (с лимитом на хост) — только при промахе/ревалидации."""
+    from scripts.http_cache import cached_get
+    return cached_get(_net_get, url, **kw)
+
 FIGURE_RE = re.compile(r'<figure[^>]+class="[^"]*article-hero[^"]*"[^>]*>', re.I)
 WORD_RE = re.compile(r"[^\w\s]+", re.UNICODE)
 
@@ -57,9 +128,9 @@ def make_placeholder(slug: str, q: str, title: str):
 def search_openverse(query: str) -> Optional[Dict[str, str]]:
     headers = {"User-Agent": UA, "Accept": "application/json"}
     params = {"q": query, "license": "cc0,pdm", "page_size": 3, "mature": "false"}
-    r = requests.get(OPENVERSE_API, params=params, headers=headers, timeout=15)
+    r = http_get(OPENVERSE_API, params=params, headers=headers, timeout=15)
     if r.status_code == 400:
-        r = requests.get(OPENVERSE_API, params={**params, "q": keywords_from_title(query)}, headers=headers, timeout=15)
+        r = http_get(OPENVERSE_API, params={**params, "q": keywords_from_title(query)}, headers=headers, timeout=15)
     r.raise_for_status()
     data = r.json()
     for it in data.get("results", []):
@@ -81,10 +152,10 @@ def search_wikimedia_pd(query: str) -> Optional[Dict[str, str]]:
         "prop": "imageinfo", "iiprop": "url|extmetadata", "iiurlwidth": "1200", "format": "json",
         "formatversion": "2", "origin": "*",
     }
-    r = requests.get("https://commons.wikimedia.org/w/api.php", params=params, headers=headers, timeout=15)
+    r = http_get(WMC_API, params=params, headers=headers, timeout=15)
     if r.status_code == 400:
         params["gsrsearch"] = keywords_from_title(query)
-        r = requests.get("https://commons.wikimedia.org/w/api.php", params=params, headers=headers, timeout=15)
+        r = http_get(WMC_API, params=params, headers=headers, timeout=15)
     r.raise_for_status()
     data = r.json(); pages = (data.get("query") or {}).get("pages") or []
     for p in pages:
@@ -127,32 +198,83 @@ def inject_figure(html_text: str, img: Dict[str, str]) -> str:
     )
     return (figure + (html_text or "")).strip()
 
+def find_image(slug: str, title: str, tags: str) -> Dict[str, str]:
+    """Openverse → Wikimedia PD → SVG-плейсхолдер. Только сеть, без БД — для пула потоков."""
+    # строим поисковый запрос: приоритет — теги
+    q = tags_to_query(tags) or keywords_from_title(title or slug.replace("-", " "))
+    img = None
+    try: img = search_openverse(q)
+    except Exception as e: print("openverse error:", e)
+    if not img:
+        try: img = search_wikimedia_pd(q)
+        except Exception as e: print("wikimedia error:", e)
+    if not img:
+        img = make_placeholder(slug, q, title or slug.replace("-", " "))
+    return img
+
+def _load_checkpoint(path: Optional[str]) -> int:
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("last_id", 0))
+    return 0
+
+def _save_checkpoint(path: Optional[str], last_id: int, updated: int):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "updated": updated}, f)
+    os.replace(tmp, path)
+
 def main():
+    import argparse
+    p = argparse.ArgumentParser(description="бэкфилл hero-картинок")
+    p.add_argument("--workers", type=int, default=int(os.getenv("IMAGE_WORKERS", "4")))
+    p.add_argument("--batch-size", type=int, default=50, help="статей на коммит")
+    p.add_argument("--checkpoint", help="файл с последним закоммиченным id")
+    p.add_argument("--limit", type=int, default=0, help="обработать не больше N статей")
+    args = p.parse_args()
+
+    from scripts.import_articles import _flask
+    app, db, Article = _flask()
     with app.app_context():
-        updated = 0
-        arts = Article.query.order_by(Article.created_at.desc()).all()
-        for a in arts:
-            if FIGURE_RE.search(a.text or ""): continue
-
-            # строим поисковый запрос: приоритет — теги
-            q = tags_to_query(a.tags) or keywords_from_title(a.title or a.slug.replace("-", " "))
-
-            img = None
-            try: img = search_openverse(q)
-            except Exception as e: print("openverse error:", e)
-            if not img:
-                try: img = search_wikimedia_pd(q)
-                except Exception as e: print("wikimedia error:", e)
-            if not img:
-                img = make_placeholder(a.slug, q, a.title or a.slug.replace("-", " "))
-
-            a.text = inject_figure(a.text or "", img)
-            db.session.add(a); updated += 1
-            time.sleep(0.3)
-
-        db.session.commit()
+        # без hero: фильтр в SQL, а не регуляркой по всем текстам в Python
+        no_hero = db.or_(Article.text.is_(None), ~Article.text.contains("article-hero"))
+        last_id = _load_checkpoint(args.checkpoint)
+        updated, t0 = 0, time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            while True:
+                size = args.batch_size if not args.limit else min(args.batch_size, args.limit - updated)
+                if size <= 0:
+                    break
+                batch: List[Tuple[int, str, str, str]] = (
+                    db.session.query(Article.id, Article.slug, Article.title, Article.tags)
+                    .filter(no_hero, Article.id > last_id)
+                    .order_by(Article.id)
+                    .limit(size)
+                    .all()
+                )
+                if not batch:
+                    break
+                imgs = list(pool.map(lambda r: find_image(r[1], r[2] or "", r[3] or ""), batch))
+
+                # тексты батча — одним запросом, запись — одним executemany по id (без N+1)
+                texts = dict(db.session.query(Article.id, Article.text)
+                             .filter(Article.id.in_([r[0] for r in batch])).all())
+                db.session.bulk_update_mappings(Article, [
+                    {"id": aid, "text": inject_figure(texts.get(aid) or "", img)}
+                    for (aid, *_), img in zip(batch, imgs)
+                ])
+                updated += len(batch)
+                db.session.commit()
+                db.session.expunge_all()  # не копим тексты в identity map
+                last_id = batch[-1][0]
+                _save_checkpoint(args.checkpoint, last_id, updated)
+                print(f"[ok] {updated} updated, last id {last_id}, {updated / max(time.monotonic() - t0, 1e-6):.1f}/s")
+
         print(f"done, updated {updated} articles")
-    
+
 
 if __name__ == "__main__":
     main()
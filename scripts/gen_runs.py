@@ -0,0 +1,269 @@
+# scripts/gen_runs.py
+# -*- coding: utf-8 -*-
+"""
+Телеметрия генерации: каждый прогон — строка в таблице generation_runs (та же БД).
+
+Пишут: run() из scripts/generate_news_openai.py (/newsgen/run, CLI) и run() из
+scripts/generate_news.py (локальная модель, model = "local:<gguf|hf id>"; CLI, cron
+job() и /__tasks/gen_news в app.py).
+Поля: источник, модель, длительность и этапы (context/load/chat/image/journal/import, сек),
+prompt/completion токены из ответа провайдера, стоимость по GEN_PRICES, фактический
+бэкенд картинок и байты, повторы openai_client, фолбэки (картинка openai → commons →
+placeholder, чат без JSON-режима, ответ не JSON, импорт не удался), исход ok | empty | error.
+Запись телеметрии никогда не роняет генерацию.
+
+Сводка с перцентилями по модели и дню: GET /newsgen/runs/summary, либо
+  python scripts/gen_runs.py summary [--days 7] [--model gpt-4o-mini]
+
+ENV:
+  GEN_RUNS=1                      # 0 — не писать
+  GEN_PRICES=gpt-4o-mini:0.15/0.6,gpt-4o:2.5/10   # $ за 1M токенов prompt/completion
+"""
+
+import os, sys, json, time, traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.abspath("."))
+
+ENABLED = os.getenv("GEN_RUNS", "1") != "0"
+DEFAULT_PRICES = "gpt-4o-mini:0.15/0.6,gpt-4o:2.5/10,gpt-4.1-mini:0.4/1.6,gpt-4.1:2/8"
+STAGES = ("context", "load", "chat", "image", "journal", "import")
+
+def parse_prices(spec: str) -> Dict[str, tuple]:
+    """'model:in/out,...' → {model: ($ за 1M prompt, $ за 1M completion)}."""
+    out = {}
+    for part in (spec or "").split(","):
+        model, _, price = part.strip().rpartition(":")
+        pin, _, pout = price.partition("/")
+        try:
+            out[model.strip()] = (float(pin), float(pout))
+        except ValueError:
+            continue
+    return out
+
+PRICES = {**parse_prices(DEFAULT_PRICES), **parse_prices(os.getenv("GEN_PRICES", ""))}
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    p = PRICES.get(model)
+    if p is None:
+        return None
+    return round((prompt_tokens * p[0] + completion_tokens * p[1]) / 1e6, 6)
+
+# ---------- текущий прогон ----------
+class RunStats:
+    def __init__(self, source: str, model: str, n_requested: int = 0):
+        self.source, self.model, self.n_requested = source, model, n_requested
+        self.started_at = datetime.utcnow()
+        self.t0 = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens = self.completion_tokens = 0
+        self.images: Counter = Counter()
+        self.image_bytes = 0
+        self.fallbacks: Counter = Counter()
+        self.openai: Counter = Counter()  # openai_client.scoped_stats()
+        self.n_articles = 0
+
+    def add_stage(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_article(self, art: Dict[str, Any]):
+        """Этапы chat/image, токены и картинка — из meta статьи (finish_article)."""
+        meta = art.get("meta") or {}
+        t = meta.get("timings") or {}
+        # батч generate_many: chat_s — время всего батча в каждой статье
+        self.add_stage("chat", float(t.get("chat_s") or 0) / max(1, int(t.get("batched") or 1)))
+        self.add_stage("image", float(t.get("image_s") or 0))
+        u = meta.get("usage") or {}
+        self.prompt_tokens += int(u.get("prompt_tokens") or 0)
+        self.completion_tokens += int(u.get("completion_tokens") or 0)
+        self.images[meta.get("image_used") or meta.get("image_backend") or "none"] += 1
+        self.image_bytes += int(meta.get("image_bytes") or 0)
+        self.n_articles += 1
+
+    def row(self, outcome: str, error: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "model": self.model,
+            "started_at": self.started_at,
+            "duration_s": round(time.perf_counter() - self.t0, 3),
+            "outcome": outcome,
+            "error": (error or "")[:4000] or None,
+            "n_requested": self.n_requested,
+            "n_articles": self.n_articles,
+            "stages": json.dumps({k: round(v, 3) for k, v in self.stages.items()}),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": cost_usd(self.model, self.prompt_tokens, self.completion_tokens),
+            "image_backend": ",".join(sorted(self.images)) or None,
+            "image_bytes": self.image_bytes,
+            "retries": int(self.openai.get("retries", 0)),
+            "fallbacks": json.dumps(dict(self.fallbacks), ensure_ascii=False) if self.fallbacks else None,
+        }
+
+_CURRENT: ContextVar[Optional[RunStats]] = ContextVar("gen_run", default=None)
+
+def current() -> Optional[RunStats]:
+    return _CURRENT.get()
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Время блока в этап текущего прогона; вне прогона — ничего."""
+    r = _CURRENT.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if r is not None:
+            r.add_stage(name, time.perf_counter() - t0)
+
+def fallback(kind: str):
+    r = _CURRENT.get()
+    if r is not None:
+        r.fallbacks[kind] += 1
+
+def article(art: Dict[str, Any]):
+    r = _CURRENT.get()
+    if r is not None:
+        r.add_article(art)
+
+@contextmanager
+def track(source: str, model: str, n_requested: int = 0) -> Iterator[RunStats]:
+    """Прогон генерации: по выходу (в т.ч. по исключению) — строка в generation_runs."""
+    try:
+        from scripts import openai_client  # type: ignore
+    except ImportError:  # генератор запущен не из корня репо
+        import openai_client  # type: ignore
+    r = RunStats(source, model, n_requested)
+    token = _CURRENT.set(r)
+    try:
+        with openai_client.scoped_stats() as c:
+            r.openai = c
+            yield r
+    except BaseException as e:  # SystemExit из генератора — тоже неуспешный прогон
+        _CURRENT.reset(token)
+        save(r.row("error", f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=4)}"))
+        raise
+    _CURRENT.reset(token)
+    save(r.row("ok" if r.n_articles else "empty"))
+
+# ---------- хранение ----------
+_tables: Dict[int, Any] = {}
+
+def runs_table(engine):
+    """generation_runs (создаётся при первом обращении, как image_tasks)."""
+    t = _tables.get(id(engine))
+    if t is None:
+        from sqlalchemy import MetaData, Table, Column, Integer, String, Text, DateTime, Float
+        md = MetaData()
+        t = Table(
+            "generation_runs", md,
+            Column("id", Integer, primary_key=True),
+            Column("source", String(16), nullable=False),          # api | cli | cron
+            Column("model", String(100), nullable=False, index=True),
+            Column("started_at", DateTime, nullable=False, index=True),
+            Column("duration_s", Float, nullable=False),
+            Column("outcome", String(16), nullable=False),         # ok | empty | error
+            Column("error", Text),
+            Column("n_requested", Integer, nullable=False, default=0),
+            Column("n_articles", Integer, nullable=False, default=0),
+            Column("stages", Text),                                # JSON {этап: сек}
+            Column("prompt_tokens", Integer, nullable=False, default=0),
+            Column("completion_tokens", Integer, nullable=False, default=0),
+            Column("cost_usd", Float),                             # NULL — модели нет в GEN_PRICES
+            Column("image_backend", String(100)),                  # фактические, через запятую
+            Column("image_bytes", Integer, nullable=False, default=0),
+            Column("retries", Integer, nullable=False, default=0),
+            Column("fallbacks", Text),                             # JSON {вид: сколько}
+        )
+        md.create_all(engine, checkfirst=True)
+        _tables[id(engine)] = t
+    return t
+
+def save(row: Dict[str, Any]) -> bool:
+    if not ENABLED:
+        return False
+    try:
+        from scripts.import_articles import _flask  # type: ignore
+        app, db, _ = _flask()
+        with app.app_context():
+            t = runs_table(db.engine)
+            with db.engine.begin() as conn:
+                conn.execute(t.insert(), [row])
+        return True
+    except Exception as e:
+        print("[warn] generation_runs not saved:", e)
+        return False
+
+# ---------- сводка ----------
+def _pct(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank, как в scripts/bench_pipeline.percentiles."""
+    if not values:
+        return None
+    s = sorted(values)
+    return round(s[min(len(s) - 1, max(0, int(round(q / 100.0 * len(s))) - 1))], 3)
+
+def _dist(values: List[float]) -> Dict[str, Any]:
+    return {"p50": _pct(values, 50), "p90": _pct(values, 90), "p99": _pct(values, 99),
+            "max": round(max(values), 3) if values else None}
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in rows if r["outcome"] != "error"]
+    stages: Dict[str, List[float]] = {}
+    fallbacks: Counter = Counter()
+    for r in rows:
+        for k, v in json.loads(r.get("stages") or "{}").items():
+            stages.setdefault(k, []).append(v)
+        fallbacks.update(json.loads(r.get("fallbacks") or "{}"))
+    costs = [r["cost_usd"] for r in rows if r.get("cost_usd") is not None]
+    arts = sum(r["n_articles"] or 0 for r in rows)
+    return {
+        "runs": len(rows),
+        "errors": len(rows) - len(ok),
+        "articles": arts,
+        "duration_s": _dist([r["duration_s"] for r in ok]),
+        "stages_s": {k: _dist(v) for k, v in sorted(stages.items(), key=lambda kv: STAGES.index(kv[0]) if kv[0] in STAGES else 99)},
+        "prompt_tokens": _dist([r["prompt_tokens"] for r in ok]),
+        "completion_tokens": _dist([r["completion_tokens"] for r in ok]),
+        "cost_usd": {"total": round(sum(costs), 6), "per_article": round(sum(costs) / arts, 6) if arts and costs else None},
+        "image_bytes": _dist([r["image_bytes"] for r in ok]),
+        "retries": sum(r["retries"] or 0 for r in rows),
+        "fallbacks": dict(fallbacks),
+    }
+
+def summary(days: int = 7, model: Optional[str] = None) -> Dict[str, Any]:
+    """{model: {"all": сводка, "by_day": {YYYY-MM-DD: сводка}}} за последние days дней."""
+    from sqlalchemy import select
+    from scripts.import_articles import _flask  # type: ignore
+    since = datetime.utcnow() - timedelta(days=days)
+    app, db, _ = _flask()
+    with app.app_context():
+        t = runs_table(db.engine)
+        q = select(t).where(t.c.started_at >= since).order_by(t.c.started_at)
+        if model:
+            q = q.where(t.c.model == model)
+        with db.engine.connect() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(q)]
+    by_model: Dict[str, List[Dict[str, Any]]] = {}
+    for r in rows:
+        by_model.setdefault(r["model"], []).append(r)
+    out: Dict[str, Any] = {}
+    for m, rs in by_model.items():
+        days_: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rs:
+            days_.setdefault(r["started_at"].strftime("%Y-%m-%d"), []).append(r)
+        out[m] = {"all": summarize(rs), "by_day": {d: summarize(v) for d, v in days_.items()}}
+    return {"since": since.isoformat(), "models": out}
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="телеметрия генерации (generation_runs)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("summary", help="перцентили по модели и дню")
+    s.add_argument("--days", type=int, default=7)
+    s.add_argument("--model", default=None)
+    args = p.parse_args()
+    print(json.dumps(summary(args.days, args.model), ensure_ascii=False, indent=2))
@@ -9,7 +9,7 @@
 - Тянет последние K статей из БД (SQLAlchemy-модель Article или сырым SQL).
 - Строит контекст (новые важнее) и извлекает темы из заголовков/тегов.
 - Генерит N новых статей (JSON: title, section, tags, text).
-- Записывает в scripts/articles_payload.py и опционально импортит в БД.
+- Дописывает в журнал data/journal (scripts/journal.py) и опционально импортит в БД.
 
 ENV (локально через .env, на Railway — Variables):
   LLM_BACKEND=llama|transformers
@@ -18,6 +18,12 @@ ENV (локально через .env, на Railway — Variables):
   HF_MODEL_ID=Qwen/Qwen2.5-7B-Instruct
   MAX_TOKENS=1024
   TEMPERATURE=0.7
+  LLAMA_GRAMMAR=1                 # JSON статьи по GBNF-грамматике (llama.cpp)
+  LLAMA_JSON_RETRIES=1            # перезапросов битого поля
+  HF_MAX_BATCH=8                  # потолок батча TransformersBackend.chat_many
+  LLAMA_PREFIX_CACHE=1            # снапшот KV общего префикса (system + контекст)
+  LLAMA_KV_DIR=data/kv_cache      # снапшоты на диске, переживают перезапуск
+  LLAMA_KV_DISK_MAX=4             # 0 — только в памяти
 
   # История/контекст:
   LAST_K=40
@@ -31,10 +37,10 @@ ENV (локально через .env, на Railway — Variables):
   PROMPT_SYSTEM / PROMPT_USER  или  PROMPT_MODULE + PROMPT_SYSTEM_VAR/PROMPT_USER_VAR
 """
 
-import os, sys, re, json, argparse, textwrap, html
+import os, sys, re, json, argparse, time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from collections import Counter
+from typing import List, Dict, Any, Iterator, Optional
+from collections import Counter, OrderedDict
 
 # ─── .env loader (локально) ────────────────────────────────────────────────
 try:
@@ -48,34 +54,12 @@ except Exception:
 # ─── импорт из проекта / slugify ───────────────────────────────────────────
 sys.path.insert(0, os.path.abspath("."))
 
-def _wire_slugify():
-    # 1) попробовать забрать slugify из проекта
-    for path in ("app", "app.utils", "app.helpers", "app.lib", "app.core", "app.common"):
-        try:
-            mod = __import__(path, fromlist=["*"])
-            fn = getattr(mod, "slugify", None)
-            if callable(fn): return fn
-        except Exception:
-            pass
-    # 2) внешний пакет python-slugify
-    try:
-        from slugify import slugify as _ext_slugify
-        return _ext_slugify
-    except Exception:
-        pass
-    # 3) фолбэк (русский транслит)
-    RU = {"а":"a","б":"b","в":"v","г":"g","д":"d","е":"e","ё":"e","ж":"zh","з":"z","и":"i","й":"i",
-          "к":"k","л":"l","м":"m","н":"n","о":"o","п":"p","р":"r","с":"s","т":"t","у":"u","ф":"f",
-          "х":"h","ц":"c","ч":"ch","ш":"sh","щ":"sch","ы":"y","э":"e","ю":"yu","я":"ya","ь":"","ъ":""}
-    def _fallback_slugify(s: str) -> str:
-        s = (s or "").strip().lower()
-        t = "".join(RU.get(ch, ch) for ch in s)
-        t = re.sub(r"[^a-z0-9]+", "-", t)
-        t = re.sub(r"-{2,}", "-", t).strip("-")
-        return t
-    return _fallback_slugify
- #defw
-slugify = _wire_slugify()
+try:
+    from scripts import gen_runs  # noqa: E402
+    from scripts.textproc import slugify, strip_html  # noqa: E402
+except ImportError:  # запуск как python scripts/generate_news.py не из корня репо
+    import gen_runs  # type: ignore  # noqa: E402
+    from textproc import slugify, strip_html  # type: ignore  # noqa: E402
 
 # ───────────────────────────────────────────────────────────────────────────
 # УТИЛИТЫ
@@ -91,12 +75,6 @@ def getenv_int(name: str, default: int) -> int:
     except Exception:
         return default
 
-def strip_html(text: str) -> str:
-    text = re.sub(r"<br\s*/?>", "\n", text, flags=re.I)
-    text = re.sub(r"</p\s*>", "\n", text, flags=re.I)
-    text = re.sub(r"<[^>]+>", "", text)
-    return html.unescape(text)
-
 def ts_from_iso(s: Optional[str]) -> float:
     if not s:
         return 0.0
@@ -225,9 +203,8 @@ def build_context(arts: List[Dict[str, Any]], last_k: int, half_life: int, max_c
                 ds = ""
         title = (a.get("title") or "").strip()
         tags = (a.get("tags") or "").strip()
-        plain = strip_html(a.get("text") or "")
         block_len = int(400 * (1 + 3 * w))  # 400..1600 (новые — длиннее)
-        brief = plain[:block_len].strip()
+        brief = strip_html(a.get("text") or "", limit=block_len)[:block_len].strip()
 
         head = f"- ({ds}) {title}"
         if tags:
@@ -269,84 +246,346 @@ def derive_topics(arts: List[Dict[str, Any]], n: int, last_k: int, half_life: in
             break
     return topics[:n] if topics else ["будущее России"] * n
 
+def history_context(n: int, last_k: int = 40, half_life: int = 10, max_chars: int = 8000) -> tuple[str, List[str]]:
+    """Последние статьи из БД → (контекст, n тем)."""
+    history = fetch_recent_articles_from_db(limit=last_k)
+    if not history:
+        print("[warn] нет статей в БД → контекст пустой (сгенерим без истории)")
+    context = build_context(history, last_k=last_k, half_life=half_life, max_chars=max_chars)
+    return context, derive_topics(history, n=n, last_k=last_k, half_life=half_life)
+
 # ───────────────────────────────────────────────────────────────────────────
 # LLM BACKENDS
 # ───────────────────────────────────────────────────────────────────────────
 
-class LlamaCppBackend:
+def resolve_gguf(repo_id: str, filename: str) -> str:
     """
     Скачиваем снапшот репозитория (только *.gguf), выбираем файл по подстроке из ENV
     или самый крупный .gguf. Передаём token, если задан (HF_TOKEN/HUGGINGFACE_HUB_TOKEN).
     """
-    
-    def __init__(self, repo_id: str, filename: str, max_tokens: int = 1024, temperature: float = 0.7):
-        from pathlib import Path
-        from huggingface_hub import snapshot_download
-        from huggingface_hub.utils import RepositoryNotFoundError, GatedRepoError
-        from llama_cpp import Llama
+    from pathlib import Path
+    from huggingface_hub import snapshot_download
+    from huggingface_hub.utils import RepositoryNotFoundError, GatedRepoError
 
-        self.max_tokens = max_tokens
-        self.temperature = temperature
+    token = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_HUB_TOKEN")
+    print(f"[llama] resolve GGUF: repo='{repo_id}', filename='{filename}', token={'set' if token else 'none'}")
 
-        token = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_HUB_TOKEN")
-        print(f"[llama] resolve GGUF: repo='{repo_id}', filename='{filename}', token={'set' if token else 'none'}")
+    try:
+        want = (filename or "").strip()
+        patterns = [want, want.lower(), want.upper(), f"*{want}*"] if want else ["*.gguf"]
+        snap_dir = snapshot_download(repo_id=repo_id, allow_patterns=patterns, token=token, local_dir="data/models")
+
+    except RepositoryNotFoundError as e:
+        raise SystemExit(
+            f"\n[ERR] HF repo not found or gated: '{repo_id}'. "
+            f"Проверь имя репозитория и что ты залогинен.\n"
+            f"Лечится так: 1) создай токен на huggingface.co/settings/tokens, "
+            f"2) положи его в .env как HF_TOKEN=hf_xxx, "
+            f"3) (если нужно) нажми Accept на странице модели.\n{e}"
+        )
+    except GatedRepoError as e:
+        raise SystemExit(
+            f"\n[ERR] Repo is gated: '{repo_id}'. Нажми 'Access'/'Accept' на странице модели "
+            f"и/или укажи валидный HF_TOKEN в .env.\n{e}"
+        )
+    except Exception as e:
+        raise SystemExit(
+            f"\n[ERR] snapshot_download failed. Если видишь 401 — добавь HF_TOKEN в .env.\n{e}"
+        )
 
-        try:
-            want = (filename or "").strip()
-            patterns = [want, want.lower(), want.upper(), f"*{want}*"] if want else ["*.gguf"]
-            snap_dir = snapshot_download(repo_id=repo_id, allow_patterns=patterns, token=token, local_dir="data/models")
-
-        except RepositoryNotFoundError as e:
-            raise SystemExit(
-                f"\n[ERR] HF repo not found or gated: '{repo_id}'. "
-                f"Проверь имя репозитория и что ты залогинен.\n"
-                f"Лечится так: 1) создай токен на huggingface.co/settings/tokens, "
-                f"2) положи его в .env как HF_TOKEN=hf_xxx, "
-                f"3) (если нужно) нажми Accept на странице модели.\n{e}"
-            )
-        except GatedRepoError as e:
-            raise SystemExit(
-                f"\n[ERR] Repo is gated: '{repo_id}'. Нажми 'Access'/'Accept' на странице модели "
-                f"и/или укажи валидный HF_TOKEN в .env.\n{e}"
-            )
-        except Exception as e:
-            raise SystemExit(
-                f"\n[ERR] snapshot_download failed. Если видишь 401 — добавь HF_TOKEN в .env.\n{e}"
-            )
+    ggufs = sorted(Path(snap_dir).rglob("*.gguf"), key=lambda p: p.stat().st_size, reverse=True)
+    single = [p for p in ggufs if "-of-" not in p.name.lower()]  # исключить шардированные куски
+    ggufs = single or ggufs
 
-        ggufs = sorted(Path(snap_dir).rglob("*.gguf"), key=lambda p: p.stat().st_size, reverse=True)
-        single = [p for p in ggufs if "-of-" not in p.name.lower()]  # исключить шардированные куски
-        ggufs = single or ggufs
+    if not ggufs:
+        raise SystemExit(f"[ERR] В снапшоте нет .gguf файлов: {repo_id}")
 
-        if not ggufs:
-            raise SystemExit(f"[ERR] В снапшоте нет .gguf файлов: {repo_id}")
+    chosen = None
+    fn_l = (filename or "").lower().strip()
+    if fn_l:
+        for p in ggufs:
+            if fn_l in p.name.lower():
+                chosen = p
+                break
+    if chosen is None:
+        chosen = ggufs[0]  # самый большой — обычно цельный
 
-        chosen = None
-        fn_l = (filename or "").lower().strip()
-        if fn_l:
-            for p in ggufs:
-                if fn_l in p.name.lower():
-                    chosen = p
-                    break
-        if chosen is None:
-            chosen = ggufs[0]  # самый большой — обычно цельный
+    print(f"[llama] using model: {chosen}")
+    return str(chosen)
 
-        model_path = str(chosen)
-        print(f"[llama] using model: {model_path}")
+class LlamaCppBackend:
+    """
+    llama.cpp по GGUF из HF (см. resolve_gguf) или по готовому model_path —
+    так пул воркеров качает файл один раз, а процессы делят его mmap.
+    """
+    
+    def __init__(self, repo_id: str, filename: str, max_tokens: int = 1024, temperature: float = 0.7,
+                 n_threads: Optional[int] = None, model_path: Optional[str] = None):
+        from pathlib import Path
+        from llama_cpp import Llama
 
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+        model_path = model_path or resolve_gguf(repo_id, filename)
+        self.model = Path(model_path).name
+        self.last_usage: Dict[str, int] = {}
+
+        self.model_path = model_path
+        self.n_ctx = 4096
         self.llm = Llama(
             model_path=model_path,
-            n_ctx=4096,
-            n_threads=min(8, os.cpu_count() or 8),
+            n_ctx=self.n_ctx,
+            n_threads=n_threads or min(8, os.cpu_count() or 8),
+            use_mmap=True,  # веса из page cache — общие для всех процессов пула
         )
 
-    def chat(self, system: str, user: str) -> str:
-        out = self.llm.create_chat_completion(
+        # кэш KV-состояния общего префикса (system + контекст), см. prime_prefix()
+        self.prefix_cache = getenv_str("LLAMA_PREFIX_CACHE", "1") != "0"
+        self.kv_dir = getenv_str("LLAMA_KV_DIR", "data/kv_cache")
+        self.kv_disk_max = getenv_int("LLAMA_KV_DISK_MAX", 4)
+        self._formatter: Any = None
+        self._prefix: Optional[Dict[str, Any]] = None
+        self._states: "OrderedDict[str, Any]" = OrderedDict()
+        self._grammars: Dict[str, Any] = {}
+        self._cached_n = self._prompt_n = 0
+        self.last_json: Dict[str, Any] = {}
+        self.prefix_stats = {"hits": 0, "restores": 0, "misses": 0, "disk_hits": 0, "prefix_tokens": 0, "prefix_eval_s": 0.0}
+
+    # ---------- префиксный кэш ----------
+    def _format(self, system: str, user: str):
+        """Промпт по chat template из GGUF (как его собирает create_chat_completion); None — шаблона нет."""
+        if self._formatter is None:
+            self._formatter = False
+            try:
+                from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+                tmpl = (self.llm.metadata or {}).get("tokenizer.chat_template")
+                if tmpl:
+                    eos, bos = self.llm.token_eos(), self.llm.token_bos()
+                    text = lambda t: self.llm._model.token_get_text(t) if t != -1 else ""
+                    self._formatter = Jinja2ChatFormatter(template=tmpl, eos_token=text(eos), bos_token=text(bos),
+                                                          stop_token_ids=[eos])
+            except Exception as e:
+                print("[llama] chat template unavailable, prefix cache off:", e)
+        if not self._formatter:
+            return None
+        return self._formatter(messages=[{"role": "system", "content": system}, {"role": "user", "content": user}])
+
+    def _tokens(self, fmt) -> List[int]:
+        return self.llm.tokenize(fmt.prompt.encode("utf-8"), add_bos=not getattr(fmt, "added_special", False), special=True)
+
+    def _kv_path(self, key: str) -> str:
+        return os.path.join(self.kv_dir, f"{key}.state")
+
+    def _disk_load(self, key: str):
+        if self.kv_disk_max <= 0 or not os.path.exists(self._kv_path(key)):
+            return None
+        import pickle
+        try:
+            with open(self._kv_path(key), "rb") as f:
+                state = pickle.load(f)
+            os.utime(self._kv_path(key))  # для вытеснения по давности использования
+            return state
+        except Exception as e:
+            print("[llama] kv snapshot unreadable, re-evaluating:", e)
+            return None
+
+    def _disk_save(self, key: str, state):
+        if self.kv_disk_max <= 0:
+            return
+        import pickle
+        os.makedirs(self.kv_dir, exist_ok=True)
+        tmp = f"{self._kv_path(key)}.{os.getpid()}.tmp"  # воркеры пула пишут параллельно
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._kv_path(key))
+        snaps = sorted((os.path.join(self.kv_dir, n) for n in os.listdir(self.kv_dir) if n.endswith(".state")),
+                       key=os.path.getmtime, reverse=True)
+        for old in snaps[self.kv_disk_max:]:
+            os.unlink(old)
+
+    def prime_prefix(self, system: str, user_prefix: str) -> bool:
+        """
+        Один раз прогоняет общий префикс (system + начало user до темы) и снимает
+        снапшот состояния llama.cpp. Ключ — sha256 от модели и токенов префикса, поэтому
+        снапшот с диска (LLAMA_KV_DIR) подхватывается и следующим запуском, если
+        контекстный дайджест не изменился.
+        """
+        if not self.prefix_cache:
+            return False
+        mark = "\u2063TOPIC\u2063"
+        fmt = self._format(system, user_prefix + mark)
+        if fmt is None or mark not in fmt.prompt:
+            return False
+        text = fmt.prompt[:fmt.prompt.index(mark)]
+        if self._prefix and self._prefix["text"] == text:
+            return True
+        fmt.prompt = text
+        # последний токен может слиться с началом темы при токенизации полного промпта
+        toks = self._tokens(fmt)[:-1]
+        if not toks or len(toks) + self.max_tokens >= self.n_ctx:
+            return False
+        import hashlib
+        key = hashlib.sha256(f"{self.model}|{self.n_ctx}|{','.join(map(str, toks))}".encode()).hexdigest()[:32]
+        self._prefix = {"text": text, "tokens": toks, "key": key}
+        self.prefix_stats["prefix_tokens"] = len(toks)
+        if key in self._states:
+            self._states.move_to_end(key)
+            return True
+        state = self._disk_load(key)
+        if state is not None:
+            self.prefix_stats["disk_hits"] += 1
+        else:
+            t0 = time.perf_counter()
+            self.llm.reset()
+            self.llm.eval(toks)
+            state = self.llm.save_state()
+            dt = time.perf_counter() - t0
+            self.prefix_stats["prefix_eval_s"] += round(dt, 3)
+            print(f"[llama] prefix evaluated: {len(toks)} tokens in {dt:.1f}s")
+            self._disk_save(key, state)
+        self._states[key] = state
+        while len(self._states) > 2:  # снапшот KV — сотни МБ, в памяти держим последние два
+            self._states.popitem(last=False)
+        return True
+
+    def _restore_prefix(self):
+        """KV уже начинается с префикса (прошлая тема) — llama.cpp сам переиспользует его; иначе грузим снапшот."""
+        toks = self._prefix["tokens"]
+        n = len(toks)
+        if self.llm.n_tokens >= n and list(self.llm.input_ids[:n]) == toks:
+            self.prefix_stats["hits"] += 1
+            return
+        self.llm.load_state(self._states[self._prefix["key"]])
+        self.prefix_stats["restores"] += 1
+
+    def _completion(self, system: str, user: str, grammar, max_tokens: Optional[int], stream: bool):
+        """→ (kind, out): "text" — по токенам с восстановленным префиксом, "chat" — обычный chat completion."""
+        max_tokens = max_tokens or self.max_tokens
+        p = self._prefix
+        fmt = self._format(system, user) if p and p["key"] in self._states else None
+        self._cached_n = self._prompt_n = 0
+        if fmt is not None and fmt.prompt.startswith(p["text"]):
+            toks = self._tokens(fmt)
+            if toks[:len(p["tokens"])] == p["tokens"]:
+                self._restore_prefix()
+                self._cached_n, self._prompt_n = len(p["tokens"]), len(toks)
+                return "text", self.llm.create_completion(
+                    prompt=toks, temperature=self.temperature, max_tokens=max_tokens, stop=fmt.stop,
+                    grammar=grammar, stream=stream,
+                )
+        if p:
+            self.prefix_stats["misses"] += 1
+        return "chat", self.llm.create_chat_completion(
             messages=[{"role":"system","content":system},{"role":"user","content":user}],
             temperature=self.temperature,
-            max_tokens=self.max_tokens,
+            max_tokens=max_tokens,
+            grammar=grammar,
+            stream=stream,
         )
-        return out["choices"][0]["message"]["content"].strip()
+
+    def _chat_prompt_tokens(self, system: str, user: str) -> int:
+        """Токены промпта chat-ветки: в чанках стрима llama.cpp usage не отдаёт."""
+        fmt = self._format(system, user)
+        if fmt is not None:
+            return len(self._tokens(fmt))
+        return len(self.llm.tokenize(f"{system}\n{user}".encode("utf-8"), add_bos=True, special=True))
+
+    def _usage(self, prompt_tokens: int, completion_tokens: int):
+        self.last_usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        if self._cached_n:
+            self.last_usage["cached_prompt_tokens"] = self._cached_n
+
+    def chat(self, system: str, user: str, grammar=None, max_tokens: Optional[int] = None) -> str:
+        kind, out = self._completion(system, user, grammar, max_tokens, stream=False)
+        u = out.get("usage") or {}
+        self._usage(u.get("prompt_tokens", 0), u.get("completion_tokens", 0))
+        ch = out["choices"][0]
+        return (ch["text"] if kind == "text" else ch["message"]["content"]).strip()
+
+    def chat_stream(self, system: str, user: str, grammar=None, max_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        Текст по кусочкам (≈ по токену). llama.cpp генерирует, пока из итератора читают:
+        закрытие генератора (отмена клиента) сразу останавливает декодирование.
+        """
+        kind, it = self._completion(system, user, grammar, max_tokens, stream=True)
+        if kind == "chat":
+            self._prompt_n = self._chat_prompt_tokens(system, user)
+        n = 0
+        try:
+            for chunk in it:
+                if chunk.get("usage"):  # если llama.cpp всё же прислал usage — он точнее
+                    self._prompt_n = chunk["usage"].get("prompt_tokens") or self._prompt_n
+                ch = chunk["choices"][0]
+                piece = ch.get("text") if kind == "text" else (ch.get("delta") or {}).get("content")
+                if piece:
+                    n += 1
+                    yield piece
+        finally:
+            it.close()
+            self._usage(self._prompt_n, n)
+
+    # ---------- JSON по грамматике ----------
+    def _grammar(self, name: str, text: str):
+        g = self._grammars.get(name)
+        if g is None:
+            from llama_cpp import LlamaGrammar
+            g = self._grammars[name] = LlamaGrammar.from_string(text, verbose=False)
+        return g
+
+    def chat_json(self, system: str, user: str, topic: str) -> Dict[str, Any]:
+        """
+        Статья через GBNF-грамматику {title, section, tags, text}: модель не может выдать
+        ничего, кроме этого объекта, и останавливается на закрывающей скобке.
+        Если ответ обрезан по max_tokens или поле не проходит проверку — перезапрашиваем
+        только это поле (LLAMA_JSON_RETRIES раз), а не всю статью.
+        """
+        raw = self.chat(system, user, grammar=self.article_grammar())
+        return self.repair_json(system, user, topic, raw)
+
+    def article_grammar(self):
+        return self._grammar("article", gbnf_for_fields(ARTICLE_FIELDS))
+
+    def repair_json(self, system: str, user: str, topic: str, raw: str) -> Dict[str, Any]:
+        """Разбор ответа по грамматике + перезапрос только битых полей (см. chat_json)."""
+        usage = dict(self.last_usage)
+        JSON_STATS["responses"] += 1
+        data = _loads_article(raw)
+        parse_ok = data is not None
+        if not parse_ok:
+            JSON_STATS["parse_failures"] += 1
+            data = salvage_fields(raw)  # поля, которые успели закрыться до обрыва
+        retried = []
+        enums = dict(ARTICLE_FIELDS)
+        for _ in range(max(0, getenv_int("LLAMA_JSON_RETRIES", 1))):
+            bad = validate_article(data)
+            if not bad:
+                break
+            for field, reason in bad.items():
+                JSON_STATS["field_retries"] += 1
+                draft = json.dumps({k: v for k, v in data.items() if k != field}, ensure_ascii=False)[:2000]
+                fix = self.chat(
+                    system, FIELD_FIX_TMPL.format(user=user, draft=draft, field=field, reason=reason),
+                    grammar=self._grammar(field, gbnf_for_fields([(field, enums.get(field))], value_only=True)),
+                    max_tokens=None if field == "text" else 128,
+                )
+                for k, v in self.last_usage.items():
+                    usage[k] = usage.get(k, 0) + v
+                try:
+                    value = json.loads(fix)
+                except Exception:
+                    continue
+                if isinstance(value, str) and field not in validate_article({**data, field: value}):
+                    data[field] = value
+                    retried.append(field)
+        left = validate_article(data)
+        if left:
+            JSON_STATS["unrepaired"] += 1
+        self.last_usage = usage
+        self.last_json = {"parse_ok": parse_ok, "retried": retried, "unrepaired": sorted(left)}
+        if not data.get("text") and not parse_ok:
+            return plain_article(raw, topic)  # ответ уже учтён в JSON_STATS выше
+        return normalize_article(data, topic)
 
 class TransformersBackend:
     def __init__(self, model_id: str, max_tokens: int = 1024, temperature: float = 0.7):
@@ -367,13 +606,111 @@ class TransformersBackend:
             do_sample=True, temperature=temperature, top_p=0.9, repetition_penalty=1.05,
         )
         self.max_tokens, self.temperature = max_tokens, temperature
+        self.model = model_id
+        self.max_batch = getenv_int("HF_MAX_BATCH", 8)
+        self.last_usages: List[Dict[str, int]] = []
+        self.batch_stats: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def _prompt(system: str, user: str) -> str:
+        return f"<|system|>\n{system}\n</|system|>\n<|user|>\n{user}\n</|user|>\n<|assistant|>\n"
 
     def chat(self, system: str, user: str) -> str:
-        prompt = f"<|system|>\n{system}\n</|system|>\n<|user|>\n{user}\n</|user|>\n<|assistant|>\n"
+        prompt = self._prompt(system, user)
         out = self.pipe(prompt)[0]["generated_text"]
         m = re.search(r"<\|assistant\|>\n(.+)", out, re.S)
         return (m.group(1).strip() if m else out.strip())
 
+    # ---------- батч ----------
+    def _free_bytes(self) -> int:
+        import torch
+        if torch.cuda.is_available():
+            return int(torch.cuda.mem_get_info()[0] * 0.8)
+        try:
+            import psutil  # type: ignore
+            return int(psutil.virtual_memory().available * 0.5)
+        except ImportError:
+            pass
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024 // 2
+        except OSError:
+            pass
+        return 2 << 30
+
+    def _batch_size(self, max_len: int) -> int:
+        """Сколько последовательностей влезет: KV-кэш ≈ 2·слои·kv_heads·head_dim·байт на токен."""
+        cfg = self.pipe.model.config
+        layers = getattr(cfg, "num_hidden_layers", 32)
+        heads = getattr(cfg, "num_attention_heads", 32)
+        kv_heads = getattr(cfg, "num_key_value_heads", None) or heads
+        head_dim = getattr(cfg, "head_dim", None) or getattr(cfg, "hidden_size", 4096) // heads
+        per_tok = 2 * layers * kv_heads * head_dim * self.pipe.model.dtype.itemsize
+        per_seq = per_tok * (max_len + self.max_tokens) * 2  # ×2 — активации и запас
+        return max(1, min(self.max_batch, self._free_bytes() // max(1, per_seq)))
+
+    def _generate(self, prompts: List[str]):
+        import torch
+        tok, model = self.pipe.tokenizer, self.pipe.model
+        enc = tok(prompts, return_tensors="pt", padding=True).to(model.device)
+        with torch.inference_mode():
+            out = model.generate(
+                **enc, max_new_tokens=self.max_tokens, do_sample=True, temperature=self.temperature,
+                top_p=0.9, repetition_penalty=1.05, pad_token_id=tok.pad_token_id,
+            )
+        gen = out[:, enc["input_ids"].shape[1]:].tolist()
+        eos = tok.eos_token_id
+        res = []
+        for i, row in enumerate(gen):
+            n = row.index(eos) if eos in row else len(row)
+            res.append((tok.decode(row[:n], skip_special_tokens=True).strip(),
+                        {"prompt_tokens": int(enc["attention_mask"][i].sum()), "completion_tokens": n}))
+        return res
+
+    def chat_many(self, system: str, users: List[str]) -> List[str]:
+        """
+        Батчевая генерация: left-padding, размер батча по свободной памяти,
+        на OOM — батч пополам. Ответы возвращаются в порядке users.
+        """
+        import torch
+        tok = self.pipe.tokenizer
+        tok.padding_side = "left"  # для decoder-only генерация продолжается справа
+        if tok.pad_token_id is None:
+            tok.pad_token = tok.eos_token
+        prompts = [self._prompt(system, u) for u in users]
+        lens = [len(tok(p)["input_ids"]) for p in prompts]
+        # близкие по длине промпты в один батч — меньше паддинга
+        order = sorted(range(len(prompts)), key=lambda i: lens[i], reverse=True)
+        out: List[Any] = [None] * len(prompts)
+        self.batch_stats = []
+        pos, size = 0, None
+        while pos < len(order):
+            size = size or self._batch_size(lens[order[pos]])
+            idx = order[pos:pos + size]
+            t0 = time.perf_counter()
+            try:
+                res = self._generate([prompts[i] for i in idx])
+            except (torch.cuda.OutOfMemoryError, MemoryError, RuntimeError) as e:
+                if size == 1 or not ("out of memory" in str(e).lower() or isinstance(e, MemoryError)):
+                    raise
+                size = max(1, size // 2)
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+                print(f"[hf] OOM, batch size → {size}")
+                continue
+            dt = time.perf_counter() - t0
+            for i, r in zip(idx, res):
+                out[i] = r
+            new_toks = sum(u["completion_tokens"] for _, u in res)
+            st = {"size": len(idx), "new_tokens": new_toks, "seconds": round(dt, 3), "tok_s": round(new_toks / dt, 1) if dt else 0.0}
+            self.batch_stats.append(st)
+            print(f"[hf] batch {len(self.batch_stats)}: size={st['size']} new_tokens={new_toks} {st['tok_s']} tok/s")
+            pos += len(idx)
+        self.last_usages = [u for _, u in out]
+        return [text for text, _ in out]
+
 # ───────────────────────────────────────────────────────────────────────────
 # ПРОМПТЫ (дефолт) + переопределения из ENV/модуля
 # ───────────────────────────────────────────────────────────────────────────
@@ -425,14 +762,72 @@ SYSTEM_PROMPT, USER_TMPL = load_prompts()
 # ГЕНЕРАЦИЯ СТАТЬИ
 # ───────────────────────────────────────────────────────────────────────────
 
-def parse_json_or_fallback(raw: str, topic: str) -> Dict[str, Any]:
+# схема статьи: (поле, допустимые значения или None — любая строка)
+ARTICLE_FIELDS = (("title", None), ("section", ("main", "list", "side")), ("tags", None), ("text", None))
+
+_GBNF_COMMON = r'''
+string ::= "\"" char* "\""
+char ::= [^"\\\x7F\x00-\x1F] | "\\" (["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F])
+ws ::= | " " | "\n" | "\n  " | "\n    "
+'''
+
+def gbnf_for_fields(fields, value_only: bool = False) -> str:
+    """GBNF для JSON-объекта с полями в заданном порядке (или одного значения при value_only)."""
+    rules = []
+    for name, enum in fields:
+        alts = " | ".join('"\\"%s\\""' % v for v in enum) if enum else "string"
+        rules.append(f"{name}-value ::= {alts}")
+    if value_only:
+        root = f"root ::= {fields[0][0]}-value"
+    else:
+        members = ' "," ws '.join(f'"\\"{name}\\"" ws ":" ws {name}-value' for name, _ in fields)
+        root = f'root ::= "{{" ws {members} ws "}}"'
+    return "\n".join([root] + rules) + _GBNF_COMMON
+
+FIELD_FIX_TMPL = (
+    "{user}\n\nЧерновик (JSON без поля «{field}»):\n{draft}\n\n"
+    "Поле «{field}» {reason}. Верни ТОЛЬКО новое значение поля «{field}» одной JSON-строкой."
+)
+
+# счётчики разбора ответов моделей (за процесс): responses, parse_failures, field_retries, unrepaired
+JSON_STATS: Counter = Counter()
+
+def json_stats() -> Dict[str, Any]:
+    d = dict(JSON_STATS)
+    n = d.get("responses", 0)
+    d["parse_failure_rate"] = round(d.get("parse_failures", 0) / n, 4) if n else 0.0
+    return d
+
+def _loads_article(raw: str) -> Optional[Dict[str, Any]]:
     try:
         s = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip(), flags=re.I)
         data = json.loads(s)
     except Exception:
-        title = (raw.split("\n", 1)[0] or topic).strip()[:120]
-        body = "<p>" + re.sub(r"\n{2,}", "</p><p>", raw).strip() + "</p>"
-        data = {"title": title, "section": "list", "tags": topic, "text": body}
+        return None
+    return data if isinstance(data, dict) else None
+
+def salvage_fields(raw: str) -> Dict[str, Any]:
+    """Из оборванного JSON забираем поля, чьи строки успели закрыться."""
+    out = {}
+    for m in re.finditer(r'"(title|section|tags|text)"\s*:\s*("(?:[^"\\]|\\.)*")', raw or ""):
+        try:
+            out[m.group(1)] = json.loads(m.group(2))
+        except Exception:
+            pass
+    return out
+
+def validate_article(data: Dict[str, Any]) -> Dict[str, str]:
+    """{поле: что не так}; section не проверяем — у неё есть дефолт."""
+    bad = {}
+    if not str(data.get("title") or "").strip():
+        bad["title"] = "пустое"
+    if not str(data.get("tags") or "").strip():
+        bad["tags"] = "пустое"
+    if len(strip_html(str(data.get("text") or "")).strip()) < 200:
+        bad["text"] = "отсутствует или слишком короткое (нужно 2–5 абзацев HTML)"
+    return bad
+
+def normalize_article(data: Dict[str, Any], topic: str) -> Dict[str, Any]:
     data["title"] = (data.get("title") or topic)[:120]
     data["section"] = (data.get("section") or "list") if (data.get("section") in ("main","list","side")) else "list"
     text = (data.get("text") or "").strip()
@@ -441,10 +836,23 @@ def parse_json_or_fallback(raw: str, topic: str) -> Dict[str, Any]:
     data["text"] = text
     return data
 
-def generate_one(llm, topic: str, context: str) -> Dict[str, Any]:
-    user_prompt = USER_TMPL.format(topic=topic, context=context)
-    raw = llm.chat(SYSTEM_PROMPT, user_prompt)
-    data = parse_json_or_fallback(raw, topic)
+def plain_article(raw: str, topic: str) -> Dict[str, Any]:
+    """Ответ не JSON: первая строка — заголовок, абзацы — текст. В JSON_STATS не считается."""
+    title = (raw.split("\n", 1)[0] or topic).strip()[:120]
+    body = "<p>" + re.sub(r"\n{2,}", "</p><p>", raw).strip() + "</p>"
+    return normalize_article({"title": title, "section": "list", "tags": topic, "text": body}, topic)
+
+def parse_json_or_fallback(raw: str, topic: str) -> Dict[str, Any]:
+    JSON_STATS["responses"] += 1
+    data = _loads_article(raw)
+    if data is None:
+        JSON_STATS["parse_failures"] += 1
+        return plain_article(raw, topic)
+    return normalize_article(data, topic)
+
+def finish_article(llm, raw: Any, topic: str, timings: Dict[str, Any], usage: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Ответ модели (строка или уже разобранный dict) → статья (slug, теги, meta)."""
+    data = raw if isinstance(raw, dict) else parse_json_or_fallback(raw, topic)
     data["slug"] = slugify(data["title"])
     data["created_at"] = datetime.utcnow().isoformat()
     extra_tags = "Лакан,Жижек,Смулянский,психоанализ,идеология"
@@ -456,30 +864,80 @@ def generate_one(llm, topic: str, context: str) -> Dict[str, Any]:
             if t and t.lower() not in seen:
                 seen.add(t.lower()); merged.append(t)
         data["tags"] = ",".join(merged)
+    data["meta"] = {
+        "topic": topic,
+        "model": getattr(llm, "model", llm.__class__.__name__),
+        "timings": timings,
+        "usage": dict(usage if usage is not None else (getattr(llm, "last_usage", None) or {})),
+    }
+    if isinstance(raw, dict) and getattr(llm, "last_json", None):
+        data["meta"]["json"] = dict(llm.last_json)
     return data
 
-def write_payload(articles: List[Dict[str, Any]], path: str = "scripts/articles_payload.py"):
-    lines = ["ARTICLES = [\n"]
-    for a in articles:
-        text = a["text"].replace("\\", "\\\\").replace('"', '\\"')
-        title = a["title"].replace("\\", "\\\\").replace('"', '\\"')
-        tags = (a.get("tags") or "").replace("\\", "\\\\").replace('"', '\\"')
-        lines.append("  {\n")
-        lines.append(f'    "title": "{title}",\n')
-        lines.append(f'    "slug": "{a["slug"]}",\n')
-        lines.append(f'    "section": "{a["section"]}",\n')
-        if tags:
-            lines.append(f'    "tags": "{tags}",\n')
-        lines.append(f'    "created_at": "{a["created_at"]}",\n')
-        lines.append('    "text": (\n')
-        for part in textwrap.wrap(text, width=120, break_long_words=False, break_on_hyphens=False):
-            lines.append(f'      "{part}"\n')
-        lines.append("    )\n")
-        lines.append("  },\n")
-    lines.append("]\n")
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("".join(lines))
-    print(f"[ok] wrote {path}")
+def _prime(llm, context: str):
+    prime = getattr(llm, "prime_prefix", None)
+    if prime:
+        # system + контекст одинаковы для всех тем батча — считаем их один раз
+        try:
+            prime(SYSTEM_PROMPT, USER_TMPL.split("{topic}", 1)[0].format(context=context))
+        except Exception as e:
+            print("[warn] prefix cache disabled for this call:", e)
+
+def _use_grammar(llm) -> bool:
+    return isinstance(llm, LlamaCppBackend) and getenv_str("LLAMA_GRAMMAR", "1") != "0"
+
+def generate_one(llm, topic: str, context: str) -> Dict[str, Any]:
+    user_prompt = USER_TMPL.format(topic=topic, context=context)
+    _prime(llm, context)
+    t0 = time.perf_counter()
+    raw = llm.chat_json(SYSTEM_PROMPT, user_prompt, topic) if _use_grammar(llm) else llm.chat(SYSTEM_PROMPT, user_prompt)
+    return finish_article(llm, raw, topic, {"chat_s": round(time.perf_counter() - t0, 3)})
+
+def generate_one_stream(llm, topic: str, context: str) -> Iterator[tuple]:
+    """
+    ("delta", кусок текста) по мере генерации, в конце ("article", статья).
+    Закрытие генератора останавливает модель. Бэкенд без chat_stream — одна статья без дельт.
+    """
+    stream = getattr(llm, "chat_stream", None)
+    if stream is None:
+        yield "article", generate_one(llm, topic, context)
+        return
+    user_prompt = USER_TMPL.format(topic=topic, context=context)
+    _prime(llm, context)
+    grammar = _use_grammar(llm)
+    t0, ttft, parts = time.perf_counter(), None, []
+    it = stream(SYSTEM_PROMPT, user_prompt, grammar=llm.article_grammar()) if grammar else stream(SYSTEM_PROMPT, user_prompt)
+    try:
+        for piece in it:
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+            parts.append(piece)
+            yield "delta", piece
+    finally:
+        it.close()
+    raw: Any = "".join(parts)
+    if grammar:
+        raw = llm.repair_json(SYSTEM_PROMPT, user_prompt, topic, raw)
+    yield "article", finish_article(llm, raw, topic, {"chat_s": round(time.perf_counter() - t0, 3),
+                                                      "ttft_s": round(ttft or 0.0, 3)})
+
+def generate_many(llm, topics: List[str], context: str) -> List[Dict[str, Any]]:
+    """Несколько тем: батчем через llm.chat_many, если бэкенд умеет, иначе по одной."""
+    chat_many = getattr(llm, "chat_many", None)
+    if chat_many is None or len(topics) < 2:
+        return [generate_one(llm, t, context) for t in topics]
+    t0 = time.perf_counter()
+    raws = chat_many(SYSTEM_PROMPT, [USER_TMPL.format(topic=t, context=context) for t in topics])
+    dt = round(time.perf_counter() - t0, 3)
+    usages = list(getattr(llm, "last_usages", None) or [])
+    usages += [{}] * (len(topics) - len(usages))
+    return [finish_article(llm, raw, t, {"chat_s": dt, "batched": len(topics)}, u)
+            for raw, t, u in zip(raws, topics, usages)]
+
+def write_payload(articles: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> str:
+    """Дописывает статьи в append-only журнал (data/journal, см. scripts/journal.py)."""
+    from scripts.journal import write_payload as _journal_write
+    return _journal_write(articles, meta=meta)
 
 # ───────────────────────────────────────────────────────────────────────────
 # Импорт в БД: поддержка import_articles() и import_articles(articles)
@@ -514,49 +972,63 @@ def do_import_articles(articles: List[Dict[str, Any]]):
 # CLI
 # ───────────────────────────────────────────────────────────────────────────
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--n", type=int, default=3, help="сколько новых статей сгенерировать")
-    parser.add_argument("--last-k", type=int, default=getenv_int("LAST_K", 40))
-    parser.add_argument("--half-life", type=int, default=getenv_int("HALF_LIFE", 10))
-    parser.add_argument("--ctx-max-chars", type=int, default=getenv_int("CTX_MAX_CHARS", 8000))
-    parser.add_argument("--import", dest="do_import", action="store_true", help="сразу импортировать в БД")
-    args = parser.parse_args()
-
-    # 1) история
-    history = fetch_recent_articles_from_db(limit=args.last_k)
-    if not history:
-        print("[warn] нет статей в БД → контекст пустой (сгенерим без истории)")
-
-    # 2) контекст и темы
-    context = build_context(history, last_k=args.last_k, half_life=args.half_life, max_chars=args.ctx_max_chars)
-    topics = derive_topics(history, n=args.n, last_k=args.last_k, half_life=args.half_life)
-
-    # 3) модель
+def run(n: int = 3, do_import: bool = False, source: str = "cli", last_k: Optional[int] = None,
+        half_life: Optional[int] = None, max_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Один прогон локальной генерации (CLI, cron и /__tasks/gen_news в app.py).
+    last_k/half_life/max_chars по умолчанию — из ENV LAST_K/HALF_LIFE/CTX_MAX_CHARS."""
+    last_k = last_k if last_k is not None else getenv_int("LAST_K", 40)
+    half_life = half_life if half_life is not None else getenv_int("HALF_LIFE", 10)
+    max_chars = max_chars if max_chars is not None else getenv_int("CTX_MAX_CHARS", 8000)
     backend = getenv_str("LLM_BACKEND", "llama").lower()
     max_tokens = getenv_int("MAX_TOKENS", 1024)
     temperature = float(getenv_str("TEMPERATURE", "0.7"))
-
     if backend == "llama":
         repo = getenv_str("GGUF_REPO_ID", "TheBloke/Qwen2.5-7B-Instruct-GGUF")
         fname = getenv_str("GGUF_FILENAME", "qwen2.5-7b-instruct.Q4_K_M.gguf")
-        llm = LlamaCppBackend(repo, fname, max_tokens=max_tokens, temperature=temperature)
+        model = fname
     else:
         model_id = getenv_str("HF_MODEL_ID", "Qwen/Qwen2.5-7B-Instruct")
-        llm = TransformersBackend(model_id, max_tokens=max_tokens, temperature=temperature)
-
-    # 4) генерация
-    articles = []
-    for i, t in enumerate(topics):
-        art = generate_one(llm, t, context)
-        art["section"] = "main" if i == 0 else "list"
-        articles.append(art)
-
-    # 5) запись + импорт
-    write_payload(articles, path="scripts/articles_payload.py")
-    if args.do_import:
-        do_import_articles(articles)
-        print(f"[ok] imported {len(articles)} articles into DB")
+        model = model_id
+
+    # прогон (и его ошибка) — строка в generation_runs, как у generate_news_openai.run()
+    with gen_runs.track(source, "local:" + model, n_requested=n):
+        # 1–2) история → контекст и темы
+        with gen_runs.stage("context"):
+            context, topics = history_context(n, last_k=last_k, half_life=half_life, max_chars=max_chars)
+
+        # 3) модель
+        with gen_runs.stage("load"):
+            if backend == "llama":
+                llm = LlamaCppBackend(repo, fname, max_tokens=max_tokens, temperature=temperature)
+            else:
+                llm = TransformersBackend(model_id, max_tokens=max_tokens, temperature=temperature)
+
+        # 4) генерация (несколько тем — батчем, если бэкенд умеет)
+        articles = generate_many(llm, topics, context)
+        for i, art in enumerate(articles):
+            gen_runs.article(art)
+            art["section"] = "main" if i == 0 else "list"
+
+        # 5) журнал + импорт
+        with gen_runs.stage("journal"):
+            write_payload(articles)
+        print("[info] json:", json.dumps(json_stats(), ensure_ascii=False))
+        if do_import:
+            with gen_runs.stage("import"):
+                do_import_articles(articles)
+            print(f"[ok] imported {len(articles)} articles into DB")
+    return articles
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=3, help="сколько новых статей сгенерировать")
+    parser.add_argument("--last-k", type=int, default=getenv_int("LAST_K", 40))
+    parser.add_argument("--half-life", type=int, default=getenv_int("HALF_LIFE", 10))
+    parser.add_argument("--ctx-max-chars", type=int, default=getenv_int("CTX_MAX_CHARS", 8000))
+    parser.add_argument("--import", dest="do_import", action="store_true", help="сразу импортировать в БД")
+    args = parser.parse_args()
+    run(args.n, do_import=args.do_import, last_k=args.last_k, half_life=args.half_life,
+        max_chars=args.ctx_max_chars)
 
 if __name__ == "__main__":
     main()
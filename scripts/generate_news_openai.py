@@ -7,18 +7,24 @@
 - строит контекст с экспоненциальным затуханием,
 - извлекает темы,
 - генерит JSON-статьи через OpenAI Chat (модель по ENV, по умолчанию gpt-4o-mini),
-- добавляет изображение (OpenAI Images или placeholder),
-- пишет scripts/articles_payload.py,
+- добавляет изображение (OpenAI Images или placeholder) — сразу или отложенно
+  (IMAGE_DEFER=1: заглушка + задача для scripts/image_worker.py),
+- дописывает статьи в журнал data/journal (scripts/journal.py),
 - по желанию импортирует в БД (scripts.import_articles.import_articles),
 - экспортирует функцию run(...) для /newsgen/run.
 """
 
 from __future__ import annotations
-import os, re, json, textwrap, math, html, base64, io, pathlib, random
+import os, sys, re, json, math, base64, io, pathlib, random, time
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
-import requests
-import urllib.parse
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# как в остальных scripts/: запуск из корня репо, модули — только как scripts.* (один
+# openai_client на процесс, иначе повторы/breaker не попадают в строку generation_runs)
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts import openai_client, gen_runs  # type: ignore  # noqa: E402
+from scripts.textproc import slugify, strip_html  # type: ignore  # noqa: E402
 
 # ───────────────────────────────────────────────────────────────────────────
 # .env (локально полезно; на Railway можно не нужно)
@@ -31,44 +37,7 @@ except Exception:
     pass
 
 # ───────────────────────────────────────────────────────────────────────────
-# Утилиты и безопасный slugify
-def _wire_slugify():
-    # 1) попробовать slugify из твоего проекта (разные места)
-    for path in ("app", "app.utils", "app.helpers", "app.lib", "app.core", "app.common"):
-        try:
-            mod = __import__(path, fromlist=["*"])
-            if hasattr(mod, "slugify") and callable(getattr(mod, "slugify")):
-                return getattr(mod, "slugify")
-        except Exception:
-            pass
-    # 2) python-slugify
-    try:
-        from slugify import slugify as _ext  # type: ignore
-        return _ext
-    except Exception:
-        pass
-    # 3) простой фолбэк для кириллицы
-    RU = {
-        "а":"a","б":"b","в":"v","г":"g","д":"d","е":"e","ё":"e","ж":"zh","з":"z","и":"i","й":"i",
-        "к":"k","л":"l","м":"m","н":"n","о":"o","п":"p","р":"r","с":"s","т":"t","у":"u","ф":"f",
-        "х":"h","ц":"c","ч":"ch","ш":"sh","щ":"sch","ы":"y","э":"e","ю":"yu","я":"ya","ь":"","ъ":""
-    }
-    def _fallback(s: str) -> str:
-        s = (s or "").strip().lower()
-        t = "".join(RU.get(ch, ch) for ch in s)
-        t = re.sub(r"[^a-z0-9]+", "-", t)
-        t = re.sub(r"-{2,}", "-", t).strip("-")
-        return t
-    return _fallback
-
-slugify = _wire_slugify()
-
-def strip_html(text: str) -> str:
-    text = re.sub(r"<br\s*/?>", "\n", text, flags=re.I)
-    text = re.sub(r"</p\s*>", "\n", text, flags=re.I)
-    text = re.sub(r"<[^>]+>", "", text)
-    return html.unescape(text)
-
+# Утилиты (slugify / strip_html — scripts/textproc.py)
 def getenv_int(name: str, default: int) -> int:
     try:
         return int(os.getenv(name, "").strip())
@@ -199,9 +168,8 @@ def build_context(arts: List[Dict[str, Any]], last_k: int, half_life: int, max_c
                 ds = ""
         title = (a.get("title") or "").strip()
         tags = (a.get("tags") or "").strip()
-        plain = strip_html(a.get("text") or "")
         block_len = int(400 * (1 + 3 * w))  # 400..1600
-        brief = plain[:block_len].strip()
+        brief = strip_html(a.get("text") or "", limit=block_len)[:block_len].strip()
         head = f"- ({ds}) {title}"
         if tags:
             head += f" — теги: {tags}"
@@ -299,35 +267,72 @@ class OpenAIChat:
         api_key = _sanitize_api_key(raw_key)
         _clean_openai_env_nonascii()
         from openai import OpenAI  # type: ignore
-        self.client = OpenAI(api_key=api_key, timeout=45)
+        self.client = OpenAI(api_key=api_key, timeout=45, max_retries=0)  # повторы — в openai_client.call
         self.model = model
         self.max_tokens = max_tokens
         self.temperature = temperature
+        self.last_usage: Dict[str, int] = {}
+
+    def _remember_usage(self, resp) -> None:
+        u = getattr(resp, "usage", None)
+        self.last_usage = {
+            "prompt_tokens": getattr(u, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(u, "completion_tokens", 0) or 0,
+        } if u else {}
+
+    def _create(self, messages: List[Dict[str, str]], json_mode: bool = True):
+        params: Dict[str, Any] = dict(model=self.model, messages=messages,
+                                      temperature=self.temperature, max_tokens=self.max_tokens)
+        if json_mode:
+            params["response_format"] = {"type": "json_object"}
+        return openai_client.call(
+            lambda timeout: self.client.chat.completions.create(**params, timeout=timeout),
+            name="openai-chat", key=openai_client.request_key("chat", params),
+        )
 
     def chat_json(self, system: str, user: str) -> str:
-        from openai import AuthenticationError  # type: ignore
+        """
+        Один запрос в JSON-режиме; повторы, брейкер и дедлайн — в scripts/openai_client.
+        Второй запрос без response_format — только если модель/прокси этот режим не поддерживает.
+        """
+        messages = [{"role":"system","content":system},{"role":"user","content":user}]
         try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role":"system","content":system},{"role":"user","content":user}],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type":"json_object"},
-                timeout=45
-            )
-            return resp.choices[0].message.content.strip()
-        except AuthenticationError:
-            raise
-        except Exception:
-            # Фолбэк без строгого JSON — пусть модель вернёт текст, мы распарсим
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role":"system","content":system},
-                          {"role":"user","content":user + "\n\nВерни СТРОГО один JSON-объект."}],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-            )
-            return resp.choices[0].message.content.strip()
+            resp = self._create(messages)
+        except openai_client.LLMError as e:
+            if e.kind != "bad_request" or "response_format" not in str(e):
+                raise
+            gen_runs.fallback("chat:no_json_mode")
+            resp = self._create([{"role":"system","content":system},
+                                 {"role":"user","content":user + "\n\nВерни СТРОГО один JSON-объект."}],
+                                json_mode=False)
+        self._remember_usage(resp)
+        return resp.choices[0].message.content.strip()
+
+    def chat(self, system: str, user: str) -> str:
+        """Интерфейс локальных бэкендов (scripts/generate_news.generate_one)."""
+        return self.chat_json(system, user)
+
+    def chat_stream(self, system: str, user: str) -> Iterator[str]:
+        """Дельты ответа по мере генерации; закрытие генератора закрывает HTTP-поток."""
+        # повторяем только открытие потока: оборванный на середине ответ не переигрываем
+        stream = openai_client.call(lambda timeout: self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role":"system","content":system},{"role":"user","content":user}],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            response_format={"type":"json_object"},
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout,
+        ), name="openai-chat")
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    self._remember_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
 
 # ───────────────────────────────────────────────────────────────────────────
 # Картинки: openai | placeholder
@@ -339,11 +344,12 @@ class ImageBackend:
       - auto     : пробуем openai → fallback на commons
       - placeholder : как сейчас (1x1 PNG)
     """
-    def __init__(self):
-        self.backend = (os.getenv("IMAGE_BACKEND") or "placeholder").lower()
+    def __init__(self, backend: Optional[str] = None):
+        self.backend = (backend or os.getenv("IMAGE_BACKEND") or "placeholder").lower()
         self.model = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1")
         self.size = os.getenv("IMAGE_SIZE", "1024x1024")
         self.embed_data_url = (os.getenv("IMAGE_EMBED_DATA_URL", "true").lower() == "true")
+        self.last: Dict[str, Any] = {}  # последний generate(): фактический бэкенд и байты (gen_runs)
 
         # куда кладём реальные файлы (если embed_data_url=false)
         self.static_dir = pathlib.Path("static/news_images")
@@ -357,17 +363,20 @@ class ImageBackend:
                 if raw_key:
                     api_key = _sanitize_api_key(raw_key)
                     from openai import OpenAI  # type: ignore
-                    self.client = OpenAI(api_key=api_key)
+                    self.client = OpenAI(api_key=api_key, max_retries=0)
                 else:
                     if self.backend == "openai":
                         print("[warn] IMAGE_BACKEND=openai, но OPENAI_API_KEY отсутствует → fallback=placeholder")
                         self.backend = "placeholder"
+                        gen_runs.fallback("image:init→placeholder")
             except Exception as e:
                 print("[warn] image backend init failed, fallback to commons:", e)
                 self.backend = "commons"
+                gen_runs.fallback("image:init→commons")
 
     # ---------- placeholder ----------
-    def _placeholder_data_url(self) -> str:
+    @staticmethod
+    def _placeholder_data_url() -> str:
         tiny_png = (
             b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01"
             b"\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\x0bIDATx\x9cc``\x00\x00\x00\x04"
@@ -377,83 +386,77 @@ class ImageBackend:
         return f"data:image/png;base64,{b64}"
 
     # ---------- commons ----------
+    @staticmethod
+    def _rank_commons(page: Dict[str, Any]) -> Tuple[int, int, int]:
+        """Ключ сортировки кандидата: свободная лицензия → достаточный размер → порядок поиска."""
+        info = (page.get("imageinfo") or [{}])[0]
+        meta = info.get("extmetadata") or {}
+        lic = ((meta.get("LicenseShortName") or {}).get("value") or "").lower()
+        if "public domain" in lic or "cc0" in lic or lic == "pd":
+            lic_score = 2
+        elif lic.startswith("cc"):
+            lic_score = 1
+        else:
+            lic_score = 0
+        w = int(info.get("width") or 0)
+        size_score = 2 if w >= 1024 else (1 if w >= 600 else 0)
+        return (-lic_score, -size_score, int(page.get("index") or 0))
+
     def _search_commons_url(self, query: str) -> Optional[str]:
-        """Ищем файл в Wikimedia Commons и возвращаем URL (thumb или оригинал)."""
+        """
+        Ищем файл в Wikimedia Commons за один запрос (generator=search + prop=imageinfo,
+        как search_wikimedia_pd) и возвращаем URL лучшего кандидата (thumb или оригинал).
+        """
+        from scripts.fetch_images_auto import http_get, WMC_API  # type: ignore
         try:
-            # 1) поиск по файловому пространству имён (namespace=6 — File:)
             params = {
                 "action": "query",
-                "list": "search",
-                "srsearch": query,
-                "srnamespace": 6,
-                "srlimit": 10,
+                "generator": "search",
+                "gsrsearch": query,
+                "gsrnamespace": "6",  # File:
+                "gsrlimit": "10",
+                "prop": "imageinfo",
+                "iiprop": "url|mime|size|extmetadata",
+                "iiextmetadatafilter": "LicenseShortName",
+                "iiurlwidth": "1024",
                 "format": "json",
+                "formatversion": "2",
                 "origin": "*",
             }
-            r = requests.get("https://commons.wikimedia.org/w/api.php", params=params, timeout=8)
+            r = http_get(WMC_API, params=params, timeout=8)
             r.raise_for_status()
-            data = r.json()
-            hits = data.get("query", {}).get("search", []) or []
-            for h in hits:
-                title = h.get("title")  # типа "File:Something.png"
-                if not title:
+            pages = (r.json().get("query") or {}).get("pages") or []
+            cands = []
+            for page in pages:
+                infos = page.get("imageinfo") or []
+                if not infos or not str(infos[0].get("mime") or "").startswith("image/"):
                     continue
-                # 2) берём инфо по файлу (thumb 1024, либо full url)
-                p2 = {
-                    "action": "query",
-                    "titles": title,
-                    "prop": "imageinfo",
-                    "iiprop": "url|mime",
-                    "iiurlwidth": "1024",
-                    "format": "json",
-                    "origin": "*",
-                }
-                r2 = requests.get("https://commons.wikimedia.org/w/api.php", params=p2, timeout=8)
-                r2.raise_for_status()
-                d2 = r2.json()
-                pages = d2.get("query", {}).get("pages", {}) or {}
-                for _, page in pages.items():
-                    infos = page.get("imageinfo") or []
-                    if not infos:
-                        continue
-                    info = infos[0]
-                    url = info.get("thumburl") or info.get("url")
-                    if url and isinstance(url, str) and url.lower().startswith("http"):
-                        return url
+                url = infos[0].get("thumburl") or infos[0].get("url")
+                if url and isinstance(url, str) and url.lower().startswith("http"):
+                    cands.append((self._rank_commons(page), url))
+            if cands:
+                return min(cands)[1]
         except Exception as e:
             print("[warn] commons search failed:", e)
         return None
 
     def _download_to_static(self, url: str, slug_hint: str) -> Optional[str]:
-        """Скачиваем URL в static/news_images/<slug>.<ext> и возвращаем web-путь, либо None."""
-        try:
-            r = requests.get(url, timeout=12, stream=True)
-            r.raise_for_status()
-            # определить расширение
-            ext = None
-            ctype = r.headers.get("Content-Type", "").lower()
-            if "jpeg" in ctype or "jpg" in ctype:
-                ext = ".jpg"
-            elif "png" in ctype:
-                ext = ".png"
-            elif "webp" in ctype:
-                ext = ".webp"
-            else:
-                # из URL
-                path = urllib.parse.urlparse(url).path
-                _, ext = os.path.splitext(path)
-                if not ext:
-                    ext = ".jpg"
-            fname = f"{slug_hint}{ext}"
-            fpath = self.static_dir / fname
-            with open(fpath, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            return f"/static/news_images/{fname}"
-        except Exception as e:
-            print("[warn] download failed:", e)
+        """Скачиваем URL в дедуплицирующий кэш (scripts/image_cache.py) и возвращаем web-путь, либо None."""
+        from scripts.image_cache import default_cache  # type: ignore
+        cache = default_cache()
+        blob = cache.fetch(url)
+        return cache.src_for(blob, slug_hint) if blob else None
+
+    def _commons_src(self, topic: str, slug_hint: str) -> Optional[str]:
+        url = self._search_commons_url(topic)
+        if not url:
             return None
+        if self.embed_data_url:
+            # инлайнить как data-url (дороже по размеру ответа; обычно не надо)
+            from scripts.image_cache import default_cache  # type: ignore
+            blob = default_cache().fetch(url)
+            return default_cache().data_url(blob) if blob else None
+        return self._download_to_static(url, slug_hint)
 
     # ---------- openai ----------
     def _openai_image(self, topic: str, slug_hint: str) -> Optional[str]:
@@ -461,16 +464,19 @@ class ImageBackend:
             return None
         try:
             prompt = f"Editorial illustration for a Russian future news article about: {topic}. Minimalist, news style."
-            res = self.client.images.generate(model=self.model, prompt=prompt, size=self.size)
+            # у картинки есть дешёвые фолбэки (commons/placeholder) — меньше попыток, брейкер отдельный
+            res = openai_client.call(
+                lambda timeout: self.client.images.generate(model=self.model, prompt=prompt, size=self.size, timeout=timeout),
+                name="openai-images", key=openai_client.request_key("image", self.model, prompt, self.size),
+                max_attempts=2, attempt_timeout_s=120, deadline_s=180,
+            )
             b64 = res.data[0].b64_json
             if self.embed_data_url:
                 return f"data:image/png;base64,{b64}"
             else:
-                data = base64.b64decode(b64)
-                path = self.static_dir / f"{slug_hint}.png"
-                with open(path, "wb") as f:
-                    f.write(data)
-                return f"/static/news_images/{slug_hint}.png"
+                from scripts.image_cache import default_cache  # type: ignore
+                blob = default_cache().store_bytes(base64.b64decode(b64))
+                return default_cache().src_for(blob, slug_hint) if blob else None
         except Exception as e:
             print("[warn] openai image failed:", e)
             return None
@@ -482,57 +488,59 @@ class ImageBackend:
         """
         alt = f"иллюстрация: {topic}"
         src: Optional[str] = None
+        used = self.backend
 
         if self.backend == "openai":
             src = self._openai_image(topic, slug_hint)
         elif self.backend == "commons":
-            url = self._search_commons_url(topic)
-            if url:
-                if self.embed_data_url:
-                    # инлайнить как data-url (дороже по размеру ответа; обычно не надо)
-                    b = requests.get(url, timeout=12).content
-                    b64 = base64.b64encode(b).decode("ascii")
-                    src = f"data:image/{('png' if url.endswith('.png') else 'jpeg')};base64,{b64}"
-                else:
-                    src = self._download_to_static(url, slug_hint)
+            src = self._commons_src(topic, slug_hint)
         elif self.backend == "auto":
             # пробуем openai → commons → placeholder
-            src = self._openai_image(topic, slug_hint)
+            used, src = "openai", self._openai_image(topic, slug_hint)
             if not src:
-                url = self._search_commons_url(topic)
-                if url:
-                    if self.embed_data_url:
-                        b = requests.get(url, timeout=12).content
-                        b64 = base64.b64encode(b).decode("ascii")
-                        src = f"data:image/{('png' if url.endswith('.png') else 'jpeg')};base64,{b64}"
-                    else:
-                        src = self._download_to_static(url, slug_hint)
+                if self.client:
+                    gen_runs.fallback("image:openai→commons")
+                used, src = "commons", self._commons_src(topic, slug_hint)
 
         if not src:
+            if used != "placeholder":
+                gen_runs.fallback(f"image:{used}→placeholder")
+            used = "placeholder"
             # финальный фолбэк — прозрачный пиксель
             if self.embed_data_url:
                 src = self._placeholder_data_url()
             else:
-                # положим прозрачный PNG в static, чтобы ссылка не была 404
+                # положим прозрачный PNG в static (один файл на всех через кэш), чтобы ссылка не была 404
                 data_url = self._placeholder_data_url()
-                b = base64.b64decode(data_url.split(",",1)[1])
-                path = self.static_dir / f"{slug_hint}.png"
                 try:
-                    with open(path, "wb") as f:
-                        f.write(b)
-                    src = f"/static/news_images/{slug_hint}.png"
+                    from scripts.image_cache import default_cache  # type: ignore
+                    blob = default_cache().store_bytes(base64.b64decode(data_url.split(",",1)[1]))
+                    src = default_cache().src_for(blob, slug_hint) if blob else data_url
                 except Exception:
                     src = data_url
 
         inline = src.startswith("data:")
+        self.last = {"backend": used, "bytes": self._src_bytes(src)}
         return f'<figure><img src="{src}" alt="{alt}"/></figure>', inline
 
+    @staticmethod
+    def _src_bytes(src: str) -> int:
+        """Размер картинки: data URL — по base64, web-путь /static/... — по файлу."""
+        if src.startswith("data:"):
+            b64 = src.split(",", 1)[-1]
+            return len(b64) * 3 // 4 - b64[-2:].count("=")
+        try:
+            return pathlib.Path(src.lstrip("/")).stat().st_size
+        except OSError:
+            return 0
+
 # Парсинг JSON от модели
 def parse_json_or_fallback(raw: str, topic: str) -> Dict[str, Any]:
     try:
         s = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip(), flags=re.I)
         data = json.loads(s)
     except Exception:
+        gen_runs.fallback("parse:raw_text")
         title = (raw.split("\n", 1)[0] or topic).strip()[:120]
         body = "<p>" + re.sub(r"\n{2,}", "</p><p>", raw).strip() + "</p>"
         data = {"title": title, "section": "list", "tags": topic, "text": body}
@@ -548,9 +556,18 @@ def parse_json_or_fallback(raw: str, topic: str) -> Dict[str, Any]:
 
 # ───────────────────────────────────────────────────────────────────────────
 # Генерация одной статьи
-def generate_one(chat: OpenAIChat, images: ImageBackend, topic: str, context: str) -> Dict[str, Any]:
+def generate_one(chat: OpenAIChat, images: ImageBackend, topic: str, context: str,
+                 defer_image: bool = False) -> Dict[str, Any]:
     user_prompt = USER_TMPL.format(topic=topic, context=context)
+    t0 = time.perf_counter()
     raw = chat.chat_json(SYSTEM_PROMPT, user_prompt)
+    t_chat = time.perf_counter() - t0
+    return finish_article(raw, topic, chat.model, dict(chat.last_usage), images,
+                          t_chat=t_chat, defer_image=defer_image)
+
+def finish_article(raw: str, topic: str, model: str, usage: Dict[str, int], images: Optional[ImageBackend],
+                   t_chat: float = 0.0, defer_image: bool = False) -> Dict[str, Any]:
+    """Ответ модели → статья: теги, slug, картинка, meta (общая часть generate_one и batch-режима)."""
     data = parse_json_or_fallback(raw, topic)
     # теги — добавим характерные, без дублей
     extra_tags = "Лакан,Жижек,Смулянский,психоанализ,идеология"
@@ -565,40 +582,39 @@ def generate_one(chat: OpenAIChat, images: ImageBackend, topic: str, context: st
     data["slug"] = slugify(data["title"])
     data["created_at"] = datetime.utcnow().isoformat()
 
-    # картинка (inline data-url или файл в static/)
-    img_html, inline = images.generate(topic=data["title"], slug_hint=data["slug"])
+    # картинка (inline data-url или файл в static/); в отложенном режиме — заглушка,
+    # настоящую подставит scripts/image_worker.py
+    t0 = time.perf_counter()
+    if defer_image:
+        from scripts.image_worker import pending_figure  # type: ignore
+        img_html, inline = pending_figure(data["slug"], f"иллюстрация: {data['title']}"), True
+        data["image_pending"] = True
+    else:
+        img_html, inline = images.generate(topic=data["title"], slug_hint=data["slug"])
+    t_image = time.perf_counter() - t0
     data["text"] = img_html + data["text"]
     data["image_inline"] = inline
+    data["meta"] = {
+        "topic": topic,
+        "model": model,
+        "image_backend": "deferred" if defer_image else images.backend,
+        "image_used": "deferred" if defer_image else images.last.get("backend"),
+        "image_bytes": 0 if defer_image else images.last.get("bytes", 0),
+        "timings": {"chat_s": round(t_chat, 3), "image_s": round(t_image, 3)},
+        "usage": usage,
+    }
     return data
 
 # ───────────────────────────────────────────────────────────────────────────
-# Запись payload в файл (для дебага/миграций)
-def write_payload(articles: List[Dict[str, Any]], path: str = "scripts/articles_payload.py"):
-    lines = ["ARTICLES = [\n"]
-    for a in articles:
-        text = a["text"].replace("\\", "\\\\").replace('"', '\\"')
-        title = a["title"].replace("\\", "\\\\").replace('"', '\\"')
-        tags = (a.get("tags") or "").replace("\\", "\\\\").replace('"', '\\"')
-        lines.append("  {\n")
-        lines.append(f'    "title": "{title}",\n')
-        lines.append(f'    "slug": "{a["slug"]}",\n')
-        lines.append(f'    "section": "{a["section"]}",\n')
-        if tags:
-            lines.append(f'    "tags": "{tags}",\n')
-        lines.append(f'    "created_at": "{a["created_at"]}",\n')
-        lines.append('    "text": (\n')
-        for part in textwrap.wrap(text, width=120, break_long_words=False, break_on_hyphens=False):
-            lines.append(f'      "{part}"\n')
-        lines.append("    )\n")
-        lines.append("  },\n")
-    lines.append("]\n")
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("".join(lines))
-    print(f"[ok] wrote {path}")
+# Запись в append-only журнал (data/journal, см. scripts/journal.py)
+def write_payload(articles: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> str:
+    from scripts.journal import write_payload as _journal_write  # type: ignore
+    return _journal_write(articles, meta=meta)
 
 # ───────────────────────────────────────────────────────────────────────────
 # Публичный API для блюпринта /newsgen/run
-__all__ = ["run", "OpenAIChat", "ImageBackend", "build_context", "derive_topics", "fetch_recent_articles_from_db"]
+__all__ = ["run", "OpenAIChat", "ImageBackend", "build_context", "derive_topics", "fetch_recent_articles_from_db",
+           "finish_article"]
 
 def run(
     n: int = 3,
@@ -607,11 +623,22 @@ def run(
     ctx_max_chars: int | None = None,
     do_import: bool = False,
     topics_override: List[str] | None = None,
+    defer_images: bool | None = None,
+    source: str = "api",
 ) -> Dict[str, Any]:
     """
     Генерит N статей и (опционально) импортирует в БД.
-    Возвращает dict: {articles, topics, context, imported}
+    defer_images (или IMAGE_DEFER=1) вместе с do_import: каждая статья импортируется
+    сразу после текста с заглушкой картинки, картинки подбирает фоновый воркер.
+    Прогон пишется в generation_runs (scripts/gen_runs.py); source — api | cli | cron.
+    Возвращает dict: {articles, topics, context, imported, image_tasks}
     """
+    model_id = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    with gen_runs.track(source, model_id, n_requested=len(topics_override) if topics_override else n):
+        return _run(n, last_k, half_life, ctx_max_chars, do_import, topics_override, defer_images, model_id)
+
+def _run(n: int, last_k: int | None, half_life: int | None, ctx_max_chars: int | None, do_import: bool,
+         topics_override: List[str] | None, defer_images: bool | None, model_id: str) -> Dict[str, Any]:
     # параметры
     last_k        = int(last_k if last_k is not None else getenv_int("LAST_K", 40))
     half_life     = int(half_life if half_life is not None else getenv_int("HALF_LIFE", 10))
@@ -621,36 +648,58 @@ def run(
         temperature = float(os.getenv("TEMPERATURE", "0.7"))
     except Exception:
         temperature = 0.7
-    model_id      = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
     # история → контекст и темы
-    history = fetch_recent_articles_from_db(limit=last_k)
-    context = build_context(history, last_k=last_k, half_life=half_life, max_chars=ctx_max_chars)
-    topics  = topics_override or derive_topics(history, n=n, last_k=last_k, half_life=half_life)
+    with gen_runs.stage("context"):
+        history = fetch_recent_articles_from_db(limit=last_k)
+        context = build_context(history, last_k=last_k, half_life=half_life, max_chars=ctx_max_chars)
+        topics  = topics_override or derive_topics(history, n=n, last_k=last_k, half_life=half_life)
 
     # клиенты
     chat   = OpenAIChat(model=model_id, max_tokens=max_tokens, temperature=temperature)
     images = ImageBackend()
 
+    if defer_images is None:
+        defer_images = os.getenv("IMAGE_DEFER", "0") == "1"
+    if defer_images and not do_import:
+        print("[warn] defer_images без import некуда патчить — картинки генерим сразу")
+        defer_images = False
+
     # генерация
     articles: List[Dict[str, Any]] = []
     for i, t in enumerate(topics):
-        art = generate_one(chat, images, t, context)
+        art = generate_one(chat, images, t, context, defer_image=defer_images)
+        gen_runs.article(art)
         art["section"] = "main" if i == 0 else "list"
         if not art.get("created_at"):
             art["created_at"] = datetime.utcnow().isoformat()
+        if defer_images:
+            # публикуем текст сразу, не дожидаясь остальных статей
+            from scripts.import_articles import import_articles  # type: ignore
+            with gen_runs.stage("import"):
+                import_articles([art])
         articles.append(art)
 
-    # payload + импорт
-    write_payload(articles, path="scripts/articles_payload.py")
+    # журнал + импорт
+    with gen_runs.stage("journal"):
+        write_payload(articles)
 
     imported = False
-    if do_import:
+    image_tasks = 0
+    if defer_images:
+        from scripts import image_worker  # type: ignore
+        imported = True
+        with gen_runs.stage("import"):
+            image_tasks = image_worker.enqueue([(a["slug"], a["title"]) for a in articles])
+        image_worker.kick()
+    elif do_import:
         try:
             from scripts.import_articles import import_articles  # type: ignore
-            import_articles(articles)
+            with gen_runs.stage("import"):
+                import_articles(articles)
             imported = True
         except Exception as e:
+            gen_runs.fallback("import:failed")
             print("[warn] import_articles failed:", e)
 
     return {
@@ -658,6 +707,7 @@ def run(
         "topics": topics,
         "context": context,
         "imported": imported,
+        "image_tasks": image_tasks,
     }
 
 # ───────────────────────────────────────────────────────────────────────────
@@ -670,6 +720,7 @@ if __name__ == "__main__":
     p.add_argument("--half-life", type=int, dest="half_life")
     p.add_argument("--ctx-max-chars", type=int, dest="ctx_max_chars")
     p.add_argument("--import", dest="do_import", action="store_true")
+    p.add_argument("--defer-images", dest="defer_images", action="store_true", default=None)
     args = p.parse_args()
 
     out = run(
@@ -678,5 +729,10 @@ if __name__ == "__main__":
         half_life=args.half_life,
         ctx_max_chars=args.ctx_max_chars,
         do_import=args.do_import,
+        defer_images=args.defer_images,
+        source="cli",
     )
+    if out.get("image_tasks"):
+        from scripts.image_worker import process_pending  # type: ignore
+        print(process_pending())  # CLI: дождаться картинок в этом же процессе
     print(json.dumps(out, ensure_ascii=False)[:1000])
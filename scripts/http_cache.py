@@ -0,0 +1,293 @@
+# scripts/http_cache.py
+# -*- coding: utf-8 -*-
+"""
+Персистентный кэш GET-ответов поисковых API (Openverse, Wikimedia Commons).
+
+- ключ: метод + URL + нормализованные параметры (порядок, регистр и пробелы запроса);
+- хранение: SQLite (WAL), TTL, вытеснение самых давно читаемых при превышении лимита;
+- Cache-Control: не хранится только no-store (private не мешает — кэш клиентский,
+  однопользовательский); max-age задаёт TTL, max-age=0/no-cache — ревалидация при
+  каждом чтении; HTTP_CACHE_MIN_TTL поднимает TTL по max-age (MediaWiki API отдаёт
+  "private, must-revalidate, max-age=0" без валидаторов); устаревшие записи с
+  ETag/Last-Modified ревалидируются условным запросом (304 → продлеваем);
+- имена заголовков хранятся и сравниваются в нижнем регистре;
+- негативные ответы (400/404 и пустые выдачи — они такие же 200) тоже кэшируются;
+- 429/5xx и сетевые ошибки не кэшируются.
+
+ENV:
+  HTTP_CACHE=1                    # 0 — выключить
+  HTTP_CACHE_PATH=data/http_cache.sqlite
+  HTTP_CACHE_TTL=86400            # сек, если сервер не прислал max-age
+  HTTP_CACHE_NEGATIVE_TTL=3600
+  HTTP_CACHE_MIN_TTL=0            # сек, нижняя граница TTL по max-age (напр. 3600 для Commons)
+  HTTP_CACHE_MAX_ENTRIES=20000
+
+  python scripts/http_cache.py stats | purge | selftest
+"""
+
+import os, re, json, time, sqlite3, hashlib, threading
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlencode
+
+NORMALIZE_PARAMS = ("q", "gsrsearch", "srsearch")  # поисковые строки: регистр/пробелы не важны
+NEGATIVE_STATUSES = (400, 404, 410)
+KEEP_HEADERS = ("etag", "last-modified", "content-type", "cache-control")
+
+def _getenv_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+def _lower(headers) -> Dict[str, str]:
+    """Имена заголовков в нижнем регистре: у requests они регистронезависимы, в JSON — нет."""
+    return {str(k).lower(): v for k, v in (headers or {}).items()}
+
+def _ci(headers: Dict[str, str]):
+    try:
+        from requests.structures import CaseInsensitiveDict  # type: ignore
+        return CaseInsensitiveDict(headers)
+    except ImportError:
+        return headers
+
+class CachedResponse:
+    """Минимум интерфейса requests.Response, который используют поисковые функции."""
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes, from_cache: bool):
+        self.url, self.status_code, self.headers, self.content = url, status_code, _ci(headers), content
+        self.from_cache = from_cache
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return json.loads(self.content or b"null")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} for url: {self.url}", response=self)
+
+def normalize_params(params: Optional[Dict[str, Any]]) -> str:
+    items = []
+    for k, v in sorted((params or {}).items()):
+        v = str(v)
+        if k in NORMALIZE_PARAMS:
+            v = re.sub(r"\s+", " ", v).strip().lower()
+        items.append((k, v))
+    return urlencode(items)
+
+def _max_age(cache_control: str) -> Optional[int]:
+    m = re.search(r"(?:s-maxage|max-age)\s*=\s*(\d+)", cache_control or "", re.I)
+    return int(m.group(1)) if m else None
+
+class HttpCache:
+    def __init__(self, path: Optional[str] = None, ttl: Optional[int] = None,
+                 negative_ttl: Optional[int] = None, max_entries: Optional[int] = None,
+                 min_ttl: Optional[int] = None):
+        self.path = path or os.getenv("HTTP_CACHE_PATH", "data/http_cache.sqlite")
+        self.ttl = ttl if ttl is not None else _getenv_int("HTTP_CACHE_TTL", 86400)
+        self.negative_ttl = negative_ttl if negative_ttl is not None else _getenv_int("HTTP_CACHE_NEGATIVE_TTL", 3600)
+        self.max_entries = max_entries if max_entries is not None else _getenv_int("HTTP_CACHE_MAX_ENTRIES", 20000)
+        self.min_ttl = min_ttl if min_ttl is not None else _getenv_int("HTTP_CACHE_MIN_TTL", 0)
+        self.hits = self.misses = self.revalidated = 0
+        self._local = threading.local()
+        self._writes = 0
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._db().executescript("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_http_cache_access ON http_cache (last_access);
+        """)
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(method: str, url: str, params: Optional[Dict[str, Any]]) -> str:
+        return hashlib.sha256(f"{method.upper()} {url}?{normalize_params(params)}".encode("utf-8")).hexdigest()
+
+    def _ttl_for(self, status: int, headers: Dict[str, str]) -> Optional[int]:
+        """headers — уже с именами в нижнем регистре (_lower)."""
+        cc = headers.get("cache-control", "")
+        if re.search(r"no-store", cc, re.I):
+            return None
+        if status in NEGATIVE_STATUSES:
+            return self.negative_ttl
+        if not (200 <= status < 300):
+            return None
+        if re.search(r"no-cache", cc, re.I):
+            return 0  # храним, но каждый раз ревалидируем
+        ma = _max_age(cc)
+        return max(self.min_ttl, min(ma, self.ttl)) if ma is not None else self.ttl
+
+    def _store(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes, ttl: int):
+        now = time.time()
+        keep = {k: v for k, v in headers.items() if k in KEEP_HEADERS}
+        self._db().execute(
+            "INSERT OR REPLACE INTO http_cache (key, url, status, headers, body, stored_at, expires_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, url, status, json.dumps(keep), body, now, now + ttl, now),
+        )
+        self._writes += 1
+        if self._writes % 100 == 1:
+            self.evict()
+
+    def evict(self) -> int:
+        """Удаляет истёкшие без валидаторов и самые давно читаемые сверх max_entries."""
+        db = self._db()
+        now = time.time()
+        n = db.execute(
+            "DELETE FROM http_cache WHERE expires_at < ? AND headers NOT LIKE '%ETag%' AND headers NOT LIKE '%Last-Modified%'",
+            (now - self.ttl,),
+        ).rowcount
+        total = db.execute("SELECT COUNT(*) FROM http_cache").fetchone()[0]
+        if total > self.max_entries:
+            n += db.execute(
+                "DELETE FROM http_cache WHERE key IN (SELECT key FROM http_cache ORDER BY last_access LIMIT ?)",
+                (total - self.max_entries,),
+            ).rowcount
+        return n
+
+    def get(self, getter: Callable[..., Any], url: str, params: Optional[Dict[str, Any]] = None,
+            headers: Optional[Dict[str, str]] = None, **kw) -> CachedResponse:
+        """
+        getter — requests.get-совместимая функция (сессия с лимитами и ретраями).
+        Возвращает CachedResponse из кэша или сети.
+        """
+        key = self.key("GET", url, params)
+        db = self._db()
+        row = db.execute("SELECT status, headers, body, expires_at FROM http_cache WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row:
+            status, hdrs, body, expires_at = row[0], _lower(json.loads(row[1])), row[2], row[3]
+            if expires_at > now:
+                self.hits += 1
+                db.execute("UPDATE http_cache SET last_access = ? WHERE key = ?", (now, key))
+                return CachedResponse(url, status, hdrs, body, from_cache=True)
+            # устарело: условный запрос, если есть валидаторы
+            cond = {}
+            if hdrs.get("etag"):
+                cond["If-None-Match"] = hdrs["etag"]
+            if hdrs.get("last-modified"):
+                cond["If-Modified-Since"] = hdrs["last-modified"]
+            if cond:
+                r = getter(url, params=params, headers={**(headers or {}), **cond}, **kw)
+                if r.status_code == 304:
+                    self.revalidated += 1
+                    fresh = {**hdrs, **{k: v for k, v in _lower(r.headers).items() if k in KEEP_HEADERS}}
+                    ttl = self._ttl_for(status, fresh)
+                    if ttl is not None:
+                        self._store(key, url, status, fresh, body, ttl)
+                    return CachedResponse(url, status, fresh, body, from_cache=True)
+                return self._remember(key, url, r)
+
+        self.misses += 1
+        r = getter(url, params=params, headers=headers, **kw)
+        return self._remember(key, url, r)
+
+    def _remember(self, key: str, url: str, r) -> CachedResponse:
+        hdrs = _lower(r.headers)
+        ttl = self._ttl_for(r.status_code, hdrs)
+        if ttl is not None:
+            self._store(key, url, r.status_code, hdrs, r.content, ttl)
+        return CachedResponse(url, r.status_code, hdrs, r.content, from_cache=False)
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._db()
+        total, size = db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM http_cache").fetchone()
+        return {"entries": total, "bytes": size, "hits": self.hits, "misses": self.misses,
+                "revalidated": self.revalidated, "path": self.path}
+
+    def purge(self):
+        self._db().execute("DELETE FROM http_cache")
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+def default_cache() -> Optional[HttpCache]:
+    """Общий кэш процесса; None, если выключен HTTP_CACHE=0."""
+    global _cache
+    if os.getenv("HTTP_CACHE", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+    return _cache
+
+def cached_get(getter: Callable[..., Any], url: str, **kw):
+    c = default_cache()
+    return c.get(getter, url, **kw) if c else getter(url, **kw)
+
+def _selftest():
+    """Офлайн-проверка против локального stub-сервера (http.server на 127.0.0.1)."""
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import requests
+
+    calls = {"n": 0}
+
+    class Stub(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def do_GET(self):
+            calls["n"] += 1
+            if "missing" in self.path:
+                self.send_response(404); self.end_headers(); return
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304); self.send_header("ETag", '"v1"'); self.end_headers(); return
+            body = json.dumps({"results": [], "path": self.path}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Cache-Control", "max-age=0" if "stale" in self.path else "max-age=60")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    with tempfile.TemporaryDirectory() as d:
+        c = HttpCache(os.path.join(d, "c.sqlite"), ttl=60, negative_ttl=60, max_entries=10)
+        g = requests.get
+        assert c.get(g, base + "/s", params={"q": "Москва  Кремль"}).from_cache is False
+        assert c.get(g, base + "/s", params={"q": "москва кремль"}).from_cache is True   # нормализация
+        assert c.get(g, base + "/missing").status_code == 404
+        assert c.get(g, base + "/missing").from_cache is True                            # негативный кэш
+        c.get(g, base + "/stale")
+        r = c.get(g, base + "/stale")                                                    # 304-ревалидация
+        assert r.from_cache and c.revalidated == 1
+        for i in range(20):
+            c.get(g, base + f"/e{i}")
+        c.evict()
+        assert c.stats()["entries"] <= 10
+        print("[ok] selftest:", c.stats(), "stub calls:", calls["n"])
+    srv.shutdown()
+
+if __name__ == "__main__":
+    import sys
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if cmd == "selftest":
+        _selftest()
+    elif cmd == "purge":
+        HttpCache().purge(); print("purged")
+    else:
+        print(json.dumps(HttpCache().stats(), ensure_ascii=False))
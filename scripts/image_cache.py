@@ -0,0 +1,272 @@
+# scripts/image_cache.py
+# -*- coding: utf-8 -*-
+"""
+Кэш скачанных картинок с дедупликацией по содержимому.
+
+- файлы лежат по sha256: static/news_images/cas/<ab>/<sha256>.<ext> — одинаковые
+  картинки хранятся один раз, статьи ссылаются на один и тот же путь
+  (или на hard link <slug>.<ext>, если IMAGE_CACHE_HARDLINK=1);
+- индекс URL → sha256 в SQLite: повторная статья с тем же источником не качает его снова;
+- скачивание потоком на диск с лимитом размера, тип определяется по сигнатуре файла;
+- gc: сначала удаляет hard link'и <slug>.<ext>, на которые не ссылается ни одна статья,
+  затем cas-файлы без ссылок (ни по sha, ни через оставшиеся link'и).
+
+ENV:
+  IMAGE_CACHE_DB=data/image_cache.sqlite
+  IMAGE_MAX_BYTES=10485760
+  IMAGE_CACHE_HARDLINK=0
+
+  python scripts/image_cache.py stats | gc [--dry-run] [--grace-hours 24]
+"""
+
+import os, re, sys, time, base64, sqlite3, hashlib, tempfile, threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+sys.path.insert(0, os.path.abspath("."))
+
+STATIC_DIR = Path("static/news_images")
+CAS_DIR = STATIC_DIR / "cas"
+WEB_PREFIX = "/static/news_images"
+CAS_REF_RE = re.compile(r"/static/news_images/cas/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z0-9]+")
+LINK_REF_RE = re.compile(r"/static/news_images/([^/\s\"'<>?#]+\.[a-z0-9]+)")
+
+def _getenv_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+MAX_BYTES = _getenv_int("IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+
+def sniff(head: bytes) -> Optional[Tuple[str, str]]:
+    """(mime, ext) по сигнатуре файла; None — не картинка."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", "jpg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif", "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    h = head.lstrip()[:256].lower()
+    if h.startswith(b"<svg") or (h.startswith(b"<?xml") and b"<svg" in head.lower()):
+        return "image/svg+xml", "svg"
+    return None
+
+class ImageCache:
+    def __init__(self, root: Optional[Path] = None, db_path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.static_dir = Path(root) if root else STATIC_DIR
+        self.cas_dir = self.static_dir / "cas"
+        self.cas_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path or os.getenv("IMAGE_CACHE_DB", "data/image_cache.sqlite")
+        self.max_bytes = max_bytes or MAX_BYTES
+        self.hardlink = os.getenv("IMAGE_CACHE_HARDLINK", "0") == "1"
+        self._local = threading.local()
+        d = os.path.dirname(self.db_path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._db().execute("""
+            CREATE TABLE IF NOT EXISTS image_urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                mime TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )""")
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- пути ----------
+    def path_for(self, sha: str, ext: str) -> Path:
+        return self.cas_dir / sha[:2] / f"{sha}.{ext}"
+
+    def web_path(self, sha: str, ext: str) -> str:
+        return f"{WEB_PREFIX}/cas/{sha[:2]}/{sha}.{ext}"
+
+    # ---------- запись ----------
+    def _commit_tmp(self, tmp: str, sha: str, ext: str) -> Path:
+        dst = self.path_for(sha, ext)
+        if dst.exists():
+            os.unlink(tmp)  # уже есть такой же файл — дубликат не храним
+        else:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, dst)
+        return dst
+
+    def store_bytes(self, data: bytes) -> Optional[Tuple[str, str, str]]:
+        """Кладёт готовые байты (например, ответ OpenAI Images). → (sha, ext, mime) или None."""
+        kind = sniff(data[:512])
+        if not kind or len(data) > self.max_bytes:
+            return None
+        sha = hashlib.sha256(data).hexdigest()
+        fd, tmp = tempfile.mkstemp(dir=self.cas_dir, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._commit_tmp(tmp, sha, kind[1])
+        return sha, kind[1], kind[0]
+
+    def fetch(self, url: str) -> Optional[Tuple[str, str, str]]:
+        """URL → (sha, ext, mime): из индекса или скачиванием потоком с лимитом размера."""
+        row = self._db().execute("SELECT sha256, ext, mime FROM image_urls WHERE url = ?", (url,)).fetchone()
+        if row and self.path_for(row[0], row[1]).exists():
+            return row[0], row[1], row[2]
+
+        from scripts.fetch_images_auto import http_session  # type: ignore
+        fd, tmp = tempfile.mkstemp(dir=self.cas_dir, suffix=".part")
+        sha, size, head = hashlib.sha256(), 0, b""
+        try:
+            with os.fdopen(fd, "wb") as f, http_session().get(url, timeout=12, stream=True) as r:
+                r.raise_for_status()
+                clen = int(r.headers.get("Content-Length") or 0)
+                if clen > self.max_bytes:
+                    raise ValueError(f"too large: {clen} bytes")
+                for chunk in r.iter_content(chunk_size=65536):
+                    if not chunk:
+                        continue
+                    if len(head) < 512:
+                        head += chunk[:512 - len(head)]
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"too large: > {self.max_bytes} bytes")
+                    sha.update(chunk)
+                    f.write(chunk)
+            kind = sniff(head)
+            if not kind:
+                raise ValueError(f"not an image (Content-Type: {r.headers.get('Content-Type')})")
+        except Exception as e:
+            print("[warn] image download failed:", e)
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return None
+
+        digest = sha.hexdigest()
+        self._commit_tmp(tmp, digest, kind[1])
+        self._db().execute(
+            "INSERT OR REPLACE INTO image_urls (url, sha256, ext, mime, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, digest, kind[1], kind[0], size, time.time()),
+        )
+        return digest, kind[1], kind[0]
+
+    # ---------- ссылки для статей ----------
+    def src_for(self, blob: Tuple[str, str, str], slug_hint: Optional[str] = None) -> str:
+        """Web-путь к файлу: общий cas-путь или hard link static/news_images/<slug>.<ext>."""
+        sha, ext, _ = blob
+        if self.hardlink and slug_hint:
+            link = self.static_dir / f"{slug_hint}.{ext}"
+            try:
+                if link.exists():
+                    link.unlink()
+                os.link(self.path_for(sha, ext), link)
+                return f"{WEB_PREFIX}/{link.name}"
+            except OSError as e:
+                print("[warn] hard link failed, using cas path:", e)
+        return self.web_path(sha, ext)
+
+    def data_url(self, blob: Tuple[str, str, str]) -> str:
+        sha, ext, mime = blob
+        b64 = base64.b64encode(self.path_for(sha, ext).read_bytes()).decode("ascii")
+        return f"data:{mime};base64,{b64}"
+
+    # ---------- gc ----------
+    def gc(self, referenced: set, grace_hours: float = 24, dry_run: bool = False,
+           referenced_links: Optional[set] = None) -> dict:
+        """
+        Удаляет cas-файлы, sha которых нет в referenced и на которые нет нужных hard link'ов,
+        старше grace_hours (чтобы не снести картинку статьи, которая ещё не в БД).
+        referenced_links — имена <slug>.<ext>, на которые ссылаются статьи: остальные link'и
+        на cas-файлы удаляются первыми (иначе st_nlink > 1 держит файл вечно);
+        None — link'и не трогаем.
+        """
+        cutoff = time.time() - grace_hours * 3600
+        removed, kept, freed, unlinked = 0, 0, 0, 0
+        # link'и <slug>.<ext> → inode cas-файла; сколько из них уходит
+        dropped: dict = {}
+        if referenced_links is not None:
+            cas_inodes = {(st.st_dev, st.st_ino) for st in (p.stat() for p in self.cas_dir.glob("*/*.*"))}
+            for p in self.static_dir.glob("*.*"):
+                st = p.stat()
+                ino = (st.st_dev, st.st_ino)
+                if ino not in cas_inodes or p.name in referenced_links or st.st_mtime > cutoff:
+                    continue
+                dropped[ino] = dropped.get(ino, 0) + 1
+                unlinked += 1
+                if not dry_run:
+                    p.unlink()
+        for p in self.cas_dir.glob("*/*.*"):
+            sha = p.stem
+            st = p.stat()
+            links = st.st_nlink - (dropped.get((st.st_dev, st.st_ino), 0) if dry_run else 0)
+            if sha in referenced or links > 1 or st.st_mtime > cutoff:
+                kept += 1
+                continue
+            removed += 1
+            freed += st.st_size
+            if not dry_run:
+                p.unlink()
+        if not dry_run:
+            for p in self.cas_dir.glob("*.part"):
+                if p.stat().st_mtime < cutoff:
+                    p.unlink()
+            db = self._db()
+            for url, sha, ext in db.execute("SELECT url, sha256, ext FROM image_urls").fetchall():
+                if not self.path_for(sha, ext).exists():
+                    db.execute("DELETE FROM image_urls WHERE url = ?", (url,))
+        return {"removed": removed, "kept": kept, "freed_bytes": freed, "links_removed": unlinked,
+                "dry_run": dry_run}
+
+    def stats(self) -> dict:
+        files = list(self.cas_dir.glob("*/*.*"))
+        urls = self._db().execute("SELECT COUNT(*) FROM image_urls").fetchone()[0]
+        return {"files": len(files), "bytes": sum(p.stat().st_size for p in files), "urls": urls}
+
+_default: Optional[ImageCache] = None
+
+def default_cache() -> ImageCache:
+    global _default
+    if _default is None:
+        _default = ImageCache()
+    return _default
+
+def referenced() -> Tuple[set, set]:
+    """
+    (sha256 cas-картинок, имена link'ов <slug>.<ext>), на которые ссылаются статьи —
+    один потоковый проход по БД.
+    """
+    from scripts.import_articles import _flask, _articles_table
+    app, db, _ = _flask()
+    shas, links = set(), set()
+    with app.app_context():
+        table = _articles_table(db.engine)
+        with db.engine.connect() as conn:
+            res = conn.execution_options(stream_results=True, yield_per=500).execute(
+                table.select().with_only_columns(table.c.text).where(table.c.text.contains("/news_images/"))
+            )
+            for (text,) in res:
+                shas.update(CAS_REF_RE.findall(text or ""))
+                links.update(LINK_REF_RE.findall(text or ""))
+    return shas, links
+
+if __name__ == "__main__":
+    import argparse, json
+    p = argparse.ArgumentParser(description="кэш картинок статей")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    g = sub.add_parser("gc")
+    g.add_argument("--dry-run", action="store_true")
+    g.add_argument("--grace-hours", type=float, default=24)
+    args = p.parse_args()
+
+    c = ImageCache()
+    if args.cmd == "stats":
+        print(json.dumps(c.stats()))
+    else:
+        shas, links = referenced()
+        print(json.dumps(c.gc(shas, grace_hours=args.grace_hours, dry_run=args.dry_run, referenced_links=links)))
@@ -0,0 +1,194 @@
+# scripts/image_worker.py
+# -*- coding: utf-8 -*-
+"""
+Отложенные картинки: статья публикуется сразу с лёгкой заглушкой
+<figure data-image-pending="<slug>">, а картинку (openai → commons → placeholder,
+как IMAGE_BACKEND=auto) подбирает фоновый воркер и подменяет заглушку на месте.
+
+Очередь — таблица image_tasks в той же БД. Воркер:
+  - в веб-процессе: kick() после /newsgen/run поднимает daemon-поток до опустошения очереди;
+  - отдельно: python scripts/image_worker.py --loop
+
+ENV:
+  IMAGE_DEFER=0|1                 # режим по умолчанию для run()
+  IMAGE_WORKER_BACKEND=auto
+  IMAGE_TASK_MAX_ATTEMPTS=3
+"""
+
+import os, re, sys, time, threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts.import_articles import _flask, _articles_table
+
+PENDING_RE_TMPL = r'<figure[^>]*data-image-pending="{slug}"[^>]*>.*?</figure>'
+MAX_ATTEMPTS = int(os.getenv("IMAGE_TASK_MAX_ATTEMPTS", "3"))
+
+_tables: Dict[int, Any] = {}
+
+def tasks_table(engine):
+    """image_tasks (создаётся при первом обращении, как и прочие служебные таблицы)."""
+    t = _tables.get(id(engine))
+    if t is None:
+        from sqlalchemy import MetaData, Table, Column, Integer, String, Text, DateTime
+        md = MetaData()
+        t = Table(
+            "image_tasks", md,
+            Column("id", Integer, primary_key=True),
+            Column("slug", String(255), nullable=False, index=True),
+            Column("topic", String(500), nullable=False),
+            Column("status", String(16), nullable=False, default="pending", index=True),  # pending|running|done|failed
+            Column("attempts", Integer, nullable=False, default=0),
+            Column("error", Text),
+            Column("created_at", DateTime, nullable=False, default=datetime.utcnow),
+            Column("updated_at", DateTime, nullable=False, default=datetime.utcnow),
+        )
+        md.create_all(engine, checkfirst=True)
+        _tables[id(engine)] = t
+    return t
+
+def pending_figure(slug: str, alt: str) -> str:
+    """Заглушка до прихода картинки: прозрачный пиксель, без сетевых запросов."""
+    from scripts.generate_news_openai import ImageBackend  # type: ignore
+    src = ImageBackend._placeholder_data_url()
+    return (f'<figure class="article-image-pending" data-image-pending="{slug}">'
+            f'<img src="{src}" alt="{alt}"/></figure>')
+
+def enqueue(items: List[Tuple[str, str]]) -> int:
+    """items: [(slug, topic)]."""
+    if not items:
+        return 0
+    app, db, _ = _flask()
+    with app.app_context():
+        t = tasks_table(db.engine)
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(t.insert(), [
+                {"slug": s, "topic": topic, "status": "pending", "attempts": 0, "created_at": now, "updated_at": now}
+                for s, topic in items
+            ])
+    return len(items)
+
+def _claim(conn, t) -> Optional[Dict[str, Any]]:
+    """Берём одну задачу; UPDATE ... WHERE status='pending' защищает от двойного захвата."""
+    from sqlalchemy import select
+    q = select(t.c.id, t.c.slug, t.c.topic, t.c.attempts).where(t.c.status == "pending").order_by(t.c.id).limit(1)
+    if conn.dialect.name == "postgresql":
+        q = q.with_for_update(skip_locked=True)
+    row = conn.execute(q).first()
+    if not row:
+        return None
+    res = conn.execute(
+        t.update().where(t.c.id == row.id, t.c.status == "pending")
+        .values(status="running", attempts=row.attempts + 1, updated_at=datetime.utcnow())
+    )
+    return dict(row._mapping) if res.rowcount == 1 else None
+
+def _patch_article(conn, articles, slug: str, figure_html: str) -> Optional[Dict[str, Any]]:
+    from sqlalchemy import select
+    row = conn.execute(select(articles).where(articles.c.slug == slug)).first()
+    if not row:
+        return None
+    rec = dict(row._mapping)
+    pat = re.compile(PENDING_RE_TMPL.format(slug=re.escape(slug)), re.I | re.S)
+    text = rec.get("text") or ""
+    new = pat.sub(lambda _: figure_html, text, count=1) if pat.search(text) else figure_html + text
+    values = {"text": new}
+    if "content_hash" in articles.c:
+        values["content_hash"] = None  # пересчитается при следующем sync
+    conn.execute(articles.update().where(articles.c.slug == slug).values(**values))
+    rec["text"] = new
+    return rec
+
+def process_pending(limit: int = 0, backend: Optional[str] = None) -> Dict[str, int]:
+    """Обрабатывает очередь до опустошения (или limit задач). → {done, failed}."""
+    from scripts.generate_news_openai import ImageBackend  # type: ignore
+    from scripts.journal import Journal
+    images = ImageBackend(backend=backend or os.getenv("IMAGE_WORKER_BACKEND", "auto"))
+    app, db, _ = _flask()
+    stats = {"done": 0, "failed": 0}
+    with app.app_context():
+        engine = db.engine
+        t, articles = tasks_table(engine), _articles_table(engine)
+        # задачи, зависшие в running после падения воркера, возвращаем в очередь
+        from datetime import timedelta
+        with engine.begin() as conn:
+            conn.execute(t.update().where(t.c.status == "running",
+                                          t.c.updated_at < datetime.utcnow() - timedelta(minutes=10))
+                         .values(status="pending"))
+        while not limit or stats["done"] + stats["failed"] < limit:
+            with engine.begin() as conn:
+                task = _claim(conn, t)
+            if not task:
+                break
+            try:
+                figure_html, _inline = images.generate(topic=task["topic"], slug_hint=task["slug"])
+                with engine.begin() as conn:
+                    rec = _patch_article(conn, articles, task["slug"], figure_html)
+                    conn.execute(t.update().where(t.c.id == task["id"])
+                                 .values(status="done", error=None, updated_at=datetime.utcnow()))
+                if rec:
+                    # журнал — источник для sync: без этой записи sync вернул бы заглушку
+                    Journal().append([{k: rec.get(k) for k in ("title", "slug", "section", "tags", "text", "created_at")}],
+                                     meta={"image_backend": images.backend, "image_task": task["id"]})
+                stats["done"] += 1
+            except Exception as e:
+                status = "failed" if task["attempts"] + 1 >= MAX_ATTEMPTS else "pending"
+                with engine.begin() as conn:
+                    conn.execute(t.update().where(t.c.id == task["id"])
+                                 .values(status=status, error=str(e)[:2000], updated_at=datetime.utcnow()))
+                print(f"[warn] image task {task['id']} ({task['slug']}) failed: {e}")
+                if status == "failed":
+                    stats["failed"] += 1
+    return stats
+
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+_rerun = False  # kick() пришёл, пока поток работал: ещё один проход перед выходом
+
+def _worker_loop():
+    global _worker, _rerun
+    while True:
+        with _worker_lock:
+            _rerun = False
+        try:
+            s = process_pending()
+            print(f"[image-worker] done={s['done']} failed={s['failed']}")
+        except Exception as e:
+            print("[image-worker] crashed:", e)
+        # решение о выходе — под тем же замком, что и kick(): задача, поставленная
+        # после последнего пустого _claim, либо подхватится здесь, либо поднимет новый поток
+        with _worker_lock:
+            if not _rerun:
+                _worker = None
+                return
+
+def kick() -> bool:
+    """Поднять фоновый поток воркера в текущем процессе; если он уже работает — попросить ещё проход."""
+    global _worker, _rerun
+    with _worker_lock:
+        if _worker is not None:
+            _rerun = True
+            return False
+        _worker = threading.Thread(target=_worker_loop, name="image-worker", daemon=True)
+        _worker.start()
+        return True
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="воркер отложенных картинок")
+    p.add_argument("--loop", action="store_true", help="не выходить, опрашивать очередь")
+    p.add_argument("--interval", type=float, default=5.0)
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--backend", default=None, help="openai|commons|auto|placeholder")
+    args = p.parse_args()
+
+    while True:
+        s = process_pending(limit=args.limit, backend=args.backend)
+        if s["done"] or s["failed"]:
+            print(f"[image-worker] done={s['done']} failed={s['failed']}")
+        if not args.loop:
+            break
+        time.sleep(args.interval)
@@ -1,72 +1,442 @@
 # scripts/import_articles.py
-from typing import List, Dict, Any
-from datetime import datetime
-from sqlalchemy import text as sql_text
+import os, sys, io, json, gzip, hashlib, contextlib
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Callable
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath("."))
+
+# Батч для executemany и политика конфликтов по slug: update | nothing
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+ON_CONFLICT = (os.getenv("IMPORT_ON_CONFLICT") or "update").strip().lower()
+COLUMNS = ("title", "text", "tags", "slug", "section", "created_at")
+# При обновлении по slug не трогаем: дата публикации задаёт порядок ленты
+KEEP_ON_UPDATE = ("id", "slug", "created_at")
 
 def _s(x) -> str:
     if x is None:
         return ""
     return x if isinstance(x, str) else str(x)
 
-def import_articles(articles: List[Dict[str, Any]]) -> int:
+def _dt(x) -> datetime:
+    """created_at из payload бывает строкой ISO — приводим к naive UTC datetime."""
+    if isinstance(x, datetime):
+        v = x
+    else:
+        try:
+            v = datetime.fromisoformat(_s(x).strip().replace("Z", "+00:00"))
+        except ValueError:
+            return datetime.utcnow()
+    if v.tzinfo is not None:
+        v = v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+HASHED = ("title", "text", "tags", "section")
+
+def content_hash(row: Dict[str, Any]) -> str:
+    """sha256 содержимого статьи (без slug/created_at) — для дифф-синка."""
+    h = hashlib.sha256()
+    for c in HASHED:
+        h.update(_s(row.get(c)).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+def _row(a: Dict[str, Any], with_hash: bool = False) -> Dict[str, Any]:
+    r = {
+        "title": _s(a.get("title")),
+        "text": _s(a.get("text")),
+        "tags": _s(a.get("tags")),
+        "slug": _s(a.get("slug")).strip(),
+        "section": _s(a.get("section") or "list"),
+        "created_at": _dt(a.get("created_at")),
+    }
+    if with_hash:
+        r["content_hash"] = content_hash(r)
+    return r
+
+def _flask():
+    """(app, db, Article|None). Если пакет app ещё не инициализирован — поднимаем create_app()."""
+    import app as _pkg
+    if getattr(_pkg, "app", None) is None and hasattr(_pkg, "create_app"):
+        _pkg.create_app()
+    return _pkg.app, _pkg.db, getattr(_pkg, "Article", None)
+
+def _batches(it: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    buf: List[Any] = []
+    for x in it:
+        buf.append(x)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+# ── таблица и диалект ────────────────────────────────────────────────────────
+def _articles_table(engine):
+    # Отражаем реальную таблицу, а не модель: так видно колонки, добавленные
+    # миграциями (content_hash), и сырой путь без модели работает так же
+    from sqlalchemy import MetaData, Table
+    return Table("articles", MetaData(), autoload_with=engine)
+
+def _has_unique_slug(engine, table_name: str = "articles") -> bool:
+    """ON CONFLICT (slug) работает только при уникальном индексе/ограничении на slug."""
+    from sqlalchemy import inspect
+    insp = inspect(engine)
+    try:
+        for uc in insp.get_unique_constraints(table_name):
+            if uc.get("column_names") == ["slug"]:
+                return True
+    except NotImplementedError:
+        pass
+    for ix in insp.get_indexes(table_name):
+        if ix.get("unique") and ix.get("column_names") == ["slug"]:
+            return True
+    return False
+
+def _upsert_stmt(table, dialect: str, on_conflict: str, cols=COLUMNS):
+    """INSERT ... ON CONFLICT (slug) для postgres/sqlite; None — диалект не умеет."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(table)
+    if on_conflict == "nothing":
+        return stmt.on_conflict_do_nothing(index_elements=["slug"])
+    where = None
+    if "content_hash" in cols:
+        # не переписываем строку, если содержимое не изменилось
+        where = table.c.content_hash.is_distinct_from(stmt.excluded.content_hash)
+    return stmt.on_conflict_do_update(
+        index_elements=["slug"],
+        set_={c: stmt.excluded[c] for c in cols if c not in KEEP_ON_UPDATE},
+        where=where,
+    )
+
+def _existing(conn, table, slugs: List[str]) -> Dict[str, Optional[str]]:
+    """slug → content_hash (None, если колонки нет) для уже существующих строк."""
+    cols = [table.c.slug] + ([table.c.content_hash] if "content_hash" in table.c else [])
+    found: Dict[str, Optional[str]] = {}
+    for chunk in _batches(slugs, 500):  # лимит параметров старых sqlite — 999
+        res = conn.execute(table.select().with_only_columns(*cols).where(table.c.slug.in_(chunk)))
+        for r in res:
+            found[r[0]] = r[1] if len(r) > 1 else None
+    return found
+
+def _status(r: Dict[str, Any], existing: Dict[str, Optional[str]], on_conflict: str) -> str:
+    if r["slug"] not in existing:
+        return "inserted"
+    if on_conflict == "nothing":
+        return "skipped"
+    h = existing[r["slug"]]
+    if h and h == r.get("content_hash"):
+        return "skipped"  # содержимое не изменилось
+    return "updated"
+
+def _write_batch(conn, table, stmt, rows: List[Dict[str, Any]], existing: Dict[str, Optional[str]], on_conflict: str):
+    cols = [c for c in rows[0] if c not in KEEP_ON_UPDATE]
+    if stmt is not None:
+        conn.execute(stmt, rows)
+        return
+    # Фолбэк для прочих диалектов: новые — INSERT, изменившиеся — UPDATE по slug
+    from sqlalchemy import bindparam
+    new = [r for r in rows if r["slug"] not in existing]
+    old = [r for r in rows if _status(r, existing, on_conflict) == "updated"]
+    if new:
+        conn.execute(table.insert(), new)
+    if old and on_conflict == "update":
+        upd = table.update().where(table.c.slug == bindparam("b_slug"))
+        conn.execute(upd, [{**{c: r[c] for c in cols}, "b_slug": r["slug"]} for r in old])
+
+# ── bulk upsert ──────────────────────────────────────────────────────────────
+def bulk_upsert(
+    articles: Iterable[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    on_conflict: Optional[str] = None,
+    report_rows: bool = True,
+    on_batch: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Заливает статьи батчами: INSERT ... ON CONFLICT (slug) DO UPDATE / DO NOTHING
+    через executemany, каждый батч — отдельная транзакция.
+    Упавший батч переигрывается построчно, чтобы одна битая строка не роняла остальные.
+    on_batch(report) зовётся после каждого закоммиченного батча (чекпоинты стрим-импорта).
+    Возвращает {inserted, updated, skipped, errors, rows: [(slug, status), ...]}.
+    """
+    batch_size = max(1, int(batch_size or BATCH_SIZE))
+    on_conflict = (on_conflict or ON_CONFLICT).lower()
+    if on_conflict not in ("update", "nothing"):
+        raise ValueError(f"on_conflict must be 'update' or 'nothing', got {on_conflict!r}")
+
+    _flask_app, _db, _ = _flask()
+    report: Dict[str, Any] = {"inserted": 0, "updated": 0, "skipped": 0, "errors": 0, "rows": []}
+
+    def mark(slug: str, status: str):
+        report[status if status != "error" else "errors"] += 1
+        if report_rows:
+            report["rows"].append((slug, status))
+
+    with _flask_app.app_context():
+        engine = _db.engine
+        dialect = engine.dialect.name
+        table = _articles_table(engine)
+        with_hash = "content_hash" in table.c
+        cols = COLUMNS + (("content_hash",) if with_hash else ())
+        stmt = _upsert_stmt(table, dialect, on_conflict, cols) if _has_unique_slug(engine, table.name) else None
+
+        for batch in _batches(articles, batch_size):
+            # дубли slug внутри батча: побеждает последняя запись (иначе ON CONFLICT
+            # в postgres падает с "cannot affect row a second time")
+            rows: Dict[str, Dict[str, Any]] = {}
+            for a in batch:
+                r = _row(a, with_hash)
+                if not r["slug"]:
+                    mark("", "skipped")
+                    continue
+                if r["slug"] in rows:
+                    mark(r["slug"], "skipped")
+                rows[r["slug"]] = r
+            todo = list(rows.values())
+            if not todo:
+                if on_batch:
+                    on_batch(report)
+                continue
+
+            try:
+                with engine.begin() as conn:
+                    if dialect == "postgresql":
+                        conn.exec_driver_sql("SET client_encoding TO 'UTF8'")
+                    existing = _existing(conn, table, list(rows))
+                    _write_batch(conn, table, stmt, todo, existing, on_conflict)
+                results = [(r["slug"], _status(r, existing, on_conflict)) for r in todo]
+            except Exception as e:
+                print(f"[warn] batch of {len(todo)} failed, retrying row by row: {e}")
+                results = []
+                for r in todo:
+                    try:
+                        with engine.begin() as conn:
+                            existing = _existing(conn, table, [r["slug"]])
+                            _write_batch(conn, table, stmt, [r], existing, on_conflict)
+                        results.append((r["slug"], _status(r, existing, on_conflict)))
+                    except Exception as e1:
+                        print(f"[warn] row {r['slug']!r} failed: {e1}")
+                        mark(r["slug"], "error")
+
+            for slug, status in results:
+                mark(slug, status)
+            if on_batch:
+                on_batch(report)
+    return report
+
+def import_articles(articles: Optional[Iterable[Dict[str, Any]]] = None, **kw) -> int:
     """
-    Импортирует список статей в таблицу Article (или через сырой SQL),
+    Импортирует статьи в таблицу articles (upsert по slug, батчами),
     принудительно включая UTF-8.
     Ожидает поля: title, text, tags, slug, section, created_at.
+    Без аргументов берёт ARTICLES из scripts/articles_payload.py.
+    Возвращает число вставленных + обновлённых строк.
     """
-    from app import app as _flask_app
-    from app import db as _db
-    # Пытаемся использовать модель, если она есть
-    Article = None
-    try:
-        from app import Article as _Article  # type: ignore
-        Article = _Article
-    except Exception:
-        Article = None
+    if articles is None:
+        from scripts.articles_payload import ARTICLES  # type: ignore
+        articles = ARTICLES
+    rep = bulk_upsert(articles, report_rows=False, **kw)
+    print(f"[ok] import: inserted={rep['inserted']} updated={rep['updated']} "
+          f"skipped={rep['skipped']} errors={rep['errors']}")
+    return rep["inserted"] + rep["updated"]
 
-    total = 0
-    with _flask_app.app_context():
-        # 1) клиентская кодировка на всякий случай
+# ── стрим-источники: JSONL/NDJSON (+ .gz/.zst) и stdin ───────────────────────
+class JsonlSource:
+    """
+    Ленивое построчное чтение JSONL с позицией (line, offset) для чекпоинтов.
+    offset — байты распакованного потока после последней прочитанной строки.
+    Для несжатого файла резюм идёт через seek, для .gz/.zst/stdin — пропуском строк.
+    """
+    def __init__(self, path: str, start_line: int = 0, start_offset: int = 0):
+        self.path = path
+        self.start_line, self.start_offset = max(0, start_line), max(0, start_offset)
+        self.line, self.offset, self.bad = 0, 0, 0
+
+    def _open(self):
+        if self.path == "-":
+            return contextlib.nullcontext(sys.stdin.buffer)
+        f = open(self.path, "rb")
+        magic = f.peek(4)[:4] if hasattr(f, "peek") else b""
+        if self.path.endswith(".gz") or magic[:2] == b"\x1f\x8b":
+            f.close()
+            return gzip.open(self.path, "rb")
+        if self.path.endswith((".zst", ".zstd")) or magic == b"\x28\xb5\x2f\xfd":
+            try:
+                import zstandard  # type: ignore
+            except ImportError:
+                f.close()
+                raise RuntimeError("для .zst нужен пакет zstandard (pip install zstandard)")
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=True))
+        return f
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with self._open() as f:
+            skip = True
+            if self.start_offset and getattr(f, "name", None) == self.path and f.seekable():
+                f.seek(self.start_offset)
+                self.line, self.offset, skip = self.start_line, self.start_offset, False
+            for raw in f:
+                self.line += 1
+                self.offset += len(raw)
+                if skip and (self.line <= self.start_line or self.offset <= self.start_offset):
+                    continue
+                raw = raw.strip()
+                if not raw:
+                    continue
+                try:
+                    rec = json.loads(raw)
+                except ValueError as e:
+                    self.bad += 1
+                    print(f"[warn] {self.path}:{self.line}: bad json: {e}")
+                    continue
+                if isinstance(rec, dict):
+                    yield rec
+
+def _load_checkpoint(path: Optional[str], source: str) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        cp = json.load(f)
+    return cp if cp.get("source") == source else {}
+
+def _save_checkpoint(path: str, data: Dict[str, Any]):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _restore_blobs(root: str, man: Dict[str, Any]) -> Dict[str, int]:
+    """
+    <бэкап>/blobs/<sha256>.<ext> → каталог, на который указывает blob_url_prefix
+    (/static/news_images/blobs → ./static/news_images/blobs). Жёсткая ссылка, иначе копия;
+    файл, чьё содержимое не совпадает с sha в имени, пропускается.
+    """
+    counts = {"restored": 0, "present": 0, "bad": 0}
+    src_dir = os.path.join(root, "blobs")
+    if not os.path.isdir(src_dir):
+        return counts
+    prefix = man.get("blob_url_prefix") or "/static/news_images/blobs"
+    if "://" in prefix:
+        print(f"[warn] blobs: prefix {prefix!r} is not a local path, images not restored")
+        return counts
+    dst_dir = os.path.join(os.path.abspath("."), prefix.strip("/"))
+    os.makedirs(dst_dir, exist_ok=True)
+    import shutil
+    for name in sorted(os.listdir(src_dir)):
+        src, dst = os.path.join(src_dir, name), os.path.join(dst_dir, name)
+        if not os.path.isfile(src):
+            continue
+        if _file_sha256(src) != name.split(".", 1)[0]:
+            print(f"[warn] blobs/{name}: sha256 mismatch, skipped")
+            counts["bad"] += 1
+            continue
+        if os.path.exists(dst):  # content-addressed: то же имя — то же содержимое
+            counts["present"] += 1
+            continue
+        tmp = f"{dst}.{os.getpid()}.tmp"
         try:
-            _db.session.execute(sql_text("SET client_encoding TO 'UTF8'"))
-        except Exception:
-            pass
-
-        if Article is not None:
-            # ORM-путь
-            for a in articles:
-                rec = Article(
-                    title=_s(a.get("title")),
-                    text=_s(a.get("text")),
-                    tags=_s(a.get("tags")),
-                    slug=_s(a.get("slug")),
-                    section=_s(a.get("section") or "list"),
-                    created_at=a.get("created_at") or datetime.utcnow(),
-                )
-                _db.session.add(rec)
-                total += 1
-            _db.session.commit()
-            return total
-
-        # 2) Сырой SQL (если модели нет)
-        # Подставь реальное имя таблицы, если у тебя другое:
-        table = "articles"
-        for a in articles:
-            _db.session.execute(
-                sql_text(
-                    f"""INSERT INTO {table}
-                        (title, text, tags, slug, section, created_at)
-                        VALUES (:title, :text, :tags, :slug, :section, :created_at)"""
-                ),
-                {
-                    "title": _s(a.get("title")),
-                    "text": _s(a.get("text")),
-                    "tags": _s(a.get("tags")),
-                    "slug": _s(a.get("slug")),
-                    "section": _s(a.get("section") or "list"),
-                    "created_at": a.get("created_at") or datetime.utcnow(),
-                },
-            )
-            total += 1
-        _db.session.commit()
-        return total
+            os.link(src, tmp)
+        except OSError:  # другой том / ФС без жёстких ссылок
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        counts["restored"] += 1
+    print(f"[ok] blobs → {dst_dir}: " + " ".join(f"{k}={v}" for k, v in counts.items()))
+    return counts
+
+def _iter_manifest(path: str) -> Iterator[Dict[str, Any]]:
+    """Бэкап scripts/export_articles.py: картинки из blobs/, затем части по порядку из manifest.json."""
+    root = os.path.dirname(path)
+    with open(path, "r", encoding="utf-8") as f:
+        man = json.load(f)
+    _restore_blobs(root, man)
+    for part in man.get("parts") or []:
+        for rec in JsonlSource(os.path.join(root, part["file"])):
+            rec.pop("id", None)
+            yield rec
+
+def iter_source(path: str) -> Iterable[Dict[str, Any]]:
+    """
+    *.py — payload с ARTICLES, каталог — журнал генерации, manifest.json — бэкап
+    export_articles.py, иначе JSONL/NDJSON (.gz/.zst, "-").
+    """
+    if path.endswith("manifest.json"):
+        return _iter_manifest(path)
+    if path.endswith(".py"):
+        import runpy
+        return runpy.run_path(path)["ARTICLES"]
+    if os.path.isdir(path):
+        from scripts.journal import Journal
+        return Journal(path).latest()  # последняя версия каждой статьи
+    return JsonlSource(path)
+
+def import_articles_from_path(
+    path: str,
+    checkpoint: Optional[str] = None,
+    start_line: int = 0,
+    start_offset: int = 0,
+    **kw,
+) -> Dict[str, Any]:
+    """
+    Импорт из файла: *.py — payload с ARTICLES (как раньше), каталог — журнал
+    генерации (data/journal), иначе JSONL/NDJSON
+    (.gz/.zst, "-" — stdin) потоково, с коммитом батчами и константной памятью.
+    checkpoint — json-файл с (line, offset) последнего закоммиченного батча; при
+    повторном запуске с тем же источником импорт продолжается с этого места.
+    """
+    if path.endswith((".py", "manifest.json")) or os.path.isdir(path):
+        return bulk_upsert(iter_source(path), **kw)
+
+    cp = _load_checkpoint(checkpoint, path)
+    if cp:
+        start_line, start_offset = int(cp.get("line", 0)), int(cp.get("offset", 0))
+        print(f"[info] resume {path} from line {start_line} (offset {start_offset})")
+    src = JsonlSource(path, start_line=start_line, start_offset=start_offset)
+
+    def on_batch(rep: Dict[str, Any]):
+        if checkpoint:
+            _save_checkpoint(checkpoint, {
+                "source": path, "line": src.line, "offset": src.offset,
+                "counts": {k: rep[k] for k in ("inserted", "updated", "skipped", "errors")},
+            })
+
+    kw.setdefault("report_rows", False)
+    rep = bulk_upsert(src, on_batch=on_batch, **kw)
+    rep["bad_lines"] = src.bad
+    rep["position"] = {"line": src.line, "offset": src.offset}
+    return rep
+
+# server/main.py зовёт под этим именем
+import_articles_from_payload_path = import_articles_from_path
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="bulk upsert статей: payload .py, каталог журнала или JSONL/NDJSON (.gz/.zst, - = stdin)")
+    p.add_argument("source", nargs="?", default="scripts/articles_payload.py")
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    p.add_argument("--on-conflict", choices=("update", "nothing"), default=ON_CONFLICT)
+    p.add_argument("--checkpoint", help="файл чекпоинта для резюма после падения")
+    p.add_argument("--start-line", type=int, default=0, help="пропустить первые N строк")
+    p.add_argument("--start-offset", type=int, default=0, help="начать с байтового смещения")
+    p.add_argument("--report", action="store_true", help="печатать статус по каждой строке")
+    args = p.parse_args()
+
+    rep = import_articles_from_path(
+        args.source, checkpoint=args.checkpoint,
+        start_line=args.start_line, start_offset=args.start_offset,
+        batch_size=args.batch_size, on_conflict=args.on_conflict, report_rows=args.report,
+    )
+    for slug, status in rep.pop("rows"):
+        print(f"{status:9s} {slug}")
+    print(json.dumps(rep, ensure_ascii=False))
@@ -0,0 +1,228 @@
+# scripts/journal.py
+# -*- coding: utf-8 -*-
+"""
+Append-only журнал сгенерированных статей (JSONL) вместо перезаписи
+scripts/articles_payload.py Python-исходником.
+
+- одна строка = одна статья (title, slug, section, tags, text, created_at)
+  + meta: topic, model, timings, usage;
+- запись — O_APPEND + flock + fsync, прошлые запуски не затираются;
+- рядом лежит индекс slug → (сегмент, offset, length) для случайного доступа;
+- ротация по размеру: текущий сегмент переименовывается в articles-<ts>.jsonl;
+- читатель отдаёт записи в формате, который понимает scripts.import_articles.
+
+ENV:
+  NEWS_JOURNAL_DIR=data/journal
+  NEWS_JOURNAL_MAX_MB=64
+  NEWS_JOURNAL_FSYNC=1
+"""
+
+import os, json, glob
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # windows
+    fcntl = None
+
+JOURNAL_DIR = os.getenv("NEWS_JOURNAL_DIR", "data/journal")
+CURRENT = "articles.jsonl"
+INDEX = "articles.idx"
+
+def _getenv_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+class Journal:
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None, fsync: Optional[bool] = None):
+        self.root = root or JOURNAL_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else _getenv_int("NEWS_JOURNAL_MAX_MB", 64) * 1024 * 1024
+        self.fsync = fsync if fsync is not None else (os.getenv("NEWS_JOURNAL_FSYNC", "1") == "1")
+        self._index: Optional[Dict[str, Tuple[str, int, int]]] = None
+        os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.root, CURRENT)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, INDEX)
+
+    # ---------- запись ----------
+    def _rotate_if_needed(self, incoming: int):
+        try:
+            size = os.path.getsize(self.current_path)
+        except OSError:
+            return
+        if size and size + incoming > self.max_bytes:
+            ts = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            rotated = f"articles-{ts}.jsonl"
+            os.replace(self.current_path, os.path.join(self.root, rotated))
+            # индекс ссылается на имя сегмента — переписываем ссылки на текущий
+            self._rewrite_index_segment(CURRENT, rotated)
+
+    def append(self, articles: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> int:
+        """Дописывает статьи в журнал. meta мёржится в article["meta"]. Возвращает число записей."""
+        lines: List[bytes] = []
+        for a in articles:
+            rec = dict(a)
+            m = dict(meta or {})
+            m.update(rec.get("meta") or {})
+            if m:
+                rec["meta"] = m
+            rec.setdefault("journaled_at", datetime.utcnow().isoformat())
+            lines.append((json.dumps(rec, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        if not lines:
+            return 0
+
+        lock = open(os.path.join(self.root, ".lock"), "a")
+        try:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._rotate_if_needed(sum(len(x) for x in lines))
+            fd = os.open(self.current_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                offset = os.fstat(fd).st_size
+                os.write(fd, b"".join(lines))
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            idx_lines = []
+            for a, raw in zip(articles, lines):
+                if a.get("slug"):  # без slug в индекс не попадает — как в rebuild_index()
+                    idx_lines.append(json.dumps({"slug": a["slug"], "seg": CURRENT,
+                                                 "off": offset, "len": len(raw)}, ensure_ascii=False) + "\n")
+                offset += len(raw)
+            if idx_lines:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(idx_lines))
+                    if self.fsync:
+                        f.flush(); os.fsync(f.fileno())
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+        self._index = None
+        return len(lines)
+
+    # ---------- индекс ----------
+    def _rewrite_index_segment(self, old: str, new: str):
+        if not os.path.exists(self.index_path):
+            return
+        out = []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                e = json.loads(line)
+                if e.get("seg") == old:
+                    e["seg"] = new
+                out.append(json.dumps(e, ensure_ascii=False) + "\n")
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(out))
+        os.replace(tmp, self.index_path)
+
+    def rebuild_index(self) -> int:
+        """Пересобирает индекс сканом всех сегментов (после ручной правки/потери .idx)."""
+        out = []
+        for seg in self.segments():
+            off = 0
+            with open(os.path.join(self.root, seg), "rb") as f:
+                for raw in f:
+                    try:
+                        slug = json.loads(raw).get("slug") or ""
+                    except ValueError:
+                        slug = ""
+                    if slug:
+                        out.append(json.dumps({"slug": slug, "seg": seg, "off": off, "len": len(raw)},
+                                              ensure_ascii=False) + "\n")
+                    off += len(raw)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(out))
+        os.replace(tmp, self.index_path)
+        self._index = None
+        return len(out)
+
+    def index(self) -> Dict[str, Tuple[str, int, int]]:
+        if self._index is None:
+            idx: Dict[str, Tuple[str, int, int]] = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            e = json.loads(line)
+                        except ValueError:
+                            continue
+                        idx[e["slug"]] = (e["seg"], e["off"], e["len"])  # последняя версия побеждает
+            self._index = idx
+        return self._index
+
+    def get(self, slug: str) -> Optional[Dict[str, Any]]:
+        """Последняя версия статьи по slug — одно чтение с диска по offset."""
+        hit = self.index().get(slug)
+        if not hit:
+            return None
+        seg, off, ln = hit
+        with open(os.path.join(self.root, seg), "rb") as f:
+            f.seek(off)
+            return json.loads(f.read(ln))
+
+    # ---------- чтение ----------
+    def segments(self) -> List[str]:
+        """Сегменты в хронологическом порядке: ротированные по имени, текущий — последним."""
+        rotated = sorted(os.path.basename(p) for p in glob.glob(os.path.join(self.root, "articles-*.jsonl")))
+        if os.path.exists(self.current_path):
+            rotated.append(CURRENT)
+        return rotated
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for seg in self.segments():
+            with open(os.path.join(self.root, seg), "rb") as f:
+                for raw in f:
+                    raw = raw.strip()
+                    if not raw:
+                        continue
+                    try:
+                        yield json.loads(raw)
+                    except ValueError:
+                        print(f"[warn] journal {seg}: битая строка пропущена")
+
+    def latest(self) -> Iterator[Dict[str, Any]]:
+        """Только последняя версия каждой статьи (по индексу)."""
+        for slug in self.index():
+            rec = self.get(slug)
+            if rec:
+                yield rec
+
+def write_payload(articles: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None,
+                  root: Optional[str] = None) -> str:
+    """Общая замена прежних write_payload(): дописать статьи в журнал."""
+    j = Journal(root)
+    n = j.append(articles, meta=meta)
+    print(f"[ok] journal +{n} → {j.current_path}")
+    return j.current_path
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="журнал сгенерированных статей")
+    p.add_argument("--root", default=JOURNAL_DIR)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("ls")
+    g = sub.add_parser("get"); g.add_argument("slug")
+    sub.add_parser("reindex")
+    args = p.parse_args()
+
+    j = Journal(args.root)
+    if args.cmd == "ls":
+        for seg in j.segments():
+            print(seg, os.path.getsize(os.path.join(j.root, seg)))
+        print("slugs:", len(j.index()))
+    elif args.cmd == "get":
+        print(json.dumps(j.get(args.slug), ensure_ascii=False, indent=2))
+    elif args.cmd == "reindex":
+        print("indexed:", j.rebuild_index())
@@ -0,0 +1,397 @@
+# scripts/metrics.py
+# -*- coding: utf-8 -*-
+"""
+Метрики запросов для Flask (app.py, app.create_app) и FastAPI (server/main.py)
+в текстовом формате Prometheus: GET /__metrics (по токену).
+
+- http_request_duration_seconds{route,method} — гистограмма, http_requests_total{route,method,status};
+- http_response_size_bytes{route};
+- db_queries_per_request / db_time_per_request_seconds {route} — события SQLAlchemy
+  before/after_cursor_execute на классе Engine (ловят все движки процесса; вне запроса
+  слушатель сразу выходит);
+- template_render_seconds{template} — сигналы Flask before_render_template / template_rendered;
+- сэмплирующий профайлер для горячих роутов: доля запросов помечается, фоновый поток раз
+  в METRICS_PROFILE_INTERVAL_MS снимает стек потока запроса (sys._current_frames).
+  GET /__metrics/profile — свёрнутые стеки (flamegraph.pl, speedscope), ?reset=1 — очистить;
+  POST /__metrics/profile {"routes": [...], "rate": 0.05} — включить/выключить на ходу.
+  Только Flask: там запрос целиком в одном потоке.
+
+route — шаблон правила (/news/<slug>), а не сырой путь, чтобы число серий не росло.
+Счётчики на процесс: воркеры gunicorn различаются меткой pid, суммировать — sum by (...).
+Накладные расходы: пара perf_counter и один захват блокировки на запрос; SSE-ответы
+FastAPI попадают в длительность целиком (до конца потока).
+
+ENV:
+  METRICS_ENABLED=1
+  METRICS_TOKEN=                  # пусто — ADMIN_TOKEN; нет обоих — /__metrics закрыт (403)
+  METRICS_PROFILE_ROUTES=         # "/,/news/<slug>"; пусто — профайлер выключен
+  METRICS_PROFILE_RATE=0.05
+  METRICS_PROFILE_INTERVAL_MS=5
+"""
+
+import os, sys, hmac, time, random, threading
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+def _getenv_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+UNMATCHED = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS    = (512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+QUERY_BUCKETS   = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# ---------- реестр ----------
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets, self.counts = buckets, [0] * (len(buckets) + 1)  # последний — +Inf
+        self.sum, self.count = 0.0, 0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.buckets, v)] += 1  # le включительно
+        self.sum += v
+        self.count += 1
+
+class Registry:
+    """Гистограммы и счётчики с фиксированными метками; рендер в text format 0.0.4."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.meta: Dict[str, Tuple[str, str, Tuple[str, ...], Optional[Tuple[float, ...]]]] = {}
+        self.series: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+
+    def histogram(self, name: str, help_: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.meta[name] = ("histogram", help_, labels, buckets)
+        self.series[name] = {}
+
+    def counter(self, name: str, help_: str, labels: Tuple[str, ...]):
+        self.meta[name] = ("counter", help_, labels, None)
+        self.series[name] = {}
+
+    def _observe(self, name: str, labels: Tuple[str, ...], v: float):
+        """Вызывать под self.lock."""
+        s = self.series[name]
+        h = s.get(labels)
+        if h is None:
+            h = s[labels] = Histogram(self.meta[name][3])
+        h.observe(v)
+
+    def _inc(self, name: str, labels: Tuple[str, ...], v: float = 1.0):
+        s = self.series[name]
+        s[labels] = s.get(labels, 0.0) + v
+
+    def observe(self, name: str, labels: Tuple[str, ...], v: float):
+        with self.lock:
+            self._observe(name, labels, v)
+
+    def reset(self):
+        with self.lock:
+            for s in self.series.values():
+                s.clear()
+
+    def render(self) -> str:
+        out: List[str] = []
+        pid = str(os.getpid())  # не при импорте: gunicorn --preload форкает уже загруженное приложение
+        with self.lock:
+            for name, (kind, help_, label_names, buckets) in self.meta.items():
+                out.append(f"# HELP {name} {help_}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, val in sorted(self.series[name].items()):
+                    base = _labels(label_names + ("pid",), labels + (pid,))
+                    if kind == "counter":
+                        out.append(f"{name}{{{base}}} {_num(val)}")
+                        continue
+                    acc = 0
+                    for le, c in zip(buckets + (float("inf"),), val.counts):
+                        acc += c
+                        out.append(f'{name}_bucket{{{base},le="{_num(le)}"}} {acc}')
+                    out.append(f"{name}_sum{{{base}}} {_num(val.sum)}")
+                    out.append(f"{name}_count{{{base}}} {val.count}")
+        return "\n".join(out) + "\n"
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{n}="{_esc(str(v))}"' for n, v in zip(names, values))
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+REGISTRY = Registry()
+REGISTRY.histogram("http_request_duration_seconds", "Request latency by route.", ("app", "route", "method"), LATENCY_BUCKETS)
+REGISTRY.counter("http_requests_total", "Requests by route and status.", ("app", "route", "method", "status"))
+REGISTRY.histogram("http_response_size_bytes", "Response body size.", ("app", "route"), SIZE_BUCKETS)
+REGISTRY.histogram("db_queries_per_request", "SQL statements executed per request.", ("app", "route"), QUERY_BUCKETS)
+REGISTRY.histogram("db_time_per_request_seconds", "Time in SQL per request.", ("app", "route"), LATENCY_BUCKETS)
+REGISTRY.histogram("template_render_seconds", "Jinja template render time.", ("app", "template"), LATENCY_BUCKETS)
+
+# ---------- контекст запроса ----------
+class ReqStats:
+    __slots__ = ("t0", "queries", "sql_s", "tpl", "sampled")
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.queries, self.sql_s = 0, 0.0
+        self.tpl: List[float] = []
+        self.sampled = False
+
+# contextvar, а не threading.local: FastAPI копирует контекст в run_in_threadpool,
+# и запросы к БД из sync-ручек попадают в тот же ReqStats
+_CURRENT: ContextVar[Optional[ReqStats]] = ContextVar("metrics_request", default=None)
+
+def current() -> Optional[ReqStats]:
+    return _CURRENT.get()
+
+def record(app: str, route: str, method: str, status: int, st: ReqStats, size: Optional[int]):
+    dur = time.perf_counter() - st.t0
+    R = REGISTRY
+    with R.lock:
+        R._observe("http_request_duration_seconds", (app, route, method), dur)
+        R._inc("http_requests_total", (app, route, method, str(status)))
+        if size is not None:
+            R._observe("http_response_size_bytes", (app, route), size)
+        R._observe("db_queries_per_request", (app, route), st.queries)
+        R._observe("db_time_per_request_seconds", (app, route), st.sql_s)
+
+# ---------- SQLAlchemy ----------
+_sql_hooked = False
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if _CURRENT.get() is not None:
+        conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    st = _CURRENT.get()
+    if st is None:
+        return
+    starts = conn.info.get("_metrics_t0")
+    if starts:
+        st.sql_s += time.perf_counter() - starts.pop()
+    st.queries += 1
+
+def install_sql_hooks():
+    """Слушатели на классе Engine — один раз на процесс."""
+    global _sql_hooked
+    if _sql_hooked:
+        return
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+    except ImportError:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor)
+    event.listen(Engine, "after_cursor_execute", _after_cursor)
+    _sql_hooked = True
+
+# ---------- сэмплирующий профайлер ----------
+MAX_STACKS = 20000
+MAX_DEPTH = 64
+
+class Sampler:
+    """Снимает стеки помеченных потоков; результат — Counter свёрнутых стеков."""
+    def __init__(self):
+        self.routes = {r.strip() for r in os.getenv("METRICS_PROFILE_ROUTES", "").split(",") if r.strip()}
+        self.rate = _getenv_float("METRICS_PROFILE_RATE", 0.05)
+        self.interval = _getenv_float("METRICS_PROFILE_INTERVAL_MS", 5.0) / 1000.0
+        self.active: Dict[int, str] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, routes: Optional[List[str]] = None, rate: Optional[float] = None):
+        if routes is not None:
+            self.routes = {r for r in routes if r}
+        if rate is not None:
+            self.rate = max(0.0, min(1.0, float(rate)))
+
+    def begin(self, route: str) -> bool:
+        if route not in self.routes or random.random() >= self.rate:
+            return False
+        self.active[threading.get_ident()] = route
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="metrics-sampler", daemon=True)
+                    self._thread.start()
+        return True
+
+    def end(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for tid, route in list(self.active.items()):
+                    f = frames.get(tid)
+                    if f is None:
+                        continue
+                    names = []
+                    while f is not None and len(names) < MAX_DEPTH:
+                        code = f.f_code
+                        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        f = f.f_back
+                    key = route + ";" + ";".join(reversed(names))
+                    if key in self.stacks or len(self.stacks) < MAX_STACKS:
+                        self.stacks[key] += 1
+                    self.samples += 1
+
+    def collapsed(self, reset: bool = False) -> str:
+        with self._lock:
+            text = "".join(f"{k} {v}\n" for k, v in self.stacks.most_common())
+            if reset:
+                self.stacks.clear()
+                self.samples = 0
+        return text
+
+    def status(self) -> Dict[str, Any]:
+        return {"routes": sorted(self.routes), "rate": self.rate, "interval_ms": self.interval * 1000.0,
+                "samples": self.samples, "stacks": len(self.stacks)}
+
+SAMPLER = Sampler()
+
+# ---------- доступ ----------
+def _token() -> str:
+    return (os.getenv("METRICS_TOKEN") or os.getenv("ADMIN_TOKEN") or "").strip()
+
+def check_token(headers, args) -> bool:
+    want = _token()
+    if not want:
+        return False
+    got = ((headers.get("X-Metrics-Token") or "").strip()
+           or (headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+           or (args.get("token") or "").strip())
+    return hmac.compare_digest(got, want)
+
+PROM_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------- Flask ----------
+def init_flask(app, name: Optional[str] = None):
+    """before/after/teardown_request + сигналы шаблонов + /__metrics и /__metrics/profile."""
+    if not ENABLED:
+        return
+    from flask import request, g, jsonify, before_render_template, template_rendered
+
+    app_label = name or app.import_name
+    install_sql_hooks()
+
+    @app.before_request
+    def _metrics_start():
+        if request.path.startswith("/__metrics"):
+            return
+        st = ReqStats()
+        g._metrics = (st, _CURRENT.set(st))
+        rule = request.url_rule
+        st.sampled = SAMPLER.begin(rule.rule if rule is not None else UNMATCHED)
+
+    @app.after_request
+    def _metrics_record(response):
+        m = g.get("_metrics")
+        if m is not None:
+            rule = request.url_rule
+            size = None if response.is_streamed else response.content_length
+            record(app_label, rule.rule if rule is not None else UNMATCHED, request.method,
+                   response.status_code, m[0], size)
+        return response
+
+    @app.teardown_request
+    def _metrics_reset(exc=None):
+        m = g.pop("_metrics", None)
+        if m is not None:
+            if m[0].sampled:
+                SAMPLER.end()
+            try:
+                _CURRENT.reset(m[1])
+            except ValueError:  # другой контекст (async-вью через asgiref)
+                _CURRENT.set(None)
+
+    def _tpl_start(sender, template, context, **extra):
+        st = _CURRENT.get()
+        if st is not None:
+            st.tpl.append(time.perf_counter())
+
+    def _tpl_done(sender, template, context, **extra):
+        st = _CURRENT.get()
+        if st is not None and st.tpl:
+            REGISTRY.observe("template_render_seconds", (app_label, template.name or "<string>"),
+                             time.perf_counter() - st.tpl.pop())
+
+    # weak=False: обработчики — замыкания, иначе blinker их сразу потеряет
+    before_render_template.connect(_tpl_start, app, weak=False)
+    template_rendered.connect(_tpl_done, app, weak=False)
+
+    def metrics_view():
+        if not check_token(request.headers, request.args):
+            return ("forbidden", 403)
+        return (REGISTRY.render(), 200, {"Content-Type": PROM_CONTENT_TYPE})
+
+    def profile_view():
+        if not check_token(request.headers, request.args):
+            return ("forbidden", 403)
+        if request.method == "POST":
+            body = request.get_json(silent=True) or {}
+            SAMPLER.configure(body.get("routes"), body.get("rate"))
+            return jsonify(SAMPLER.status())
+        text = SAMPLER.collapsed(reset=request.args.get("reset") == "1")
+        return (text, 200, {"Content-Type": "text/plain; charset=utf-8"})
+
+    app.add_url_rule("/__metrics", "metrics", metrics_view)
+    app.add_url_rule("/__metrics/profile", "metrics_profile", profile_view, methods=["GET", "POST"])
+
+# ---------- FastAPI / ASGI ----------
+class ASGIMetrics:
+    """Чистый ASGI-middleware: не буферизует ответ, поэтому SSE работает как раньше."""
+    def __init__(self, app, name: str = "server"):
+        self.app, self.name = app, name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/__metrics"):
+            return await self.app(scope, receive, send)
+        st = ReqStats()
+        token = _CURRENT.set(st)
+        resp = {"status": 500, "size": 0}
+
+        async def _send(msg):
+            if msg["type"] == "http.response.start":
+                resp["status"] = msg["status"]
+            elif msg["type"] == "http.response.body":
+                resp["size"] += len(msg.get("body") or b"")
+            await send(msg)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _CURRENT.reset(token)
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED
+            record(self.name, route, scope["method"], resp["status"], st, resp["size"])
+
+def init_fastapi(app, name: str = "server"):
+    if not ENABLED:
+        return
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    install_sql_hooks()
+    app.add_middleware(ASGIMetrics, name=name)
+
+    @app.get("/__metrics", include_in_schema=False)
+    def metrics_view(request: Request):
+        if not check_token(request.headers, request.query_params):
+            return PlainTextResponse("forbidden", status_code=403)
+        # charset Starlette допишет сам
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,61 @@
+# scripts/migrate_add_content_hash.py
+# Колонка articles.content_hash для sync_articles.py + бэкфилл хэшей для существующих строк.
+# add_column() зовут и app.py / create_app() при старте; бэкфилл — только отсюда
+# (пустой хэш sync_articles досчитывает на лету).
+import os, sys
+sys.path.insert(0, os.path.abspath("."))
+
+from sqlalchemy import text, inspect, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from scripts.import_articles import _flask, _articles_table, content_hash, HASHED
+
+def column_exists(engine, table, column):
+    insp = inspect(engine)
+    cols = [c["name"] for c in insp.get_columns(table)]
+    return column in cols
+
+def add_column(engine) -> bool:
+    """Идемпотентно добавляет articles.content_hash. True — колонка добавлена этим вызовом."""
+    if not inspect(engine).has_table("articles") or column_exists(engine, "articles", "content_hash"):
+        return False
+    if engine.dialect.name == "postgresql":
+        stmt = text("ALTER TABLE articles ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    else:
+        stmt = text("ALTER TABLE articles ADD COLUMN content_hash VARCHAR(64)")
+    try:
+        with engine.begin() as conn:
+            conn.execute(stmt)
+    except SQLAlchemyError:
+        # параллельный воркер успел раньше
+        if column_exists(engine, "articles", "content_hash"):
+            return False
+        raise
+    return True
+
+def main():
+    app, db, _ = _flask()
+    with app.app_context():
+        engine = db.engine
+        try:
+            print("added column 'content_hash'" if add_column(engine) else "content_hash already exists")
+        except SQLAlchemyError as e:
+            print("migration failed:", e)
+            return
+
+        # бэкфилл батчами по 1000 (обновлённые строки выпадают из выборки)
+        table = _articles_table(engine)
+        cols = [table.c.id] + [table.c[c] for c in HASHED]
+        sel = table.select().with_only_columns(*cols).where(table.c.content_hash.is_(None)).limit(1000)
+        upd = table.update().where(table.c.id == bindparam("b_id"))
+        done = 0
+        while True:
+            with engine.begin() as conn:
+                chunk = conn.execute(sel).fetchall()
+                if not chunk:
+                    break
+                conn.execute(upd, [{"b_id": r._mapping["id"], "content_hash": content_hash(r._mapping)} for r in chunk])
+            done += len(chunk)
+        print(f"backfilled content_hash for {done} rows")
+
+if __name__ == "__main__":
+    main()
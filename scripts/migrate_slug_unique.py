@@ -0,0 +1,36 @@
+# scripts/migrate_slug_unique.py
+# Уникальный индекс на articles.slug — нужен для INSERT ... ON CONFLICT (slug) в bulk-импорте.
+import os, sys
+sys.path.insert(0, os.path.abspath("."))
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from scripts.import_articles import _flask, _has_unique_slug
+
+def main():
+    app, db, _ = _flask()
+    with app.app_context():
+        engine = db.engine
+        if _has_unique_slug(engine, "articles"):
+            print("unique slug index already exists")
+            return
+
+        dups = db.session.execute(text(
+            "SELECT slug, COUNT(*) FROM articles GROUP BY slug HAVING COUNT(*) > 1"
+        )).fetchall()
+        if dups:
+            print(f"cannot add unique index: {len(dups)} duplicated slugs")
+            for slug, cnt in dups[:20]:
+                print("-", slug, "x", cnt)
+            return
+
+        try:
+            db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_articles_slug ON articles (slug)"))
+            db.session.commit()
+            print("added unique index 'ux_articles_slug'")
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print("migration failed:", e)
+
+if __name__ == "__main__":
+    main()
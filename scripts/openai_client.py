@@ -0,0 +1,256 @@
+# scripts/openai_client.py
+# -*- coding: utf-8 -*-
+"""
+Устойчивый слой вызовов OpenAI (чат и картинки в generate_news_openai.py).
+
+- классификация ошибок: retryable (429 rate limit, 5xx, таймаут, обрыв соединения)
+  и fatal (auth, прочие 4xx, insufficient_quota) — fatal не повторяем никогда;
+- повторы с экспоненциальной задержкой и full jitter; Retry-After / retry-after-ms
+  от сервера задаёт нижнюю границу паузы;
+- circuit breaker на процесс (по имени апстрима): после N неудачных вызовов подряд
+  (вызов, исчерпавший повторы, — один сбой, а не по сбою на попытку) вызовы сразу
+  получают CircuitOpen, через cooldown пропускается один пробный запрос;
+- дедлайн на весь вызов вместе с повторами: таймаут попытки не больше остатка;
+- одинаковый запрос (key), который уже выполняется в другом потоке, не дублируется —
+  второй вызов ждёт результат первого.
+
+ENV:
+  OPENAI_MAX_ATTEMPTS=4
+  OPENAI_DEADLINE_S=120
+  OPENAI_ATTEMPT_TIMEOUT_S=45
+  OPENAI_BACKOFF_BASE_S=1
+  OPENAI_BACKOFF_CAP_S=20
+  OPENAI_BREAKER_FAILS=5
+  OPENAI_BREAKER_COOLDOWN_S=30
+"""
+
+import os, json, time, random, hashlib, threading
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+def _getenv_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+class LLMError(Exception):
+    """Классифицированная ошибка апстрима: kind, retryable, retry_after (сек), status."""
+    def __init__(self, msg: str, kind: str = "unknown", retryable: bool = False,
+                 retry_after: Optional[float] = None, status: Optional[int] = None):
+        super().__init__(msg)
+        self.kind, self.retryable, self.retry_after, self.status = kind, retryable, retry_after, status
+
+class CircuitOpen(LLMError):
+    pass
+
+class DeadlineExceeded(LLMError):
+    pass
+
+STATS: Counter = Counter()
+# те же счётчики, но только для вызовов в текущем контексте (прогон генерации, scripts/gen_runs.py)
+_SCOPED: ContextVar[Optional[Counter]] = ContextVar("openai_scoped_stats", default=None)
+
+def _stat(key: str):
+    STATS[key] += 1
+    c = _SCOPED.get()
+    if c is not None:
+        c[key] += 1
+
+@contextmanager
+def scoped_stats() -> Iterator[Counter]:
+    c: Counter = Counter()
+    token = _SCOPED.set(c)
+    try:
+        yield c
+    finally:
+        _SCOPED.reset(token)
+
+def _retry_after(exc) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        ra = headers.get("retry-after")
+        if ra:
+            try:
+                return float(ra)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(ra).timestamp() - time.time())
+    except Exception:
+        pass
+    return None
+
+def classify(exc: BaseException) -> LLMError:
+    if isinstance(exc, LLMError):
+        return exc
+    msg = f"{type(exc).__name__}: {exc}"
+    status = getattr(exc, "status_code", None)
+    try:
+        import openai  # type: ignore
+    except ImportError:
+        openai = None
+    if openai is not None:
+        if isinstance(exc, openai.APITimeoutError):
+            return LLMError(msg, "timeout", True)
+        if isinstance(exc, openai.APIConnectionError):
+            return LLMError(msg, "connection", True)
+        if isinstance(exc, (openai.AuthenticationError, openai.PermissionDeniedError)):
+            return LLMError(msg, "auth", False, status=status)
+        if isinstance(exc, openai.RateLimitError):
+            if getattr(exc, "code", None) == "insufficient_quota":
+                return LLMError(msg, "quota", False, status=429)
+            return LLMError(msg, "rate_limit", True, _retry_after(exc), 429)
+    if isinstance(exc, TimeoutError):
+        return LLMError(msg, "timeout", True)
+    if isinstance(exc, ConnectionError):
+        return LLMError(msg, "connection", True)
+    if status:
+        if status >= 500 or status in (408, 409):
+            return LLMError(msg, "server", True, _retry_after(exc), status)
+        return LLMError(msg, "bad_request", False, status=status)
+    return LLMError(msg, "unknown", False)
+
+class CircuitBreaker:
+    def __init__(self, name: str, fails: Optional[int] = None, cooldown: Optional[float] = None):
+        self.name = name
+        self.threshold = int(fails or _getenv_float("OPENAI_BREAKER_FAILS", 5))
+        self.cooldown = cooldown or _getenv_float("OPENAI_BREAKER_COOLDOWN_S", 30)
+        self.state, self.failures, self.opened_at, self._probe = "closed", 0, 0.0, False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state, self._probe = "half_open", False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probe:
+                self._probe = True  # ровно один пробный запрос
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def success(self):
+        with self._lock:
+            self.state, self.failures, self._probe = "closed", 0, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    print(f"[openai] circuit '{self.name}' open after {self.failures} failure(s)")
+                self.state, self.opened_at, self._probe = "open", time.monotonic(), False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def request_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def _call(fn: Callable[[float], Any], name: str, deadline_s: float, max_attempts: int, attempt_timeout_s: float) -> Any:
+    br = breaker(name)
+    base, cap = _getenv_float("OPENAI_BACKOFF_BASE_S", 1.0), _getenv_float("OPENAI_BACKOFF_CAP_S", 20.0)
+    deadline = time.monotonic() + deadline_s
+    last: Optional[LLMError] = None
+    for attempt in range(max(1, max_attempts)):
+        left = deadline - time.monotonic()
+        if left <= 0:
+            if last is not None:
+                br.failure()
+            _stat("deadline")
+            raise DeadlineExceeded(f"{name}: deadline {deadline_s:.0f}s exceeded", "deadline", True) from last
+        if not br.allow():
+            _stat("circuit_open")
+            raise CircuitOpen(f"{name}: circuit open", "circuit_open", True, retry_after=br.retry_in())
+        _stat("attempts")
+        try:
+            res = fn(min(attempt_timeout_s, left))
+        except Exception as e:
+            err = classify(e)
+            if not err.retryable:
+                br.success()  # апстрим ответил — это ошибка запроса, а не сбой сервиса
+                _stat("fatal")
+                raise err from e
+            last = err
+            if br.state == "half_open":  # пробный запрос не прошёл — сразу обратно в open
+                br.failure()
+                raise err from e
+            if attempt + 1 >= max_attempts:
+                break
+            delay = random.uniform(0, min(cap, base * 2 ** attempt))  # full jitter
+            if err.retry_after:
+                delay = max(delay, err.retry_after)
+            if delay >= deadline - time.monotonic():
+                br.failure()
+                _stat("deadline")
+                raise DeadlineExceeded(f"{name}: no time left to retry after {err.kind}", "deadline", True,
+                                       retry_after=err.retry_after) from e
+            _stat("retries")
+            print(f"[openai] {name}: {err.kind}, retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            br.success()
+            return res
+    br.failure()  # один сбой на вызов, исчерпавший попытки
+    raise last  # type: ignore[misc]
+
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def call(
+    fn: Callable[[float], Any],
+    name: str = "openai",
+    key: Optional[str] = None,
+    deadline_s: Optional[float] = None,
+    max_attempts: Optional[int] = None,
+    attempt_timeout_s: Optional[float] = None,
+) -> Any:
+    """
+    fn(timeout) — одна попытка (например, lambda t: client.chat.completions.create(..., timeout=t)).
+    key — идентификатор идемпотентного запроса: параллельный вызов с тем же key ждёт первый.
+    Ошибки наружу — только LLMError (CircuitOpen / DeadlineExceeded — его подклассы).
+    """
+    deadline_s = deadline_s or _getenv_float("OPENAI_DEADLINE_S", 120)
+    max_attempts = int(max_attempts or _getenv_float("OPENAI_MAX_ATTEMPTS", 4))
+    attempt_timeout_s = attempt_timeout_s or _getenv_float("OPENAI_ATTEMPT_TIMEOUT_S", 45)
+    _stat("calls")
+    if not key:
+        return _call(fn, name, deadline_s, max_attempts, attempt_timeout_s)
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _inflight[key] = Future()
+    if not owner:
+        _stat("reused")
+        return fut.result()
+    try:
+        res = _call(fn, name, deadline_s, max_attempts, attempt_timeout_s)
+        fut.set_result(res)
+        return res
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def stats() -> Dict[str, Any]:
+    return {**STATS, "breakers": {n: b.snapshot() for n, b in _breakers.items()}}
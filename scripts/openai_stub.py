@@ -0,0 +1,484 @@
+# scripts/openai_stub.py
+# -*- coding: utf-8 -*-
+"""
+Локальная подмена OpenAI API для офлайн-прогонов и бенчмарков (без сети и без оплаты):
+
+  POST /v1/chat/completions                  — статья-JSON {title, section, tags, text} по теме из промпта
+                                               (stream=true — SSE-чанки, include_usage поддерживается)
+  POST /v1/images/generations                — PNG в b64_json (шум WxH — реалистичный объём ответа)
+  POST /v1/files                             — загрузка JSONL (multipart, purpose=batch)
+  GET  /v1/files/<id>, /v1/files/<id>/content
+  POST /v1/batches, GET /v1/batches (список, новые первыми), GET /v1/batches/<id>,
+  POST /v1/batches/<id>/cancel
+  GET  /_stub/stats, POST /_stub/reset       — счётчики запросов, статусов, токенов, байт картинок
+  POST /_stub/config                         — поменять параметры на лету (JSON, ключи как в DEFAULTS)
+
+Задержки — распределения: const:S | uniform:A,B | normal:MU,SIGMA | lognormal:MEDIAN,SIGMA | exp:MEAN.
+Чат: chat_latency до первого токена + token_latency на каждый completion-токен.
+Ошибки — доли запросов: errors="429=0.05,500=0.02,timeout=0.01" (timeout — ответ не приходит
+timeout_s секунд, затем соединение рвётся); 429 отдаётся с Retry-After. seed делает
+последовательность задержек и ошибок воспроизводимой.
+Batch обрабатывается фоновым потоком тем же обработчиком chat.completions (без задержек,
+но с инъекцией ошибок — они попадают в output со status_code), формат — как у Batch API.
+
+ENV (значения по умолчанию):
+  STUB_CHAT_LATENCY=const:0  STUB_TOKEN_LATENCY=const:0  STUB_IMAGE_LATENCY=const:0
+  STUB_ERRORS=               STUB_RETRY_AFTER=1          STUB_TIMEOUT_S=600
+  STUB_IMAGE_PX=256          STUB_SEED=                  STUB_BATCH_DELAY_S=0
+
+  python scripts/openai_stub.py --port 8765 --chat-latency lognormal:2,0.4 --errors 429=0.05
+  OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-stub python scripts/batch_generate.py start --n 5
+"""
+
+import os, re, json, math, time, zlib, base64, random, struct, hashlib, threading, email
+from collections import Counter, defaultdict
+from email import policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TOPIC_RE = re.compile(r"тем[аеуы]:?\s*«([^»]{1,200})»", re.I)
+QUOTED_RE = re.compile(r"«([^»]{1,200})»")
+
+PARAGRAPHS = (
+    "{Place} обсуждают событие, которое ещё вчера казалось невозможным: {topic} стало частью "
+    "повседневного порядка. Горожане говорят о нём так, будто оно было всегда, и именно эта "
+    "лёгкость выдаёт напряжение, которое никто не решается назвать вслух.",
+    "Официальные комментарии сводятся к обещанию стабильности, но за формулировками угадывается "
+    "другое желание — сохранить символическую рамку, в которой любые перемены выглядят "
+    "продолжением прежнего курса. Пустое место в центре этой рамки и определяет её устойчивость.",
+    "Наблюдатели отмечают, что реакция общества распадается на два голоса: один требует ясности, "
+    "другой наслаждается неопределённостью. Их спор не разрешается, а воспроизводится, и в этом "
+    "воспроизводстве новость обретает собственную инерцию.",
+    "Ближайшие месяцы покажут, станет ли {topic} новым правилом или останется эпизодом. Пока же "
+    "ясно одно: вопрос, который оно поставило, уже нельзя отменить — его можно только отложить.",
+)
+PLACES = (("Москва", "в Москве"), ("Казань", "в Казани"), ("Новосибирск", "в Новосибирске"),
+          ("Екатеринбург", "в Екатеринбурге"), ("Калининград", "в Калининграде"), ("Владивосток", "во Владивостоке"))
+
+DEFAULTS: Dict[str, Any] = {
+    "chat_latency": "const:0",
+    "token_latency": "const:0",
+    "image_latency": "const:0",
+    "errors": "",
+    "retry_after": 1.0,
+    "timeout_s": 600.0,
+    "image_px": 256,
+    "seed": None,
+    "batch_delay_s": 0.0,
+}
+FAULTS = ("429", "500", "503", "timeout")
+
+def _now() -> int:
+    return int(time.time())
+
+def _id(prefix: str) -> str:
+    return f"{prefix}_{os.urandom(12).hex()}"
+
+def approx_tokens(text: str) -> int:
+    """Грубая оценка: ~4 символа на токен (для кириллицы в UTF-8 — порядок верный)."""
+    return max(1, len(text) // 4)
+
+def defaults_from_env() -> Dict[str, Any]:
+    cfg = dict(DEFAULTS)
+    for k, v in DEFAULTS.items():
+        raw = os.getenv("STUB_" + k.upper())
+        if raw is None or raw.strip() == "":
+            continue
+        cfg[k] = type(v)(raw) if isinstance(v, (int, float)) else raw
+    return cfg
+
+def parse_dist(spec: str) -> Callable[[random.Random], float]:
+    """'lognormal:2,0.4' → функция rnd → секунды (не меньше нуля)."""
+    kind, _, args = (spec or "const:0").strip().partition(":")
+    try:
+        a = [float(x) for x in args.split(",") if x.strip()]
+    except ValueError:
+        raise ValueError(f"bad latency spec: {spec!r}")
+    need = {"const": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+    if kind not in need or len(a) < need[kind]:
+        raise ValueError(f"bad latency spec: {spec!r} (const:S | uniform:A,B | normal:MU,SIGMA | lognormal:MEDIAN,SIGMA | exp:MEAN)")
+    if kind == "const":
+        return lambda r: max(0.0, a[0])
+    if kind == "uniform":
+        return lambda r: max(0.0, r.uniform(a[0], a[1]))
+    if kind == "normal":
+        return lambda r: max(0.0, r.gauss(a[0], a[1]))
+    if kind == "lognormal":
+        return lambda r: r.lognormvariate(math.log(a[0]), a[1]) if a[0] > 0 else 0.0
+    return lambda r: r.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+
+def parse_errors(spec: str) -> List[Tuple[str, float]]:
+    """'429=0.05,timeout=0.01' → [(kind, p)]; сумма долей не больше 1."""
+    out = []
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        kind, _, p = part.partition("=")
+        kind = kind.strip()
+        if kind not in FAULTS:
+            raise ValueError(f"unknown error kind {kind!r}, expected one of {FAULTS}")
+        out.append((kind, float(p)))
+    if sum(p for _, p in out) > 1:
+        raise ValueError(f"error rates sum to more than 1: {spec!r}")
+    return out
+
+def png_noise(px: int, seed: int) -> bytes:
+    """RGB PNG px×px из шума: почти не сжимается, ~3·px² байт — как настоящая картинка по объёму."""
+    rnd = random.Random(seed)
+    raw = b"".join(b"\x00" + rnd.randbytes(px * 3) for _ in range(px))
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", px, px, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+def fake_article(messages: List[Dict[str, Any]], max_tokens: int = 1024, seed: Optional[int] = None) -> Tuple[str, Dict[str, int]]:
+    """Канонная статья по теме «...» из последнего user-сообщения + подсчёт токенов."""
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    m = TOPIC_RE.search(user)
+    found = [m.group(1)] if m else QUOTED_RE.findall(user)
+    topic = found[-1] if found else "будущее России"
+    rnd = random.Random(seed if seed is not None else int(hashlib.sha256(topic.encode()).hexdigest()[:8], 16))
+    city, place = rnd.choice(PLACES)
+    paras = rnd.sample(PARAGRAPHS, k=rnd.randint(2, 4))
+    text = "".join(f"<p>{p.format(topic=topic, Place=place[:1].upper() + place[1:])}</p>" for p in paras)
+    art = {
+        "title": f"{topic[:1].upper()}{topic[1:]}: что изменилось {place}"[:120],
+        "section": rnd.choice(("main", "list")),
+        "tags": ",".join([topic, "общество", city]),
+        "text": text,
+    }
+    content = json.dumps(art, ensure_ascii=False)
+    prompt = "".join(str(m.get("content") or "") for m in messages)
+    return content, {"prompt_tokens": approx_tokens(prompt), "completion_tokens": min(max_tokens, approx_tokens(content))}
+
+class StubState:
+    def __init__(self, **cfg):
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, Counter] = defaultdict(Counter)
+        self.lock = threading.Lock()
+        self.cfg: Dict[str, Any] = {}
+        self.configure(**{**defaults_from_env(), **cfg})
+
+    # ---------- конфигурация, случайность, счётчики ----------
+    def configure(self, **cfg) -> Dict[str, Any]:
+        unknown = set(cfg) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"unknown stub option(s): {sorted(unknown)}")
+        new = {**self.cfg, **cfg}
+        dists = {k: parse_dist(new[k]) for k in ("chat_latency", "token_latency", "image_latency")}
+        errors = parse_errors(new["errors"])
+        with self.lock:
+            self.cfg, self.dists, self.errors = new, dists, errors
+            if "seed" in cfg or not hasattr(self, "rnd"):
+                self.rnd = random.Random(None if new["seed"] in (None, "") else int(new["seed"]))
+        return dict(new)
+
+    def draw(self, name: str) -> float:
+        with self.lock:
+            return self.dists[name](self.rnd)
+
+    def fault(self, endpoint: str) -> Optional[str]:
+        """Какую ошибку отдать на этот запрос (None — обычный ответ)."""
+        with self.lock:
+            x, acc = self.rnd.random(), 0.0
+            for kind, p in self.errors:
+                acc += p
+                if x < acc:
+                    self.counters[endpoint][f"fault_{kind}"] += 1
+                    return kind
+        return None
+
+    def count(self, endpoint: str, **inc) -> None:
+        with self.lock:
+            self.counters[endpoint].update(inc)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            ep = {k: dict(v) for k, v in self.counters.items()}
+        tokens = {k: sum(v.get(k, 0) for v in ep.values()) for k in ("prompt_tokens", "completion_tokens")}
+        for v in ep.values():
+            if v.get("ok"):
+                v["mean_latency_s"] = round(v.get("latency_s", 0.0) / v["ok"], 4)
+        return {"config": dict(self.cfg), "endpoints": ep, "tokens": tokens}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+
+    # ---------- chat ----------
+    def chat_completion(self, body: Dict[str, Any], endpoint: str = "chat") -> Dict[str, Any]:
+        content, usage = fake_article(body.get("messages") or [], int(body.get("max_tokens") or 1024))
+        self.count(endpoint, **usage)
+        return {
+            "id": _id("chatcmpl"), "object": "chat.completion", "created": _now(),
+            "model": body.get("model") or "stub",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {**usage, "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"]},
+        }
+
+    # ---------- images ----------
+    def image_generation(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = str(body.get("prompt") or "")
+        n = max(1, int(body.get("n") or 1))
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        data = [base64.b64encode(png_noise(int(self.cfg["image_px"]), seed + i)).decode("ascii") for i in range(n)]
+        self.count("images", images=n, image_bytes=sum(len(d) * 3 // 4 for d in data),
+                   prompt_tokens=approx_tokens(prompt))
+        return {"created": _now(), "data": [{"b64_json": d} for d in data]}
+
+    # ---------- files ----------
+    def add_file(self, data: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        meta = {"id": _id("file"), "object": "file", "bytes": len(data), "created_at": _now(),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.lock:
+            self.files[meta["id"]] = {"meta": meta, "data": data}
+        return meta
+
+    # ---------- batches ----------
+    def create_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        fid = body.get("input_file_id")
+        if fid not in self.files:
+            raise KeyError(fid)
+        b = {
+            "id": _id("batch"), "object": "batch", "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": fid, "completion_window": body.get("completion_window", "24h"),
+            "status": "validating", "created_at": _now(), "output_file_id": None, "error_file_id": None,
+            "errors": None, "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+        }
+        with self.lock:
+            self.batches[b["id"]] = b
+        threading.Thread(target=self._process, args=(b,), name=f"stub-{b['id']}", daemon=True).start()
+        return b
+
+    def _process(self, b: Dict[str, Any]):
+        lines = [json.loads(l) for l in self.files[b["input_file_id"]]["data"].decode("utf-8").splitlines() if l.strip()]
+        b["request_counts"]["total"] = len(lines)
+        b["status"], b["in_progress_at"] = "in_progress", _now()
+        out, err = [], []
+        for req in lines:
+            if b["status"] == "cancelling":
+                break
+            time.sleep(float(self.cfg["batch_delay_s"]))
+            try:
+                if req.get("url") != "/v1/chat/completions":
+                    raise ValueError(f"unsupported url {req.get('url')}")
+                kind = self.fault("batch")
+                if kind:
+                    status = 500 if kind == "timeout" else int(kind)
+                    resp = {"status_code": status, "request_id": _id("req"),
+                            "body": {"error": {"message": f"injected {kind}", "type": "server_error"}}}
+                    b["request_counts"]["failed"] += 1
+                else:
+                    resp = {"status_code": 200, "request_id": _id("req"),
+                            "body": self.chat_completion(req.get("body") or {}, endpoint="batch")}
+                    b["request_counts"]["completed"] += 1
+                out.append({"id": _id("batch_req"), "custom_id": req.get("custom_id"), "response": resp, "error": None})
+            except Exception as e:
+                err.append({"id": _id("batch_req"), "custom_id": req.get("custom_id"), "response": None,
+                            "error": {"code": "invalid_request", "message": str(e)}})
+                b["request_counts"]["failed"] += 1
+        dump = lambda rows: ("\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + "\n").encode("utf-8")
+        if out:
+            b["output_file_id"] = self.add_file(dump(out), f"{b['id']}_output.jsonl", "batch_output")["id"]
+        if err:
+            b["error_file_id"] = self.add_file(dump(err), f"{b['id']}_error.jsonl", "batch_output")["id"]
+        b["status"] = "cancelled" if b["status"] == "cancelling" else "completed"
+        b["completed_at"] = _now()
+
+def _multipart(content_type: str, body: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """multipart/form-data → {имя поля: (имя файла, байты)}."""
+    msg = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body, policy=policy.default)
+    out = {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        out[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return out
+
+class Handler(BaseHTTPRequestHandler):
+    state: StubState  # задаётся в make_server
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, status: int, obj: Any = None, raw: Optional[bytes] = None, ctype: str = "application/json",
+              headers: Optional[Dict[str, str]] = None):
+        data = raw if raw is not None else json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, code: str = "invalid_request_error",
+               headers: Optional[Dict[str, str]] = None):
+        self._send(status, {"error": {"message": message, "type": code, "code": None}}, headers=headers)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _fault(self, endpoint: str) -> bool:
+        """Инъекция ошибки; True — ответ уже отдан (или соединение брошено)."""
+        st = self.state
+        kind = st.fault(endpoint)
+        if kind is None:
+            return False
+        st.count(endpoint, requests=1, **{f"status_{kind}": 1})
+        if kind == "timeout":
+            time.sleep(float(st.cfg["timeout_s"]))
+            self.close_connection = True
+        elif kind == "429":
+            ra = st.cfg["retry_after"]
+            self._error(429, "Rate limit reached (injected)", "rate_limit_exceeded",
+                        headers={"retry-after": str(ra), "retry-after-ms": str(int(float(ra) * 1000))})
+        else:
+            self._error(int(kind), "The server had an error (injected)", "server_error")
+        return True
+
+    def _chat(self, body: Dict[str, Any]):
+        st = self.state
+        if self._fault("chat"):
+            return
+        t0 = time.perf_counter()
+        ttft, per_tok = st.draw("chat_latency"), st.draw("token_latency")
+        resp = st.chat_completion(body)
+        if body.get("stream"):
+            return self._chat_stream(body, resp, ttft, per_tok, t0)
+        time.sleep(ttft + per_tok * resp["usage"]["completion_tokens"])
+        self._send(200, resp)
+        st.count("chat", requests=1, ok=1, status_200=1, latency_s=time.perf_counter() - t0)
+
+    def _chat_stream(self, body: Dict[str, Any], resp: Dict[str, Any], ttft: float, per_tok: float, t0: float):
+        st = self.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True  # HTTP/1.0: конец потока — закрытие соединения
+        content = resp["choices"][0]["message"]["content"]
+        base = {"id": resp["id"], "object": "chat.completion.chunk", "created": resp["created"], "model": resp["model"]}
+        def emit(obj: Any):
+            data = obj if isinstance(obj, bytes) else json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.wfile.write(b"data: " + data + b"\n\n")
+            self.wfile.flush()
+        try:
+            time.sleep(ttft)
+            step = 16  # ~4 токена на чанк
+            for i in range(0, len(content), step):
+                piece = content[i:i + step]
+                delta = {"content": piece, **({"role": "assistant"} if i == 0 else {})}
+                emit({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                time.sleep(per_tok * approx_tokens(piece))
+            emit({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                emit({**base, "choices": [], "usage": resp["usage"]})
+            emit(b"[DONE]")
+            st.count("chat", requests=1, ok=1, status_200=1, stream=1, latency_s=time.perf_counter() - t0)
+        except (BrokenPipeError, ConnectionResetError):
+            st.count("chat", requests=1, cancelled=1)
+
+    def _images(self, body: Dict[str, Any]):
+        st = self.state
+        if self._fault("images"):
+            return
+        t0 = time.perf_counter()
+        time.sleep(st.draw("image_latency"))
+        self._send(200, st.image_generation(body))
+        st.count("images", requests=1, ok=1, status_200=1, latency_s=time.perf_counter() - t0)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        m = re.fullmatch(r"/v1/files/([\w-]+)(/content)?", path)
+        if m:
+            f = self.state.files.get(m.group(1))
+            if not f:
+                return self._error(404, "No such file")
+            return self._send(200, raw=f["data"], ctype="application/octet-stream") if m.group(2) else self._send(200, f["meta"])
+        m = re.fullmatch(r"/v1/batches/([\w-]+)", path)
+        if m:
+            b = self.state.batches.get(m.group(1))
+            return self._send(200, b) if b else self._error(404, "No such batch")
+        if path == "/v1/batches":
+            with self.state.lock:
+                data = list(reversed(list(self.state.batches.values())))
+            return self._send(200, {"object": "list", "data": data, "has_more": False,
+                                    "first_id": data[0]["id"] if data else None,
+                                    "last_id": data[-1]["id"] if data else None})
+        if path == "/v1/models":
+            return self._send(200, {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]})
+        if path == "/_stub/stats":
+            return self._send(200, self.state.snapshot())
+        self._error(404, f"unknown route {path}")
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        body = self._body()
+        if path == "/v1/chat/completions":
+            return self._chat(json.loads(body or b"{}"))
+        if path == "/v1/images/generations":
+            return self._images(json.loads(body or b"{}"))
+        if path == "/v1/files":
+            parts = _multipart(self.headers.get("Content-Type", ""), body)
+            fname, data = parts.get("file", (None, b""))
+            purpose = (parts.get("purpose", (None, b"batch"))[1] or b"batch").decode()
+            return self._send(200, self.state.add_file(data, fname or "upload.jsonl", purpose))
+        if path == "/v1/batches":
+            try:
+                return self._send(200, self.state.create_batch(json.loads(body or b"{}")))
+            except KeyError:
+                return self._error(400, "input_file_id not found")
+        m = re.fullmatch(r"/v1/batches/([\w-]+)/cancel", path)
+        if m:
+            b = self.state.batches.get(m.group(1))
+            if not b:
+                return self._error(404, "No such batch")
+            if b["status"] in ("validating", "in_progress"):
+                b["status"] = "cancelling"
+            return self._send(200, b)
+        if path == "/_stub/reset":
+            self.state.reset()
+            return self._send(200, {"ok": True})
+        if path == "/_stub/config":
+            try:
+                return self._send(200, self.state.configure(**json.loads(body or b"{}")))
+            except (ValueError, TypeError) as e:
+                return self._error(400, str(e))
+        self._error(404, f"unknown route {path}")
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, **cfg) -> ThreadingHTTPServer:
+    """cfg — ключи DEFAULTS (chat_latency, errors, seed, ...); не заданные берутся из STUB_* ENV."""
+    handler = type("StubHandler", (Handler,), {"state": StubState(**cfg)})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve_background(**kw) -> Tuple[ThreadingHTTPServer, str]:
+    """Поднять заглушку в потоке текущего процесса → (server, base_url для OPENAI_BASE_URL)."""
+    srv = make_server(**{"port": 0, **kw})
+    threading.Thread(target=srv.serve_forever, name="openai-stub", daemon=True).start()
+    return srv, f"http://{srv.server_address[0]}:{srv.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="локальная заглушка OpenAI API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--chat-latency", dest="chat_latency", help="до первого токена, напр. lognormal:2,0.4")
+    p.add_argument("--token-latency", dest="token_latency", help="на completion-токен, напр. const:0.02")
+    p.add_argument("--image-latency", dest="image_latency", help="напр. uniform:5,15")
+    p.add_argument("--errors", help="напр. 429=0.05,500=0.02,timeout=0.01")
+    p.add_argument("--retry-after", dest="retry_after", type=float)
+    p.add_argument("--timeout-s", dest="timeout_s", type=float)
+    p.add_argument("--image-px", dest="image_px", type=int)
+    p.add_argument("--seed", type=int)
+    p.add_argument("--batch-delay", dest="batch_delay_s", type=float, help="сек на одну строку batch")
+    args = p.parse_args()
+    cfg = {k: v for k, v in vars(args).items() if k in DEFAULTS and v is not None}
+    srv = make_server(args.host, args.port, **cfg)
+    print(f"[stub] OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print(f"[stub] {json.dumps(srv.RequestHandlerClass.state.cfg, ensure_ascii=False)}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -5,6 +5,7 @@ sys.path.insert(0, os.path.abspath("."))
 from app import app, db
 from app import Article  # модель берём из app.py (как в моих версиях)
 from scripts.import_articles import import_articles
+from scripts.journal import Journal
 
 def main():
     with app.app_context():
@@ -13,9 +14,14 @@ def main():
         db.session.commit()
         print("Purged table 'articles'.")
 
-        # перезаливка из payload
-        import_articles()
-        print("Re-imported from scripts/articles_payload.py")
+        # перезаливка: журнал (последняя версия каждой статьи), иначе старый payload
+        j = Journal()
+        if j.segments():
+            n = import_articles(j.latest())
+            print(f"Re-imported {n} from journal {j.root}")
+        else:
+            import_articles()
+            print("Re-imported from scripts/articles_payload.py")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,297 @@
+# scripts/sqlwatch.py
+# -*- coding: utf-8 -*-
+"""
+Сторож SQL для Flask-приложений (app.py, app.create_app): ловит регрессии запросов
+до прода. Слушатели before/after_cursor_execute на классе Engine.
+
+- медленные запросы: дольше SQL_SLOW_MS → в лог текст, параметры и план (EXPLAIN QUERY
+  PLAN в SQLite, EXPLAIN в Postgres/MySQL; только SELECT/WITH, один и тот же statement —
+  не чаще раза в SQL_EXPLAIN_COOLDOWN_S). EXPLAIN идёт тем же соединением, в Postgres —
+  внутри SAVEPOINT, чтобы ошибка плана не сломала транзакцию запроса;
+- N+1: один и тот же statement (параметры не в счёт) SQL_REPEAT_THRESHOLD раз и больше
+  за запрос — типичная ленивая подгрузка в цикле;
+- SELECT без LIMIT внутри запроса (.all() по всей таблице) — предупреждение один раз
+  на statement за процесс;
+- бюджет запросов на роут: @query_budget(n) под @app.route. Превышение — предупреждение,
+  а в тестовом режиме (app.testing или SQL_BUDGET_STRICT=1) — QueryBudgetExceeded;
+  budget(n) — то же для произвольного блока кода.
+
+  python scripts/sqlwatch.py check [--target app:app] [--rows 300]   # бюджеты на синтетической БД
+
+ENV:
+  SQLWATCH=1                      # 0 — выключить
+  SQL_SLOW_MS=200
+  SQL_EXPLAIN=1
+  SQL_EXPLAIN_COOLDOWN_S=300
+  SQL_REPEAT_THRESHOLD=5
+  SQL_WARN_UNBOUNDED=1
+  SQL_BUDGET_STRICT=0
+"""
+
+import os, re, sys, time, threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath("."))
+
+def _getenv_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+ENABLED = os.getenv("SQLWATCH", "1") != "0"
+SLOW_S = _getenv_float("SQL_SLOW_MS", 200.0) / 1000.0
+EXPLAIN = os.getenv("SQL_EXPLAIN", "1") != "0"
+EXPLAIN_COOLDOWN_S = _getenv_float("SQL_EXPLAIN_COOLDOWN_S", 300.0)
+REPEAT_THRESHOLD = int(_getenv_float("SQL_REPEAT_THRESHOLD", 5))
+WARN_UNBOUNDED = os.getenv("SQL_WARN_UNBOUNDED", "1") != "0"
+STRICT = os.getenv("SQL_BUDGET_STRICT", "0") == "1"
+
+SELECT_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.I)
+LIMIT_RE  = re.compile(r"\bLIMIT\b|\bFETCH\s+FIRST\b|\bTOP\s*\(?\d", re.I)
+AGG_ONLY_RE = re.compile(r"^\s*SELECT\s+(count|max|min|sum|avg)\s*\(", re.I)  # одна строка — не .all()
+
+class QueryBudgetExceeded(AssertionError):
+    """Роут или блок выполнил больше SQL-запросов, чем разрешено."""
+
+def _short(statement: str, n: int = 300) -> str:
+    s = " ".join(statement.split())
+    return s if len(s) <= n else s[:n] + "…"
+
+# ---------- область (запрос / блок) ----------
+class Scope:
+    __slots__ = ("label", "parent", "count", "sql_s", "statements")
+
+    def __init__(self, label: str, parent: Optional["Scope"] = None):
+        self.label, self.parent = label, parent
+        self.count, self.sql_s = 0, 0.0
+        self.statements: Counter = Counter()
+
+    def merge_up(self):
+        p = self.parent
+        if p is not None:
+            p.count += self.count
+            p.sql_s += self.sql_s
+            p.statements.update(self.statements)
+
+    def repeats(self, threshold: int = REPEAT_THRESHOLD) -> List[tuple]:
+        return [(st, n) for st, n in self.statements.most_common() if n >= threshold]
+
+    def summary(self, top: int = 5) -> str:
+        lines = [f"{self.label}: {self.count} queries, {self.sql_s * 1000:.1f} ms in SQL"]
+        lines += [f"  {n}× {_short(st, 160)}" for st, n in self.statements.most_common(top)]
+        return "\n".join(lines)
+
+_CURRENT: ContextVar[Optional[Scope]] = ContextVar("sqlwatch_scope", default=None)
+
+def current() -> Optional[Scope]:
+    return _CURRENT.get()
+
+def _open(label: str):
+    s = Scope(label, _CURRENT.get())
+    return s, _CURRENT.set(s)
+
+def _close(s: Scope, token):
+    try:
+        _CURRENT.reset(token)
+    except ValueError:  # другой контекст
+        _CURRENT.set(s.parent)
+    s.merge_up()
+
+# ---------- EXPLAIN ----------
+_explained: Dict[str, float] = {}
+_unbounded_seen: set = set()
+_lock = threading.Lock()
+
+def explain(conn, statement: str, parameters) -> List[str]:
+    """План запроса тем же DBAPI-соединением (мимо событий SQLAlchemy — без рекурсии)."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect in ("postgresql", "mysql", "mariadb"):
+        prefix = "EXPLAIN "
+    else:
+        return []
+    savepoint = dialect == "postgresql"
+    cur = conn.connection.cursor()
+    try:
+        if savepoint:
+            cur.execute("SAVEPOINT sqlwatch_explain")
+        try:
+            cur.execute(prefix + statement, parameters)
+            rows = cur.fetchall()
+        except Exception:
+            if savepoint:
+                cur.execute("ROLLBACK TO SAVEPOINT sqlwatch_explain")
+            raise
+        if savepoint:
+            cur.execute("RELEASE SAVEPOINT sqlwatch_explain")
+    finally:
+        cur.close()
+    return [" | ".join(str(c) for c in r) for r in rows]
+
+def _report_slow(conn, statement: str, parameters, executemany: bool, elapsed: float):
+    s = _CURRENT.get()
+    where = f" [{s.label}]" if s is not None else ""
+    print(f"[sql] slow {elapsed * 1000:.0f} ms{where}: {_short(statement)} params={_short(repr(parameters), 200)}")
+    if not EXPLAIN or executemany or not SELECT_RE.match(statement):
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _explained.get(statement, -EXPLAIN_COOLDOWN_S) < EXPLAIN_COOLDOWN_S:
+            return
+        _explained[statement] = now
+    try:
+        for line in explain(conn, statement, parameters):
+            print(f"[sql]   plan: {line}")
+    except Exception as e:
+        print(f"[sql]   explain failed: {e}")
+
+# ---------- слушатели ----------
+_installed = False
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_sqlwatch_t0", []).append(time.perf_counter())
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_sqlwatch_t0")
+    elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+    s = _CURRENT.get()
+    if s is not None:
+        s.count += 1
+        s.sql_s += elapsed
+        s.statements[statement] += 1
+        if WARN_UNBOUNDED and statement not in _unbounded_seen and SELECT_RE.match(statement):
+            with _lock:
+                _unbounded_seen.add(statement)
+            if not LIMIT_RE.search(statement) and not AGG_ONLY_RE.match(statement):
+                print(f"[sql] SELECT without LIMIT [{s.label}]: {_short(statement)}")
+    if elapsed >= SLOW_S:
+        _report_slow(conn, statement, parameters, executemany, elapsed)
+
+def install():
+    """Слушатели на классе Engine — один раз на процесс."""
+    global _installed
+    if _installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, "before_cursor_execute", _before_cursor)
+    event.listen(Engine, "after_cursor_execute", _after_cursor)
+    _installed = True
+
+# ---------- бюджеты ----------
+def query_budget(n: int) -> Callable:
+    """Бюджет SQL-запросов вью-функции. Ставить под @app.route: функция не оборачивается."""
+    def deco(fn):
+        fn.query_budget = n
+        return fn
+    return deco
+
+def check_scope(s: Scope, budget: Optional[int], strict: bool):
+    for st, n in s.repeats():
+        print(f"[sql] N+1? [{s.label}] {n}× {_short(st)}")
+    if budget is not None and s.count > budget:
+        msg = f"query budget exceeded ({s.count} > {budget})\n" + s.summary()
+        if strict:
+            raise QueryBudgetExceeded(msg)
+        print(f"[sql] {msg}")
+
+@contextmanager
+def budget(max_queries: int, label: str = "block"):
+    """with budget(3): client.get("/") — QueryBudgetExceeded, если запросов больше."""
+    install()
+    s, token = _open(label)
+    try:
+        yield s
+    finally:
+        _close(s, token)
+    check_scope(s, max_queries, strict=True)
+
+# ---------- Flask ----------
+def init_flask(app):
+    if not ENABLED:
+        return
+    from flask import request, g
+
+    install()
+
+    @app.before_request
+    def _sqlwatch_open():
+        rule = request.url_rule
+        g._sqlwatch = _open(f"{request.method} {rule.rule if rule is not None else request.path}")
+
+    @app.after_request
+    def _sqlwatch_check(response):
+        m = g.get("_sqlwatch")
+        if m is not None:
+            view = app.view_functions.get(request.endpoint) if request.endpoint else None
+            check_scope(m[0], getattr(view, "query_budget", None), strict=app.testing or STRICT)
+        return response
+
+    @app.teardown_request
+    def _sqlwatch_close(exc=None):
+        m = g.pop("_sqlwatch", None)
+        if m is not None:
+            _close(*m)
+
+# ---------- check: бюджеты роутов на синтетической БД ----------
+def check(target: str = "app:app", rows: int = 300, db_url: Optional[str] = None) -> int:
+    import tempfile
+    from scripts.bench_web import make_corpus, load_target, sample_slugs, _engine_of
+
+    tmp = None
+    if not db_url:
+        tmp = tempfile.mkdtemp(prefix="sqlwatch-")
+        db_url = "sqlite:///" + os.path.join(tmp, "news.db")
+    make_corpus(db_url, rows, replace=True)
+    os.environ["DATABASE_URL"] = db_url  # до импорта приложения
+    flask_app = load_target(target)
+    flask_app.testing = True
+    engine = _engine_of(flask_app)
+    slugs = sample_slugs(engine, 1) if engine is not None else []
+    aid = None
+    if engine is not None:
+        with engine.connect() as conn:
+            aid = conn.exec_driver_sql("SELECT MIN(id) FROM articles").scalar()
+
+    failures = 0
+    client = flask_app.test_client()
+    for rule in flask_app.url_map.iter_rules():
+        view = flask_app.view_functions.get(rule.endpoint)
+        limit = getattr(view, "query_budget", None)
+        if limit is None or "GET" not in (rule.methods or ()):
+            continue
+        path = rule.rule
+        if "<slug>" in path:
+            if not slugs:
+                continue
+            path = path.replace("<slug>", slugs[0])
+        if "<int:" in path:  # /admin/<int:aid>/edit — id существующей статьи
+            if aid is None:
+                continue
+            path = re.sub(r"<int:\w+>", str(aid), path)
+        if "<" in path:
+            continue
+        try:
+            with budget(limit, f"GET {rule.rule}") as s:
+                status = client.get(path).status_code
+            print(f"[check] ok   {rule.rule}: {s.count}/{limit} queries, HTTP {status}")
+        except QueryBudgetExceeded as e:
+            failures += 1
+            print(f"[check] FAIL {rule.rule}: {e}")
+    return failures
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="SQL-бюджеты роутов")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("check", help="прогнать GET-роуты с @query_budget на синтетической БД")
+    c.add_argument("--target", default="app:app")
+    c.add_argument("--rows", type=int, default=300)
+    c.add_argument("--db", default=None, help="DATABASE_URL; по умолчанию временный SQLite")
+    args = p.parse_args()
+    sys.exit(1 if check(args.target, args.rows, args.db) else 0)
@@ -0,0 +1,147 @@
+# scripts/sync_articles.py
+# -*- coding: utf-8 -*-
+"""
+Дифференциальный синк articles с источником вместо purge_and_import.py:
+сравниваем по slug + content_hash и применяем только изменения
+(insert / update / опционально delete) батчами, без даунтайма для читателей.
+
+  python scripts/sync_articles.py data/journal            # журнал генерации
+  python scripts/sync_articles.py dump.jsonl.gz --delete   # + удалить то, чего нет в источнике
+  python scripts/sync_articles.py dump.jsonl --dry-run     # только показать дифф
+
+--delete не удаляет ничего, если источник не дал ни одной валидной строки (пустой или
+обрезанный дамп) или в нём были невалидные записи; --force — удалить всё равно.
+
+Источник — всё, что понимает scripts.import_articles.iter_source.
+Без колонки content_hash (см. migrate_add_content_hash.py) хэш БД считается на лету.
+"""
+
+import os, sys, json
+from typing import Any, Dict, Iterator, Optional
+
+sys.path.insert(0, os.path.abspath("."))
+
+from scripts.import_articles import (
+    BATCH_SIZE, HASHED, _flask, _articles_table, _batches, _row, bulk_upsert, content_hash, iter_source,
+)
+
+def _db_hashes(conn, table) -> Dict[str, str]:
+    """
+    slug → content_hash по всей таблице. Читаем только (slug, content_hash); содержимое
+    (text с inline-картинками) — вторым запросом и лишь для строк с пустым хэшем.
+    """
+    from sqlalchemy import or_
+    out: Dict[str, str] = {}
+    stream = conn.execution_options(stream_results=True, yield_per=2000)
+    hashed = [table.c[c] for c in HASHED]
+    if "content_hash" in table.c:
+        missing = 0
+        for slug, h in stream.execute(table.select().with_only_columns(table.c.slug, table.c.content_hash)):
+            if h:
+                out[slug] = h
+            else:
+                missing += 1
+        if not missing:
+            return out
+        sel = table.select().with_only_columns(table.c.slug, *hashed).where(
+            or_(table.c.content_hash.is_(None), table.c.content_hash == ""))
+    else:
+        sel = table.select().with_only_columns(table.c.slug, *hashed)
+    for r in stream.execute(sel):
+        m = r._mapping
+        out[m["slug"]] = content_hash({c: m[c] for c in HASHED})
+    return out
+
+def sync(
+    source: str,
+    delete: bool = False,
+    dry_run: bool = False,
+    batch_size: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    batch_size = int(batch_size or BATCH_SIZE)
+    _flask_app, _db, _ = _flask()
+    summary: Dict[str, Any] = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "invalid": 0}
+    diff = {"insert": [], "update": [], "delete": []}
+
+    with _flask_app.app_context():
+        engine = _db.engine
+        table = _articles_table(engine)
+        with engine.connect() as conn:
+            db_hash = _db_hashes(conn, table)
+        print(f"[info] db: {len(db_hash)} rows")
+
+        seen = set()
+        planned = {"inserted": 0, "updated": 0}  # по диффу; фактические — из отчёта bulk_upsert
+
+        def changes() -> Iterator[Dict[str, Any]]:
+            for a in iter_source(source):
+                r = _row(a, with_hash=True)
+                slug = r["slug"]
+                if not slug:
+                    summary["invalid"] += 1
+                    continue
+                seen.add(slug)
+                old = db_hash.get(slug)
+                if old == r["content_hash"]:
+                    summary["unchanged"] += 1
+                    continue
+                # повтор slug в источнике: считаем применённую версию текущей
+                db_hash[slug] = r["content_hash"]
+                kind = "insert" if old is None else "update"
+                planned["inserted" if kind == "insert" else "updated"] += 1
+                if len(diff[kind]) < 50:
+                    diff[kind].append(slug)
+                yield r
+
+        if dry_run:
+            for _ in changes():
+                pass
+            summary.update(planned)
+        else:
+            rep = bulk_upsert(changes(), batch_size=batch_size, on_conflict="update", report_rows=False)
+            # упавшие строки не считаем применёнными
+            for k in ("inserted", "updated", "errors"):
+                summary[k] = rep[k]
+
+        refuse = ("source yielded no valid rows" if not seen else
+                  f"{summary['invalid']} invalid rows in source" if summary["invalid"] else None)
+        if delete and refuse and not force:
+            # пустой/обрезанный дамп иначе снёс бы всю таблицу
+            summary["delete_refused"] = refuse
+            print(f"[warn] --delete refused: {refuse} (use --force to delete anyway)")
+        elif delete:
+            gone = [s for s in db_hash if s not in seen]
+            summary["deleted"] = len(gone)
+            diff["delete"] = gone[:50]
+            if not dry_run:
+                for chunk in _batches(gone, min(batch_size, 500)):
+                    with engine.begin() as conn:
+                        conn.execute(table.delete().where(table.c.slug.in_(chunk)))
+
+    summary["diff_sample"] = diff
+    return summary
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="дифф-синк articles по slug + content_hash")
+    p.add_argument("source", nargs="?", default=os.getenv("NEWS_JOURNAL_DIR", "data/journal"))
+    p.add_argument("--delete", action="store_true", help="удалить строки, которых нет в источнике")
+    p.add_argument("--dry-run", action="store_true", help="ничего не писать, только посчитать дифф")
+    p.add_argument("--force", action="store_true",
+                   help="--delete даже при пустом источнике или невалидных строках")
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = p.parse_args()
+
+    s = sync(args.source, delete=args.delete, dry_run=args.dry_run, batch_size=args.batch_size,
+             force=args.force)
+    sample = s.pop("diff_sample")
+    print(("[dry-run] " if args.dry_run else "") + json.dumps(s, ensure_ascii=False))
+    for kind in ("insert", "update", "delete"):
+        for slug in sample[kind]:
+            print({"insert": "+", "update": "~", "delete": "-"}[kind], slug)
+    if s.get("delete_refused"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
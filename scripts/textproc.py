@@ -0,0 +1,152 @@
+# scripts/textproc.py
+# -*- coding: utf-8 -*-
+"""
+Общая обработка текста статей: app.py (тизеры, рендер, slug в админке) и генераторы
+(контекст из прошлых статей, проверка длины, slug новых статей).
+
+- strip_html — один проход по str.find: тег пропускается целиком поиском '>' (base64
+  из data:-картинок не сканируется посимвольно регуляркой), limit — ранний выход,
+  как только набрано достаточно текста;
+- teaser_source_text / make_teaser — то же, hero-<figure> вырезается в том же проходе;
+- slugify — транслит через str.translate.
+
+strip_html совпадает с прежней версией из app.py. teaser_source_text / make_teaser
+расходятся на битой разметке: любой непарный '<' перед hero-<figure>, если между ними
+нет '>' ("1<2 <figure class=article-hero>", "<<figure …>"). Старый код сначала вырезал
+картинку, и '<' оставался буквой или склеивал остаток в тег; здесь '<' открывает тег,
+который кончается внутри <figure …>: текст между ними пропадает, а содержимое картинки
+(подпись) попадает в тизер. Сравнение и замеры — scripts/bench_text.py.
+"""
+
+import re
+from html import escape, unescape
+from typing import Iterator, List, Optional
+
+TAG_PRESENT_RE = re.compile(
+    r"</?(p|br|ul|ol|li|h[1-6]|figure|img|blockquote|pre|code|div|span)\b",
+    re.I,
+)
+LIST_LINE_RE   = re.compile(r"^\s*([-*•])\s+")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+")
+BLANK_LINES_RE = re.compile(r"\n{2,}")
+FIGURE_CLOSE_RE = re.compile(r"</figure>", re.I)
+HERO_CLASS_RE  = re.compile(r'class="[^"]*article-hero[^"]*"', re.I)
+SLUG_JUNK_RE   = re.compile(r"[^a-z0-9]+")
+
+def _pieces(s: str, skip_hero: bool = False) -> Iterator[str]:
+    """
+    Текст между тегами; вместо тега — пробел (как TAG_RE.sub(" ", ...)).
+    skip_hero: <figure class="...article-hero...">…</figure> выпадает целиком, без пробела.
+    """
+    i, n = 0, len(s)
+    while i < n:
+        j = s.find("<", i)
+        if j < 0:
+            yield s[i:]
+            return
+        k = s.find(">", j + 1)
+        if k < 0:  # незакрытый '<' — это текст
+            yield s[i:]
+            return
+        if k == j + 1:  # "<>" не тег
+            yield s[i:k + 1]
+            i = k + 1
+            continue
+        if j > i:
+            yield s[i:j]
+        if skip_hero and s[j + 1:j + 7].lower() == "figure":
+            if HERO_CLASS_RE.search(s, j, k):
+                m = FIGURE_CLOSE_RE.search(s, k + 1)
+                if m:
+                    i = m.end()
+                    continue
+        yield " "
+        i = k + 1
+
+def _finish(raw: str) -> str:
+    if "&" in raw:
+        raw = unescape(raw)
+    return " ".join(raw.split())
+
+def _plain(s: str, limit: Optional[int], skip_hero: bool) -> str:
+    if not s:
+        return ""
+    if limit is None:
+        return _finish("".join(_pieces(s, skip_hero)))
+    # ранний выход: как только очищенного текста больше limit — дальше не сканируем;
+    # результат — префикс полного. Проверяем только на месте тега (пробел): склейка
+    # текста вокруг вырезанной hero-картинки может дать сущность вроде "&#x" + "a"
+    buf: List[str] = []
+    raw_len, check_at = 0, limit + 1
+    for piece in _pieces(s, skip_hero):
+        buf.append(piece)
+        raw_len += len(piece)
+        if piece == " " and raw_len >= check_at:
+            out = _finish("".join(buf))
+            if len(out) > limit:
+                return out
+            check_at = raw_len + limit + 1
+    return _finish("".join(buf))
+
+def strip_html(html_text: str, limit: Optional[int] = None) -> str:
+    """HTML → plain (теги → пробел, сущности, схлопнутые пробелы). limit: хватит > limit символов."""
+    return _plain(html_text, limit, skip_hero=False)
+
+def teaser_source_text(html_text: str, limit: Optional[int] = None) -> str:
+    """strip_html без hero-картинки статьи."""
+    return _plain(html_text, limit, skip_hero=True)
+
+def make_teaser(html_text: str, max_len: int = 220) -> str:
+    plain = teaser_source_text(html_text, limit=max_len)
+    if len(plain) <= max_len:
+        return plain
+    cut = plain[:max_len].rsplit(" ", 1)[0]
+    return cut + "…"
+
+def _paragraphs_from_plain(s: str, target_len: int = 600) -> List[str]:
+    sentences = SENTENCE_SPLIT.split(s.strip())
+    out, buf, cur_len = [], [], 0
+    for sent in sentences:
+        if not sent:
+            continue
+        buf.append(sent); cur_len += len(sent)
+        if cur_len >= target_len:
+            out.append(" ".join(buf).strip()); buf, cur_len = [], 0
+    if buf:
+        out.append(" ".join(buf).strip())
+    return out or ([s.strip()] if s.strip() else [])
+
+def ensure_html(text: str) -> str:
+    """Если нет HTML — делаем p/ul автоматически."""
+    if not text:
+        return ""
+    if TAG_PRESENT_RE.search(text):
+        return text
+    raw = text.replace("\r\n", "\n").replace("\r", "\n").strip()
+    blocks = BLANK_LINES_RE.split(raw)
+    if len(blocks) == 1:
+        return "\n".join(f"<p>{escape(para)}</p>" for para in _paragraphs_from_plain(raw))
+    html_blocks = []
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        lines = block.split("\n")
+        if all(LIST_LINE_RE.match(line) for line in lines):
+            items = [f"<li>{escape(item)}</li>" for item in (LIST_LINE_RE.sub("", line).strip() for line in lines) if item]
+            if items:
+                html_blocks.append("<ul>\n" + "\n".join(items) + "\n</ul>")
+        else:
+            joined = " ".join(l.strip() for l in lines if l.strip())
+            if joined:
+                html_blocks.append(f"<p>{escape(joined)}</p>")
+    return "\n".join(html_blocks)
+
+TRANS = {'а':'a','б':'b','в':'v','г':'g','д':'d','е':'e','ё':'e','ж':'zh','з':'z','и':'i','й':'i',
+         'к':'k','л':'l','м':'m','н':'n','о':'o','п':'p','р':'r','с':'s','т':'t','у':'u','ф':'f',
+         'х':'h','ц':'ts','ч':'ch','ш':'sh','щ':'shch','ы':'y','э':'e','ю':'yu','я':'ya','ь':'','ъ':''}
+_TRANS_TABLE = str.maketrans(TRANS)
+
+def slugify(value: str, default: str = "article") -> str:
+    s = (value or "").lower().strip().translate(_TRANS_TABLE)
+    return SLUG_JUNK_RE.sub("-", s).strip("-") or default
@@ -1,35 +1,105 @@
 # server/main.py
-import os, sys, json, re
-from fastapi import FastAPI, Query
+import os, sys, json, re, time, asyncio, threading
+from fastapi import FastAPI, Query, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 sys.path.insert(0, os.path.abspath("."))
 
 from scripts.generate_news import (
-    LlamaCppBackend, TransformersBackend, read_topics,
-    SYSTEM_PROMPT_RU, USER_PROMPT_TMPL, generate_one
+    LlamaCppBackend, TransformersBackend, history_context, generate_many, generate_one_stream,
+    getenv_int, resolve_gguf, write_payload,
 )
-from app import slugify  # твой транслит
+from server.pool import InferencePool, PoolFull, pool_from_env
 # import_articles можно вызывать по флагу, чтобы сразу писать в БД
 from scripts.import_articles import import_articles, import_articles_from_payload_path
+from scripts.metrics import init_fastapi
 
 app = FastAPI(title="News Generator", version="1.0")
+init_fastapi(app)  # /__metrics, scripts/metrics.py
 
-# ---------- инициализация модели один раз ----------
+# ---------- модель: грузится в фоне после старта сервера ----------
 LLM_BACKEND = os.getenv("LLM_BACKEND", "llama").strip().lower()
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "1024"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
 
+# llama: по умолчанию пул процессов (server/pool.py), модель грузят воркеры
+POOL_ENABLED = LLM_BACKEND == "llama" and os.getenv("INFERENCE_POOL", "1") != "0"
+repo_id = os.getenv("GGUF_REPO_ID", "Qwen/Qwen2.5-7B-Instruct-GGUF")
+filename = os.getenv("GGUF_FILENAME", "Qwen2.5-7B-Instruct-Q4_K_M.gguf")
+
 llm = None
-if LLM_BACKEND == "llama":
-    repo_id = os.getenv("GGUF_REPO_ID", "Qwen/Qwen2.5-7B-Instruct-GGUF")
-    filename = os.getenv("GGUF_FILENAME", "Qwen2.5-7B-Instruct-Q4_K_M.gguf")
-    llm = LlamaCppBackend(repo_id, filename, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
-else:
-    model_id = os.getenv("HF_MODEL_ID", "Qwen/Qwen2.5-7B-Instruct")
-    llm = TransformersBackend(model_id, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+llm_lock = threading.Lock()  # одна модель в процессе — генерации по очереди
+pool: Optional[InferencePool] = None
+
+# starting → loading → warming → ready | failed; метрики — секунды по этапам
+MODEL: Dict[str, Any] = {"state": "starting", "error": None, "metrics": {}}
+
+def _warmup(inst):
+    """Одна короткая генерация: поднять страницы mmap / инициализировать ядра до первого запроса."""
+    if isinstance(inst, LlamaCppBackend):
+        inst.llm("Привет", max_tokens=1)
+    elif isinstance(inst, TransformersBackend):
+        inst.pipe("Привет", max_new_tokens=1)
+    # OpenAI — удалённая модель, греть нечего
+
+def _load_model():
+    global llm, pool
+    m = MODEL["metrics"]
+    t_start = time.perf_counter()
+    try:
+        MODEL["state"] = "loading"
+        inst = None
+        if LLM_BACKEND == "llama":
+            t = time.perf_counter()
+            path = resolve_gguf(repo_id, filename)
+            m["resolve_s"] = round(time.perf_counter() - t, 3)
+            t = time.perf_counter()
+            if POOL_ENABLED:
+                cfg = {"repo_id": repo_id, "filename": filename, "max_tokens": MAX_TOKENS, "temperature": TEMPERATURE}
+                p = pool_from_env(path, cfg)
+                if not p.wait_ready(timeout=getenv_int("MODEL_READY_TIMEOUT", 1800)):
+                    p.close()
+                    raise RuntimeError(p.failed or "pool workers did not become ready in time")
+                m.update(p.load_metrics())  # load_s/warmup_s — по самому медленному воркеру
+                m["pool_start_s"] = round(time.perf_counter() - t, 3)
+                pool = p
+            else:
+                inst = LlamaCppBackend(repo_id, filename, max_tokens=MAX_TOKENS, temperature=TEMPERATURE, model_path=path)
+        elif LLM_BACKEND == "openai":
+            from scripts.generate_news_openai import OpenAIChat
+            t = time.perf_counter()
+            inst = OpenAIChat(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+        else:
+            t = time.perf_counter()
+            inst = TransformersBackend(os.getenv("HF_MODEL_ID", "Qwen/Qwen2.5-7B-Instruct"),
+                                       max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+        if inst is not None:
+            m["load_s"] = round(time.perf_counter() - t, 3)
+            MODEL["state"] = "warming"
+            t = time.perf_counter()
+            _warmup(inst)
+            m["warmup_s"] = round(time.perf_counter() - t, 3)
+            llm = inst
+        MODEL["state"] = "ready"
+    except (Exception, SystemExit) as e:  # resolve_gguf сообщает об ошибках через SystemExit
+        MODEL["state"], MODEL["error"] = "failed", str(e).strip()
+        print("[server] model load failed:", MODEL["error"])
+    m["total_s"] = round(time.perf_counter() - t_start, 3)
+    print(f"[server] model {MODEL['state']}: {json.dumps(m)}")
+
+def _pool_failed():
+    """Пул перестал перезапускать воркеры после загрузки — модель больше не готова."""
+    if pool is not None and pool.failed and MODEL["state"] == "ready":
+        MODEL["state"], MODEL["error"] = "failed", pool.failed
+
+def _require_ready():
+    _pool_failed()
+    if MODEL["state"] != "ready":
+        raise HTTPException(status_code=503, detail=f"model {MODEL['state']}", headers={"Retry-After": "30"})
 
 class GenerateRequest(BaseModel):
     topics: Optional[List[str]] = None
@@ -37,30 +107,174 @@ class GenerateRequest(BaseModel):
     n: int = 3
     do_import: bool = False
 
+@app.on_event("startup")
+def _start_loading():
+    threading.Thread(target=_load_model, name="model-loader", daemon=True).start()
+
+@app.on_event("shutdown")
+def _stop_pool():
+    if pool is not None:
+        pool.close()
+
 @app.get("/health")
 def health():
-    return {"ok": True, "model_backend": LLM_BACKEND, "time": datetime.utcnow().isoformat()}
+    """Liveness: процесс жив и отвечает, даже пока модель грузится."""
+    resp = {"ok": True, "model_backend": LLM_BACKEND, "model": MODEL["state"], "time": datetime.utcnow().isoformat()}
+    if pool is not None:
+        resp["pool"] = pool.status()
+    return resp
 
-@app.post("/generate")
-def generate(req: GenerateRequest):
-    topics = req.topics or read_topics(
-        cli_topics=",".join(req.topics) if req.topics else None,
-        topics_file=req.topics_file
+@app.get("/ready")
+def ready():
+    """Readiness: 200 только когда модель загружена и прогрета; иначе 503."""
+    _pool_failed()
+    body = {"ready": MODEL["state"] == "ready", **MODEL}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+def read_topics(topics: Optional[List[str]], topics_file: Optional[str], n: int):
+    """Темы из запроса / файла (по строке); если не заданы — из истории БД, как в CLI."""
+    context, derived = history_context(
+        max(1, n), last_k=getenv_int("LAST_K", 40), half_life=getenv_int("HALF_LIFE", 10),
+        max_chars=getenv_int("CTX_MAX_CHARS", 8000),
     )
-    if req.n and req.n > 0:
-        topics = topics[:req.n]
+    if not topics and topics_file:
+        with open(topics_file, "r", encoding="utf-8") as f:
+            topics = [ln.strip() for ln in f if ln.strip()]
+    topics = topics or derived
+    return context, (topics[:n] if n and n > 0 else topics)
 
-    articles = []
-    for t in topics:
-        art = generate_one(llm, t)
-        articles.append(art)
+def _client_id(request: Request) -> str:
+    return request.headers.get("X-Client-Id") or (request.client.host if request.client else "anon")
 
-    # пишем сразу в payload файл, как у тебя в потоке
-    from scripts.generate_news import write_payload
-    write_payload(articles, path="scripts/articles_payload.py")
+@app.post("/generate")
+def generate(req: GenerateRequest, request: Request):
+    _require_ready()
+    context, topics = read_topics(req.topics, req.topics_file, req.n)
+
+    if pool is not None:
+        # темы расходятся по воркерам пула; очередь полна — 429, клиент повторит позже
+        try:
+            futs = pool.submit_many(_client_id(request), topics, context)
+        except PoolFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "15"})
+        try:
+            articles = [f.result() for f in futs]
+        except Exception as e:
+            pool.cancel(futs)
+            raise HTTPException(status_code=500, detail=f"generation failed: {e}")
+    else:
+        # несколько тем — одним батчем (TransformersBackend.chat_many), иначе по одной
+        with llm_lock:
+            articles = generate_many(llm, topics, context)
+    for i, art in enumerate(articles):
+        art["section"] = "main" if i == 0 else "list"
+
+    _persist(articles, req.do_import)
 
-    if req.do_import:
+    resp = {"count": len(articles), "articles": articles}
+    if len(topics) > 1 and getattr(llm, "batch_stats", None):
+        resp["batches"] = llm.batch_stats
+    return resp
+
+def _persist(articles: List[Dict[str, Any]], do_import: bool):
+    # дописываем в журнал, как у тебя в потоке
+    write_payload(articles)
+    if do_import:
         # по твоему же импортеру
         import_articles(articles)
 
-    return {"count": len(articles), "articles": articles}
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateRequest, request: Request):
+    """
+    То же, что /generate, но Server-Sent Events:
+      start {topics} → delta {i, text}… → article {i, article} | error {i, error} → done {count, ttft_s, elapsed_s}
+    Отключение клиента отменяет генерацию (задачи пула снимаются, модель останавливается).
+    """
+    _require_ready()
+    context, topics = await run_in_threadpool(read_topics, req.topics, req.topics_file, req.n)
+    loop = asyncio.get_running_loop()
+    q: asyncio.Queue = asyncio.Queue()
+    put = lambda ev: loop.call_soon_threadsafe(q.put_nowait, ev)
+    stop = threading.Event()
+    futs: List[Any] = []
+
+    if pool is not None:
+        try:
+            futs = pool.submit_many(_client_id(request), topics, context, on_delta=lambda i, t: put(("delta", i, t)))
+        except PoolFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "15"})
+
+        def _done(f, i):
+            if f.cancelled():
+                put(("error", i, "cancelled"))
+            elif f.exception() is not None:
+                put(("error", i, str(f.exception())))
+            else:
+                put(("article", i, f.result()))
+        for i, f in enumerate(futs):
+            f.add_done_callback(lambda f, i=i: _done(f, i))
+    else:
+        def _run():
+            with llm_lock:
+                for i, t in enumerate(topics):
+                    if stop.is_set():
+                        break
+                    gen = generate_one_stream(llm, t, context)
+                    try:
+                        for kind, val in gen:
+                            if stop.is_set():
+                                break
+                            put((kind, i, val))
+                    except Exception as e:
+                        put(("error", i, f"{type(e).__name__}: {e}"))
+                    finally:
+                        gen.close()
+            put(("end", None, None))
+        threading.Thread(target=_run, name="sse-generate", daemon=True).start()
+
+    async def events():
+        t0, ttft = time.perf_counter(), None
+        articles: Dict[int, Any] = {}
+        errors = 0
+        pending = len(topics)
+        try:
+            yield _sse("start", {"topics": topics})
+            while pending:
+                try:
+                    kind, i, val = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if kind == "delta":
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    yield _sse("delta", {"i": i, "text": val})
+                elif kind == "article":
+                    val["section"] = "main" if i == 0 else "list"
+                    articles[i] = val
+                    pending -= 1
+                    yield _sse("article", {"i": i, "article": val})
+                elif kind == "error":
+                    errors += 1
+                    pending -= 1
+                    yield _sse("error", {"i": i, "error": val})
+                else:
+                    break
+            done = [articles[i] for i in sorted(articles)]
+            if done:
+                await run_in_threadpool(_persist, done, req.do_import)
+            yield _sse("done", {"count": len(done), "errors": errors, "ttft_s": round(ttft or 0.0, 3),
+                                "elapsed_s": round(time.perf_counter() - t0, 3)})
+        finally:
+            # клиент отключился (генератор закрыт) или всё готово — освобождаем модель/воркеры
+            stop.set()
+            if futs:
+                pool.cancel(futs)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
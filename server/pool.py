@@ -0,0 +1,382 @@
+# server/pool.py
+# -*- coding: utf-8 -*-
+"""
+Пул процессов llama.cpp для server/main.py.
+
+- N воркеров (spawn), у каждого своё непересекающееся множество ядер (sched_setaffinity)
+  и n_threads по его размеру; GGUF открыт через mmap — веса в памяти одни на всех;
+- диспетчер: общая очередь с лимитом (PoolFull → 429), round-robin между клиентами,
+  чтобы один запрос на 10 тем не занимал все воркеры;
+- размер пула и потоки на воркер: POOL_SIZE / POOL_THREADS или автоподбор коротким
+  бенчмарком при старте (результат кэшируется в data/pool_tune.json).
+
+ENV:
+  INFERENCE_POOL=1                # 0 — одна модель в процессе сервера
+  POOL_SIZE=0                     # 0 — автоподбор
+  POOL_THREADS=0
+  POOL_MAX_QUEUE=32
+  POOL_MAX_WORKERS=8
+  POOL_RESTART_MAX=5              # подряд упавших запусков воркера → пул failed (/ready = 503)
+  POOL_RESTART_BACKOFF_S=1        # пауза перед перезапуском: 1, 2, 4, … до 60 с
+"""
+
+import os, sys, json, time, threading, multiprocessing as mp
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath("."))
+
+TUNE_PATH = "data/pool_tune.json"
+BENCH_PROMPT = "Новости России будущего. Главное за день:"
+
+def _getenv_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "").strip())
+    except Exception:
+        return default
+
+class PoolFull(Exception):
+    """Очередь заполнена — сервер отвечает 429."""
+
+def _cores() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # не Linux
+        return list(range(os.cpu_count() or 1))
+
+def _pin(cores: List[int]):
+    try:
+        os.sched_setaffinity(0, cores)
+    except (AttributeError, OSError) as e:
+        print("[pool] affinity not set:", e)
+
+# ---------- процессы ----------
+def _worker_main(conn, cancel, model_path: str, cores: List[int], cfg: Dict[str, Any]):
+    _pin(cores)
+    from scripts.generate_news import LlamaCppBackend, generate_one_stream
+    t0 = time.perf_counter()
+    llm = LlamaCppBackend(cfg.get("repo_id", ""), cfg.get("filename", ""), max_tokens=cfg["max_tokens"],
+                          temperature=cfg["temperature"], n_threads=len(cores), model_path=model_path)
+    t1 = time.perf_counter()
+    try:
+        llm.llm(BENCH_PROMPT, max_tokens=1)  # прогрев: поднять страницы mmap до первого запроса
+    except Exception as e:
+        print("[pool] warm-up failed:", e)
+    conn.send(("ready", os.getpid(), {"load_s": round(t1 - t0, 3), "warmup_s": round(time.perf_counter() - t1, 3)}))
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        job_id, topic, context, want_deltas = msg
+        # cancel — id отменённой задачи (общий Value), а не флаг: отмена, пришедшая раньше
+        # самой задачи, не теряется, а старая не задевает следующую (id растут)
+        if cancel.value == job_id:
+            conn.send((job_id, False, "cancelled"))
+            continue
+        gen = generate_one_stream(llm, topic, context)
+        try:
+            art = None
+            for kind, val in gen:
+                if cancel.value == job_id:  # клиент ушёл — бросаем генерацию, воркер свободен
+                    break
+                if kind == "delta":
+                    if want_deltas:
+                        conn.send(("delta", job_id, val))
+                else:
+                    art = val
+            conn.send((job_id, True, art) if art is not None else (job_id, False, "cancelled"))
+        except Exception as e:
+            conn.send((job_id, False, f"{type(e).__name__}: {e}"))
+        finally:
+            gen.close()
+
+def _bench_main(q, model_path: str, cores: List[int], n_tokens: int):
+    _pin(cores)
+    try:
+        from llama_cpp import Llama
+        llm = Llama(model_path=model_path, n_ctx=512, n_threads=len(cores), use_mmap=True, verbose=False)
+        llm(BENCH_PROMPT, max_tokens=4)  # прогрев страниц mmap
+        t0 = time.perf_counter()
+        out = llm(BENCH_PROMPT, max_tokens=n_tokens, temperature=0.0)
+        q.put(out["usage"]["completion_tokens"] / max(1e-6, time.perf_counter() - t0))
+    except Exception as e:
+        print("[pool] bench failed:", e)
+        q.put(0.0)
+
+def autotune(model_path: str, max_workers: int = 8, n_tokens: int = 32) -> Tuple[int, int]:
+    """
+    (size, threads) с максимальной суммарной скоростью: для каждого варианта потоков
+    запускаем столько воркеров одновременно, сколько влезает по ядрам, —
+    так в замер попадает и общая полоса памяти, а не только масштаб одного процесса.
+    """
+    cores = _cores()
+    n = len(cores)
+    key = f"{os.path.basename(model_path)}|{os.path.getsize(model_path)}|{n}|{max_workers}"
+    try:
+        with open(TUNE_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["size"], cached["threads"]
+    except (OSError, ValueError):
+        pass
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for t in sorted({t for t in (2, 4, 6, 8, 12, 16, n) if 1 <= t <= n}):
+        size = max(1, min(max_workers, n // t))
+        q = ctx.Queue()
+        procs = [ctx.Process(target=_bench_main, args=(q, model_path, cores[i * t:(i + 1) * t], n_tokens))
+                 for i in range(size)]
+        for p in procs:
+            p.start()
+        total = 0.0
+        for _ in procs:
+            try:
+                total += q.get(timeout=900)
+            except Exception:
+                pass
+        for p in procs:
+            p.join(10)
+            if p.is_alive():
+                p.terminate()
+        print(f"[pool] bench: {size} worker(s) × {t} threads → {total:.1f} tok/s")
+        results.append((total, size, t))
+    total, size, threads = max(results) if results else (0.0, 1, n)
+    os.makedirs(os.path.dirname(TUNE_PATH), exist_ok=True)
+    with open(TUNE_PATH, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "size": size, "threads": threads, "tok_s": round(total, 1),
+                   "results": [{"size": s, "threads": th, "tok_s": round(v, 1)} for v, s, th in results]}, f)
+    return size, threads
+
+# ---------- пул ----------
+class InferencePool:
+    def __init__(self, model_path: str, size: int, threads: int, max_queue: int = 32,
+                 cfg: Optional[Dict[str, Any]] = None, restart_max: int = 5, restart_backoff_s: float = 1.0):
+        self.model_path, self.size, self.threads, self.max_queue = model_path, size, threads, max_queue
+        self.cfg = cfg or {}
+        self.restart_max, self.restart_backoff_s = restart_max, restart_backoff_s
+        self.failed: Optional[str] = None  # причина, если воркер не поднимается restart_max раз подряд
+        self._ctx = mp.get_context("spawn")
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()  # клиент → его задачи
+        self._queued = 0
+        self._idle: deque = deque()
+        self._workers: Dict[int, Dict[str, Any]] = {}
+        self._seq = 0
+        self._closed = False
+        self.stats = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0, "restarts": 0}
+
+    def start(self) -> "InferencePool":
+        cores = _cores()
+        for i in range(self.size):
+            self._spawn(i, cores[i * self.threads:(i + 1) * self.threads] or cores)
+        threading.Thread(target=self._dispatch, name="pool-dispatch", daemon=True).start()
+        return self
+
+    def _spawn(self, i: int, cores: List[int], fails: int = 0):
+        parent, child = self._ctx.Pipe()
+        cancel = self._ctx.Value("q", 0)  # id задачи, которую воркер должен бросить
+        proc = self._ctx.Process(target=_worker_main, args=(child, cancel, self.model_path, cores, self.cfg),
+                                 name=f"llama-{i}", daemon=True)
+        proc.start()
+        child.close()
+        w = {"i": i, "cores": cores, "proc": proc, "conn": parent, "cancel": cancel, "job": None, "ready": False,
+             "fails": fails}  # fails — подряд упавших запусков, сбрасывается на "ready"
+        self._workers[i] = w
+        threading.Thread(target=self._reader, args=(w,), name=f"pool-reader-{i}", daemon=True).start()
+
+    def _reader(self, w: Dict[str, Any]):
+        while True:
+            try:
+                msg = w["conn"].recv()
+            except (EOFError, OSError):
+                break
+            if msg[0] == "ready":
+                with self._cond:
+                    w["ready"], w["fails"] = True, 0
+                    w["metrics"] = msg[2] if len(msg) > 2 else {}
+                    self._idle.append(w["i"])
+                    self._cond.notify_all()
+                continue
+            if msg[0] == "delta":
+                job = w["job"]
+                if job is not None and job[0] == msg[1] and job[4] is not None:
+                    job[4](msg[2])
+                continue
+            _job_id, ok, payload = msg
+            with self._cond:
+                job, w["job"] = w["job"], None
+                self._idle.append(w["i"])
+                self._cond.notify_all()
+            if ok:
+                self.stats["done"] += 1
+                job[1].set_result(payload)
+            else:
+                self.stats["failed"] += 1
+                job[1].set_exception(RuntimeError(payload))
+        # процесс умер: текущую задачу — в ошибку, воркер — заново
+        w["proc"].join(5)  # exitcode
+        with self._cond:
+            job, w["job"] = w["job"], None
+            if w["i"] in self._idle:
+                self._idle.remove(w["i"])
+        if job:
+            self.stats["failed"] += 1
+            job[1].set_exception(RuntimeError(f"worker llama-{w['i']} died"))
+        if self._closed:
+            return
+        fails = w["fails"] + 1
+        if fails > self.restart_max:
+            self._fail(f"worker llama-{w['i']} exited {fails} times in a row (exit code {w['proc'].exitcode})")
+            return
+        # модель не грузится (путь, OOM) — не крутим spawn в цикле: пауза растёт вдвое
+        delay = min(60.0, self.restart_backoff_s * 2 ** (fails - 1))
+        print(f"[pool] worker llama-{w['i']} exited ({w['proc'].exitcode}), restart {fails}/{self.restart_max} in {delay:.1f}s")
+        time.sleep(delay)
+        if not self._closed:
+            self.stats["restarts"] += 1
+            self._spawn(w["i"], w["cores"], fails)
+
+    def _fail(self, reason: str):
+        """Пул больше не перезапускает воркеры: очередь — в ошибку, новые задачи не принимаются."""
+        print(f"[pool] failed: {reason}")
+        with self._cond:
+            if self.failed is None:
+                self.failed = reason
+            jobs = [job for q in self._queues.values() for job in q]
+            self._queues.clear()
+            self._queued = 0
+            self._cond.notify_all()
+        for job in jobs:
+            if job[1].set_running_or_notify_cancel():
+                job[1].set_exception(RuntimeError(f"pool failed: {reason}"))
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Ждём, пока все воркеры загрузят модель и прогреются."""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while sum(1 for w in self._workers.values() if w["ready"]) < self.size:
+                if self.failed:
+                    return False
+                left = deadline - time.monotonic() if deadline else None
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left if left is not None else 1.0)
+        return True
+
+    def load_metrics(self) -> Dict[str, float]:
+        ms = [w.get("metrics") or {} for w in self._workers.values()]
+        return {k: max((m.get(k, 0.0) for m in ms), default=0.0) for k in ("load_s", "warmup_s")}
+
+    def submit_many(self, client: str, topics: List[str], context: str,
+                    on_delta: Optional[Callable[[int, str], None]] = None) -> List[Future]:
+        """
+        Все темы запроса в очередь клиента — или PoolFull, если не влезают целиком.
+        on_delta(i, text) — поток текста i-й темы (вызывается из потока-читателя пула).
+        """
+        futs = []
+        with self._cond:
+            if self.failed:
+                raise RuntimeError(f"pool failed: {self.failed}")
+            if self._closed or self._queued + len(topics) > self.max_queue:
+                self.stats["rejected"] += 1
+                raise PoolFull(f"queue full ({self._queued}/{self.max_queue})")
+            q = self._queues.setdefault(client, deque())
+            for i, t in enumerate(topics):
+                self._seq += 1
+                fut: Future = Future()
+                cb = (lambda text, i=i: on_delta(i, text)) if on_delta else None
+                q.append((self._seq, fut, t, context, cb))
+                futs.append(fut)
+            self._queued += len(topics)
+            self.stats["submitted"] += len(topics)
+            self._cond.notify_all()
+        return futs
+
+    def _next_job(self):
+        # round-robin: клиент отдаёт одну задачу и уходит в конец очереди клиентов
+        while self._queues:
+            client, q = next(iter(self._queues.items()))
+            job = q.popleft()
+            self._queued -= 1
+            if q:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            if job[1].set_running_or_notify_cancel():  # отменённые в очереди пропускаем
+                return job
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not (self._idle and self._queued) and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job = self._next_job()
+                if job is None:
+                    continue
+                w = self._workers[self._idle.popleft()]
+                w["job"] = job
+            try:
+                w["conn"].send((job[0], job[2], job[3], job[4] is not None))
+            except OSError as e:
+                job[1].set_exception(RuntimeError(f"dispatch failed: {e}"))
+
+    def cancel(self, futs: List[Future]):
+        """Снять задачи: из очереди — сразу, уже на воркере — флагом, воркер бросит генерацию."""
+        with self._cond:
+            for f in futs:
+                if f.cancel():
+                    continue
+                for w in self._workers.values():
+                    if w["job"] is not None and w["job"][1] is f:
+                        w["cancel"].value = w["job"][0]
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "size": self.size, "threads": self.threads, "max_queue": self.max_queue,
+                "queued": self._queued, "clients": len(self._queues),
+                "ready": sum(1 for w in self._workers.values() if w["ready"]),
+                "busy": sum(1 for w in self._workers.values() if w["job"] is not None),
+                "error": self.failed,
+                **self.stats,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for w in self._workers.values():
+            try:
+                w["conn"].send(None)
+            except OSError:
+                pass
+        for w in self._workers.values():
+            w["proc"].join(5)
+            if w["proc"].is_alive():
+                w["proc"].terminate()
+
+def pool_from_env(model_path: str, cfg: Dict[str, Any]) -> InferencePool:
+    n = len(_cores())
+    size, threads = _getenv_int("POOL_SIZE", 0), _getenv_int("POOL_THREADS", 0)
+    max_workers = _getenv_int("POOL_MAX_WORKERS", 8)
+    if size and not threads:
+        threads = max(1, n // size)
+    elif threads and not size:
+        size = max(1, min(max_workers, n // threads))
+    elif not (size and threads):
+        size, threads = autotune(model_path, max_workers=max_workers)
+    print(f"[pool] {size} worker(s) × {threads} threads, cores={n}")
+    try:
+        backoff = float(os.getenv("POOL_RESTART_BACKOFF_S", "1"))
+    except ValueError:
+        backoff = 1.0
+    return InferencePool(model_path, size, threads, max_queue=_getenv_int("POOL_MAX_QUEUE", 32), cfg=cfg,
+                         restart_max=_getenv_int("POOL_RESTART_MAX", 5), restart_backoff_s=backoff).start()
@@ -0,0 +1,51 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры. Скрипты импортируются как scripts.* из корня репо; тесты с БД
+поднимают app.create_app() на временном SQLite (один раз на сессию — модель Article
+в create_app объявляется на общем db) и чистят articles перед каждым тестом.
+Без flask / flask_sqlalchemy такие тесты пропускаются.
+
+  python -m pytest -q
+"""
+
+import os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("NEWS_GEN_CRON", "0")  # app.py не поднимает планировщик
+os.environ.setdefault("GEN_RUNS", "1")
+
+@pytest.fixture(scope="session")
+def flask_app(tmp_path_factory):
+    pytest.importorskip("flask_sqlalchemy")
+    pytest.importorskip("flask_migrate")
+    os.environ["DATABASE_URL"] = "sqlite:///" + str(tmp_path_factory.mktemp("db") / "news.db")
+    import app as pkg
+    a = pkg.app if getattr(pkg, "app", None) is not None else pkg.create_app()
+    with a.app_context():
+        pkg.db.create_all()
+    return a
+
+@pytest.fixture
+def articles_db(flask_app):
+    """Пустая таблица articles; возвращает движок."""
+    import app as pkg
+    with flask_app.app_context():
+        engine = pkg.db.engine
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM articles")
+    return engine
+
+def db_rows(engine):
+    """slug → строка articles (mapping)."""
+    with engine.connect() as conn:
+        return {r._mapping["slug"]: dict(r._mapping) for r in conn.exec_driver_sql("SELECT * FROM articles")}
+
+def art(slug: str, text: str = "текст", **kw):
+    a = {"title": f"Заголовок {slug}", "text": text, "tags": "экономика", "slug": slug,
+         "section": "list", "created_at": "2024-01-01T10:00:00Z"}
+    a.update(kw)
+    return a
@@ -0,0 +1,65 @@
+# tests/test_batch_generate.py
+# -*- coding: utf-8 -*-
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import batch_generate as bg
+
+class Batches:
+    """client.batches: create может «оборваться» уже после создания batch на стороне API."""
+    def __init__(self, fail_after_create=0):
+        self.items, self.fail_after_create, self.created = [], fail_after_create, 0
+
+    def create(self, metadata, timeout=None, **kw):
+        self.created += 1
+        b = SimpleNamespace(id=f"batch_{self.created}", status="validating", created_at=time.time(),
+                            metadata=metadata)
+        self.items.insert(0, b)
+        if self.fail_after_create:
+            self.fail_after_create -= 1
+            raise TimeoutError("read timeout")
+        return b
+
+    def list(self, limit=100, timeout=None):
+        return iter(self.items)
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_BACKOFF_BASE_S", "0")
+    monkeypatch.setenv("OPENAI_BACKOFF_CAP_S", "0")
+    d = tmp_path / "run"
+    d.mkdir()
+    (d / "requests.jsonl").write_text("{}\n", "utf-8")
+    bg.save_state(d, {"run_id": "r1", "stage": "prepared", "model": "m", "topics": {"a0": "тема"},
+                      "input_file_id": "file_1"})
+    return d
+
+def _client(monkeypatch, batches):
+    monkeypatch.setattr(bg, "_client", lambda state: SimpleNamespace(batches=batches))
+
+def test_retry_after_timeout_reuses_created_batch(run_dir, monkeypatch):
+    batches = Batches(fail_after_create=1)
+    _client(monkeypatch, batches)
+    state = bg.submit(run_dir)
+    assert batches.created == 1 and state["batch_id"] == "batch_1" and state["stage"] == "submitted"
+
+def test_resume_after_crash_reuses_batch_by_run_id(run_dir, monkeypatch):
+    batches = Batches()
+    _client(monkeypatch, batches)
+    # прошлый submit успел создать batch и упал до save_state
+    st = bg.load_state(run_dir)
+    st["submitting_at"] = time.time()
+    bg.save_state(run_dir, st)
+    batches.items = [SimpleNamespace(id="batch_other", status="completed", created_at=time.time(),
+                                     metadata={"run_id": "r0"}),
+                     SimpleNamespace(id="batch_old", status="in_progress", created_at=time.time(),
+                                     metadata={"run_id": "r1"})]
+    assert bg.submit(run_dir)["batch_id"] == "batch_old" and batches.created == 0
+
+def test_fresh_submit_creates_once(run_dir, monkeypatch):
+    batches = Batches()
+    _client(monkeypatch, batches)
+    state = bg.submit(run_dir)
+    assert batches.created == 1 and state["submitting_at"] and bg.load_state(run_dir)["batch_id"] == "batch_1"
@@ -0,0 +1,32 @@
+# tests/test_bench_web.py
+# -*- coding: utf-8 -*-
+import pytest
+
+from scripts import bench_web
+
+class Client:
+    """Клиент драйвера: статус по пути, без приложения."""
+    def __init__(self, statuses):
+        self.statuses, self.paths = statuses, []
+
+    def get(self, path):
+        self.paths.append(path)
+        st = self.statuses.get(path, 200)
+        if isinstance(st, Exception):
+            raise st
+        return st, 0, None
+
+def test_check_routes_flags_404_5xx_and_errors():
+    mix = bench_web.parse_mix("/=0.3,/news/<slug>=0.6,/admin=0.05,/healthz=0.05")
+    c = Client({"/": 404, "/news/s1": 500, "/admin": ConnectionError("down")})
+    bad = bench_web.check_routes(c, mix, ["s1", "s2"])
+    assert bad == {"/": 404, "/news/<slug>": 500, "/admin": "ConnectionError"}
+    assert c.paths == ["/", "/news/s1", "/admin", "/healthz"]
+    assert bench_web.check_routes(Client({"/admin": 302}), mix, ["s1"]) == {}
+
+def test_load_refuses_to_measure_404s(monkeypatch):
+    monkeypatch.setattr(bench_web, "HttpClient", lambda url: Client({"/": 404}))
+    with pytest.raises(SystemExit, match="app:app"):
+        bench_web.load(url="http://bench", mix="/=1,/healthz=1", requests=5, warmup=0)
+    res = bench_web.load(url="http://bench", mix="/=1,/healthz=1", requests=5, warmup=0, allow_errors=True)
+    assert res["route_errors"] == {"/": 404} and res["levels"][0]["requests"] == 5
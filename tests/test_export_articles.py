@@ -0,0 +1,76 @@
+# tests/test_export_articles.py
+# -*- coding: utf-8 -*-
+import base64, hashlib, json, os, shutil
+
+import pytest
+
+from tests.conftest import art, db_rows
+
+pytest.importorskip("sqlalchemy")
+from scripts import import_articles as ia  # noqa: E402
+from scripts.export_articles import export, verify  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+def _with_image(slug):
+    b64 = base64.b64encode(PNG).decode("ascii")
+    return art(slug, f'<figure class="article-hero"><img src="data:image/png;base64,{b64}"/></figure><p>текст</p>')
+
+@pytest.mark.parametrize("parts", [1, 3])
+def test_roundtrip_gz(articles_db, tmp_path, parts):
+    ia.bulk_upsert([art(f"s{i}", f"текст {i}") for i in range(7)])
+    before = {k: (v["title"], v["text"]) for k, v in db_rows(articles_db).items()}
+    man = export(str(tmp_path / "bk"), parts=parts, workers=2)
+    assert man["rows"] == 7 and len(man["parts"]) == parts
+    assert verify(str(tmp_path / "bk" / "manifest.json"))
+
+    with articles_db.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM articles")
+    rep = ia.import_articles_from_path(str(tmp_path / "bk" / "manifest.json"))
+    assert rep["inserted"] == 7
+    assert {k: (v["title"], v["text"]) for k, v in db_rows(articles_db).items()} == before
+
+def test_verify_detects_corruption(articles_db, tmp_path):
+    ia.bulk_upsert([art("a")])
+    man = export(str(tmp_path / "bk"))
+    with open(tmp_path / "bk" / man["parts"][0]["file"], "ab") as f:
+        f.write(b"x")
+    assert not verify(str(tmp_path / "bk" / "manifest.json"))
+
+def test_blobs_restored_on_import(articles_db, tmp_path, monkeypatch):
+    ia.bulk_upsert([_with_image("a"), _with_image("b")])
+    man = export(str(tmp_path / "bk"), images="blobs")
+    assert man["parts"][0]["images_blobs"] == 2
+    name = hashlib.sha256(PNG).hexdigest() + ".png"
+    assert os.listdir(tmp_path / "bk" / "blobs") == [name]
+    # битый blob: содержимое не совпадает с именем
+    bad = "0" * 64 + ".png"
+    shutil.copyfile(tmp_path / "bk" / "blobs" / name, tmp_path / "bk" / "blobs" / bad)
+    with open(tmp_path / "bk" / "blobs" / bad, "ab") as f:
+        f.write(b"x")
+
+    site = tmp_path / "site"
+    site.mkdir()
+    monkeypatch.chdir(site)
+    with articles_db.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM articles")
+    ia.import_articles_from_path(str(tmp_path / "bk" / "manifest.json"))
+
+    restored = site / "static" / "news_images" / "blobs"
+    assert sorted(os.listdir(restored)) == [name]
+    with open(restored / name, "rb") as f:
+        assert f.read() == PNG
+    assert f'src="/static/news_images/blobs/{name}"' in db_rows(articles_db)["a"]["text"]
+    with open(tmp_path / "bk" / "manifest.json", encoding="utf-8") as f:
+        assert json.load(f)["blob_url_prefix"] == "/static/news_images/blobs"
+
+def test_blob_writers_in_threads_share_one_file(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from scripts.export_articles import _images
+    text = _with_image("a")["text"]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        out = list(pool.map(lambda _: _images(text, "blobs", str(tmp_path), "/b"), range(32)))
+    name = hashlib.sha256(PNG).hexdigest() + ".png"
+    assert {t for t, _ in out} == {out[0][0]} and f'src="/b/{name}"' in out[0][0]
+    assert os.listdir(tmp_path) == [name]
+    assert (tmp_path / name).read_bytes() == PNG
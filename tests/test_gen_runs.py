@@ -0,0 +1,60 @@
+# tests/test_gen_runs.py
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from scripts import gen_runs
+
+def _row(outcome="ok", duration=1.0, stages=None, cost=None, n=1, fallbacks=None, retries=0):
+    return {"outcome": outcome, "duration_s": duration, "n_articles": n,
+            "stages": json.dumps(stages or {}), "prompt_tokens": 100, "completion_tokens": 50,
+            "cost_usd": cost, "image_bytes": 10, "retries": retries,
+            "fallbacks": json.dumps(fallbacks) if fallbacks else None}
+
+def test_prices_and_cost():
+    p = gen_runs.parse_prices("m1:1/2, bad, m2:x/1,org:m3:0.5/0.5")
+    assert p == {"m1": (1.0, 2.0), "org:m3": (0.5, 0.5)}
+    assert gen_runs.cost_usd("gpt-4o-mini", 1_000_000, 0) == 0.15
+    assert gen_runs.cost_usd("local:qwen.gguf", 10, 10) is None
+
+def test_summarize_percentiles_errors_cost():
+    rows = [_row(duration=float(d), stages={"import": 0.1, "chat": d, "context": 0.2}, cost=0.01)
+            for d in range(1, 11)]
+    rows.append(_row("error", duration=99.0, n=0, fallbacks={"chat_no_json_mode": 1}, retries=2))
+    rows[0]["fallbacks"] = json.dumps({"chat_no_json_mode": 1, "image_placeholder": 1})
+    s = gen_runs.summarize(rows)
+    assert s["runs"] == 11 and s["errors"] == 1 and s["articles"] == 10
+    # ошибочные прогоны в перцентили длительности не попадают
+    assert s["duration_s"] == {"p50": 5.0, "p90": 9.0, "p99": 10.0, "max": 10.0}
+    assert list(s["stages_s"]) == ["context", "chat", "import"]
+    assert s["cost_usd"] == {"total": 0.1, "per_article": 0.01}
+    assert s["fallbacks"] == {"chat_no_json_mode": 2, "image_placeholder": 1}
+    assert s["retries"] == 2
+
+def test_batched_chat_time_not_overcounted():
+    r = gen_runs.RunStats("cli", "local:m")
+    for _ in range(4):  # generate_many кладёт время всего батча в каждую статью
+        r.add_article({"meta": {"timings": {"chat_s": 8.0, "batched": 4}}})
+    r.add_article({"meta": {"timings": {"chat_s": 1.5}}})
+    assert r.stages["chat"] == pytest.approx(9.5)
+    assert r.n_articles == 5
+
+def test_track_saves_row(flask_app):
+    from sqlalchemy import select
+    from app import db
+    with pytest.raises(RuntimeError):
+        with gen_runs.track("cli", "local:m", n_requested=2):
+            with gen_runs.stage("context"):
+                pass
+            raise RuntimeError("модель не загрузилась")
+    with gen_runs.track("cron", "gpt-4o-mini", n_requested=1):
+        gen_runs.article({"meta": {"usage": {"prompt_tokens": 10, "completion_tokens": 5}}})
+    with flask_app.app_context():
+        t = gen_runs.runs_table(db.engine)
+        with db.engine.connect() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(select(t).order_by(t.c.id))][-2:]
+    assert [(r["source"], r["outcome"]) for r in rows] == [("cli", "error"), ("cron", "ok")]
+    assert "модель не загрузилась" in rows[0]["error"]
+    assert "context" in json.loads(rows[0]["stages"])
+    assert rows[1]["prompt_tokens"] == 10 and rows[1]["cost_usd"] is not None
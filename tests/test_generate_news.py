@@ -0,0 +1,66 @@
+# tests/test_generate_news.py
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from scripts import generate_news as gn
+
+@pytest.fixture(autouse=True)
+def _stats():
+    gn.JSON_STATS.clear()
+    yield
+    gn.JSON_STATS.clear()
+
+def test_parse_json_or_fallback_counts():
+    art = gn.parse_json_or_fallback('```json\n{"title": "Т", "section": "main", "tags": "a", "text": "абзац"}\n```', "тема")
+    assert (art["title"], art["section"], art["text"]) == ("Т", "main", "<p>абзац</p>")
+    art = gn.parse_json_or_fallback("Заголовок\n\nпервый\n\nвторой", "тема")
+    assert art["title"] == "Заголовок" and art["tags"] == "тема" and "</p><p>" in art["text"]
+    assert gn.json_stats() == {"responses": 2, "parse_failures": 1, "parse_failure_rate": 0.5}
+
+def test_plain_article_does_not_count():
+    gn.plain_article("просто текст", "тема")
+    assert not gn.JSON_STATS
+
+def test_salvage_and_validate():
+    raw = '{"title": "Заголовок", "tags": "x, y", "text": "<p>обрыв'
+    data = gn.salvage_fields(raw)
+    assert data == {"title": "Заголовок", "tags": "x, y"}
+    assert set(gn.validate_article(data)) == {"text"}
+    assert gn.validate_article({"title": "t", "tags": "x", "text": "<p>" + "слово " * 50 + "</p>"}) == {}
+
+def test_repair_json_counts_truncated_response_once(monkeypatch):
+    monkeypatch.setenv("LLAMA_JSON_RETRIES", "0")
+    llm = gn.LlamaCppBackend.__new__(gn.LlamaCppBackend)  # без загрузки модели: repair_json не зовёт llama
+    llm.last_usage, llm.last_json = {"prompt_tokens": 5}, {}
+    art = llm.repair_json("sys", "user", "тема", '{"title": "Обрыв')
+    assert art["title"].startswith("{") and art["text"].startswith("<p>")
+    assert llm.last_json == {"parse_ok": False, "retried": [], "unrepaired": ["tags", "text", "title"]}
+    assert gn.json_stats() == {"responses": 1, "parse_failures": 1, "unrepaired": 1, "parse_failure_rate": 1.0}
+
+def test_repair_json_valid_response(monkeypatch):
+    monkeypatch.setenv("LLAMA_JSON_RETRIES", "0")
+    llm = gn.LlamaCppBackend.__new__(gn.LlamaCppBackend)
+    llm.last_usage, llm.last_json = {}, {}
+    raw = json.dumps({"title": "Т", "section": "side", "tags": "a", "text": "<p>" + "слово " * 50 + "</p>"})
+    assert llm.repair_json("sys", "user", "тема", raw)["section"] == "side"
+    assert gn.json_stats() == {"responses": 1, "parse_failure_rate": 0.0}
+
+class _FakeLlama:
+    """llama_cpp.Llama для chat-ветки стрима: без chat template, токен = слово."""
+    metadata = {}
+
+    def tokenize(self, b, add_bos=True, special=False):
+        return [0] * (len(b.decode("utf-8").split()) + int(add_bos))
+
+    def create_chat_completion(self, messages, stream=False, **kw):
+        return ({"choices": [{"delta": {"content": w}}]} for w in ("раз", " два", " три"))
+
+def test_chat_stream_reports_prompt_tokens_on_chat_path():
+    llm = gn.LlamaCppBackend.__new__(gn.LlamaCppBackend)  # без загрузки модели
+    llm.llm, llm.max_tokens, llm.temperature = _FakeLlama(), 16, 0.0
+    llm._formatter, llm._prefix, llm.prefix_stats = None, None, {"misses": 0}
+    llm._cached_n = llm._prompt_n = 0
+    assert "".join(llm.chat_stream("ты редактор", "напиши три слова")) == "раз два три"
+    assert llm.last_usage == {"prompt_tokens": 6, "completion_tokens": 3}
@@ -0,0 +1,89 @@
+# tests/test_http_cache.py
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from scripts.http_cache import HttpCache, normalize_params
+
+class Resp:
+    def __init__(self, status=200, body=b'{"results": []}', headers=None):
+        self.status_code, self.content, self.headers = status, body, headers or {}
+
+class Getter:
+    """requests.get-совместимая функция с заранее заданными ответами."""
+    def __init__(self, *responses):
+        self.responses, self.calls = list(responses), []
+
+    def __call__(self, url, params=None, headers=None, **kw):
+        self.calls.append(headers or {})
+        return self.responses.pop(0)
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "c.sqlite"), ttl=60, negative_ttl=30, max_entries=100)
+
+def test_hit_with_normalized_query(cache):
+    get = Getter(Resp(body=b'{"n": 1}'))
+    r1 = cache.get(get, "https://api/x", params={"q": "Кот  В сапогах", "page": 1})
+    r2 = cache.get(get, "https://api/x", params={"page": 1, "q": " кот в сапогах"})
+    assert not r1.from_cache and r2.from_cache and r2.json() == {"n": 1}
+    assert len(get.calls) == 1 and (cache.hits, cache.misses) == (1, 1)
+    assert normalize_params({"q": "A  B"}) == "q=a+b"
+
+@pytest.mark.parametrize("status,headers,cached", [
+    (404, {}, True),                                   # негативный ответ
+    (200, {"Cache-Control": "no-store"}, False),
+    (200, {"cache-control": "no-store"}, False),       # регистр имени не важен
+    (200, {"Cache-Control": "private, max-age=60"}, True),
+    (429, {}, False),
+    (503, {}, False),
+])
+def test_what_is_cached(cache, status, headers, cached):
+    get = Getter(Resp(status, headers=headers), Resp(status, headers=headers))
+    cache.get(get, "https://api/x")
+    assert cache.get(get, "https://api/x").from_cache is cached
+
+def test_stale_entry_revalidated_with_etag(cache):
+    get = Getter(Resp(headers={"ETag": '"v1"', "Cache-Control": "max-age=0"}),
+                 Resp(304, body=b"", headers={"ETag": '"v1"', "Cache-Control": "max-age=60"}))
+    first = cache.get(get, "https://api/x")
+    time.sleep(0.01)
+    again = cache.get(get, "https://api/x")
+    assert get.calls[1]["If-None-Match"] == '"v1"'
+    assert again.from_cache and again.content == first.content and cache.revalidated == 1
+    assert cache.get(get, "https://api/x").from_cache  # продлено max-age=60, в сеть не ходим
+    assert len(get.calls) == 2
+
+def test_evicts_least_recently_read(tmp_path):
+    c = HttpCache(str(tmp_path / "c.sqlite"), ttl=60, max_entries=3)
+    get = Getter(*[Resp() for _ in range(5)])
+    for i in range(4):
+        c.get(get, f"https://api/{i}")
+    c.get(get, "https://api/0")  # освежаем last_access
+    assert c.evict() == 1
+    assert c.stats()["entries"] == 3
+    assert c.get(get, "https://api/0").from_cache
+    assert not c.get(get, "https://api/1").from_cache  # вытеснен
+
+def test_mediawiki_private_max_age_0(tmp_path):
+    mw = {"Cache-Control": "private, must-revalidate, max-age=0"}
+    c = HttpCache(str(tmp_path / "c.sqlite"), ttl=60)
+    get = Getter(Resp(headers=mw), Resp(headers=mw))
+    c.get(get, "https://commons/api")
+    assert c.stats()["entries"] == 1                   # хранится, но сразу устарело
+    assert not c.get(get, "https://commons/api").from_cache
+    c2 = HttpCache(str(tmp_path / "c2.sqlite"), ttl=60, min_ttl=600)
+    get = Getter(Resp(headers=mw))
+    c2.get(get, "https://commons/api")
+    assert c2.get(get, "https://commons/api").from_cache and len(get.calls) == 1
+
+def test_validators_found_in_any_header_case(cache):
+    get = Getter(Resp(headers={"etag": '"v2"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+                               "CACHE-CONTROL": "max-age=0"}),
+                 Resp(304, body=b"", headers={"Etag": '"v2"'}))
+    cache.get(get, "https://api/x")
+    time.sleep(0.01)
+    assert cache.get(get, "https://api/x").from_cache
+    assert get.calls[1]["If-None-Match"] == '"v2"'
+    assert get.calls[1]["If-Modified-Since"].startswith("Mon")
@@ -0,0 +1,41 @@
+# tests/test_image_cache.py
+# -*- coding: utf-8 -*-
+import pytest
+
+from scripts.image_cache import LINK_REF_RE, ImageCache
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x01" * 64
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("IMAGE_CACHE_HARDLINK", "1")
+    return ImageCache(tmp_path / "img", db_path=str(tmp_path / "c.sqlite"))
+
+def test_store_dedup_and_slug_link(cache):
+    blob = cache.store_bytes(PNG)
+    assert cache.store_bytes(PNG) == blob and cache.stats()["files"] == 1
+    assert cache.src_for(blob, "a") == "/static/news_images/a.png"
+    assert cache.path_for(blob[0], "png").stat().st_nlink == 2
+    assert LINK_REF_RE.findall('<img src="/static/news_images/a.png"/> /static/news_images/cas/ab/x.png') == ["a.png"]
+
+def test_gc_drops_unreferenced_links_then_blobs(cache):
+    blob = cache.store_bytes(PNG)
+    cache.src_for(blob, "a")
+    cache.src_for(blob, "b")
+    # статья ссылается на b.png — link a.png уходит, cas-файл держится через b.png
+    dry = cache.gc(set(), grace_hours=-1, dry_run=True, referenced_links={"b.png"})
+    assert (dry["links_removed"], dry["removed"]) == (1, 0)
+    assert (cache.static_dir / "a.png").exists()
+    res = cache.gc(set(), grace_hours=-1, referenced_links={"b.png"})
+    assert (res["links_removed"], res["removed"]) == (1, 0)
+    assert not (cache.static_dir / "a.png").exists() and (cache.static_dir / "b.png").exists()
+    # ни одной ссылки: в dry-run cas-файл тоже считается удаляемым
+    assert cache.gc(set(), grace_hours=-1, dry_run=True, referenced_links=set())["removed"] == 1
+    res = cache.gc(set(), grace_hours=-1, referenced_links=set())
+    assert (res["links_removed"], res["removed"]) == (1, 1) and cache.stats()["files"] == 0
+
+def test_gc_without_link_set_keeps_links(cache):
+    blob = cache.store_bytes(PNG)
+    cache.src_for(blob, "a")
+    assert cache.gc(set(), grace_hours=-1)["removed"] == 0
+    assert (cache.static_dir / "a.png").exists()
@@ -0,0 +1,38 @@
+# tests/test_image_worker.py
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from scripts import image_worker  # noqa: E402
+
+def test_kick_during_run_triggers_another_pass(monkeypatch):
+    started, release, passes = threading.Event(), threading.Event(), []
+
+    def fake_process_pending():
+        passes.append(1)
+        started.set()
+        release.wait(5)
+        return {"done": 0, "failed": 0}
+
+    monkeypatch.setattr(image_worker, "process_pending", fake_process_pending)
+    assert image_worker.kick() is True
+    assert started.wait(5)
+    worker = image_worker._worker
+    assert image_worker.kick() is False  # уже работает: только просьба о ещё одном проходе
+    release.set()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert len(passes) == 2
+    assert image_worker._worker is None
+
+def test_kick_after_exit_starts_new_thread(monkeypatch):
+    passes = []
+    monkeypatch.setattr(image_worker, "process_pending", lambda: passes.append(1) or {"done": 0, "failed": 0})
+    for _ in range(2):
+        assert image_worker.kick() is True
+        w = image_worker._worker
+        if w is not None:
+            w.join(5)
+    assert len(passes) == 2
@@ -0,0 +1,89 @@
+# tests/test_import_articles.py
+# -*- coding: utf-8 -*-
+import gzip, json
+
+import pytest
+
+from tests.conftest import art, db_rows
+
+ia = pytest.importorskip("scripts.import_articles")  # нужен sqlalchemy
+
+def test_insert_then_update_and_skip_unchanged(articles_db):
+    rep = ia.bulk_upsert([art("a"), art("b")])
+    assert (rep["inserted"], rep["updated"], rep["skipped"], rep["errors"]) == (2, 0, 0, 0)
+
+    rep = ia.bulk_upsert([art("a", "новый текст"), art("b")])
+    assert dict(rep["rows"]) == {"a": "updated", "b": "skipped"}
+    rows = db_rows(articles_db)
+    assert rows["a"]["text"] == "новый текст"
+    assert rows["a"]["content_hash"] == ia.content_hash(ia._row(art("a", "новый текст")))
+
+def test_update_keeps_created_at_and_id(articles_db):
+    ia.bulk_upsert([art("a", created_at="2020-05-01T00:00:00")])
+    before = db_rows(articles_db)["a"]
+    ia.bulk_upsert([art("a", "правка", created_at="2025-01-01T00:00:00")])
+    after = db_rows(articles_db)["a"]
+    assert after["text"] == "правка"
+    assert after["id"] == before["id"]
+    assert str(after["created_at"]).startswith("2020-05-01")
+
+def test_duplicate_slug_in_batch_last_wins(articles_db):
+    rep = ia.bulk_upsert([art("a", "v1"), art("a", "v2"), art("", "без slug")])
+    assert (rep["inserted"], rep["skipped"]) == (1, 2)
+    assert db_rows(articles_db)["a"]["text"] == "v2"
+
+def test_on_conflict_nothing(articles_db):
+    ia.bulk_upsert([art("a", "v1")])
+    rep = ia.bulk_upsert([art("a", "v2"), art("b")], on_conflict="nothing")
+    assert dict(rep["rows"]) == {"a": "skipped", "b": "inserted"}
+    assert db_rows(articles_db)["a"]["text"] == "v1"
+
+def test_bad_row_is_replayed_alone(articles_db):
+    with articles_db.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TRIGGER reject_bad BEFORE INSERT ON articles WHEN NEW.slug = 'bad' "
+            "BEGIN SELECT RAISE(ABORT, 'bad row'); END"
+        )
+    try:
+        rep = ia.bulk_upsert([art("a"), art("bad"), art("c")], batch_size=10)
+    finally:
+        with articles_db.begin() as conn:
+            conn.exec_driver_sql("DROP TRIGGER reject_bad")
+    assert (rep["inserted"], rep["errors"]) == (2, 1)
+    assert ("bad", "error") in rep["rows"]
+    assert set(db_rows(articles_db)) == {"a", "c"}
+
+def test_invalid_on_conflict():
+    with pytest.raises(ValueError):
+        ia.bulk_upsert([], on_conflict="replace")
+
+def _write_jsonl(path, records, opener=open):
+    with opener(path, "at", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+@pytest.mark.parametrize("name,opener", [("dump.jsonl", open), ("dump.jsonl.gz", gzip.open)])
+def test_jsonl_checkpoint_resume(articles_db, tmp_path, name, opener):
+    src, cp = str(tmp_path / name), str(tmp_path / "import.cp.json")
+    _write_jsonl(src, [art(f"s{i}") for i in range(5)], opener)
+    with opener(src, "at", encoding="utf-8") as f:
+        f.write("{не json\n\n")
+
+    rep = ia.import_articles_from_path(src, checkpoint=cp, batch_size=2)
+    assert (rep["inserted"], rep["bad_lines"]) == (5, 1)
+    with open(cp, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["source"] == src and saved["line"] == 7
+
+    # дописали хвост — повторный запуск берёт только новые строки
+    _write_jsonl(src, [art("s5"), art("s6")], opener)
+    rep = ia.import_articles_from_path(src, checkpoint=cp, batch_size=2)
+    assert (rep["inserted"], rep["updated"], rep["skipped"], rep["bad_lines"]) == (2, 0, 0, 0)
+    assert len(db_rows(articles_db)) == 7
+
+def test_checkpoint_of_other_source_is_ignored(articles_db, tmp_path):
+    src, cp = str(tmp_path / "a.jsonl"), str(tmp_path / "cp.json")
+    _write_jsonl(src, [art("x"), art("y")])
+    with open(cp, "w", encoding="utf-8") as f:
+        json.dump({"source": "other.jsonl", "line": 100, "offset": 10**6}, f)
+    assert ia.import_articles_from_path(src, checkpoint=cp)["inserted"] == 2
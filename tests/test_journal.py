@@ -0,0 +1,46 @@
+# tests/test_journal.py
+# -*- coding: utf-8 -*-
+import os
+
+from scripts.journal import Journal, CURRENT
+
+def _art(slug, text="текст"):
+    return {"title": slug, "slug": slug, "section": "list", "tags": "", "text": text}
+
+def test_append_get_and_meta(tmp_path):
+    j = Journal(str(tmp_path), fsync=False)
+    assert j.append([_art("a"), _art("b")], meta={"model": "m1"}) == 2
+    rec = j.get("b")
+    assert rec["slug"] == "b" and rec["meta"] == {"model": "m1"} and "journaled_at" in rec
+    assert j.get("нет такой") is None
+    assert j.append([]) == 0
+
+def test_latest_version_wins(tmp_path):
+    j = Journal(str(tmp_path), fsync=False)
+    j.append([_art("a", "v1"), _art("b")])
+    j.append([_art("a", "v2")])
+    assert j.get("a")["text"] == "v2"
+    assert [r["text"] for r in j if r["slug"] == "a"] == ["v1", "v2"]
+    assert {r["slug"]: r["text"] for r in j.latest()} == {"a": "v2", "b": "текст"}
+
+def test_rotation_keeps_index_valid(tmp_path):
+    j = Journal(str(tmp_path), max_bytes=400, fsync=False)
+    for i in range(6):
+        j.append([_art(f"s{i}", "x" * 150)])
+    segs = j.segments()
+    assert len(segs) > 1 and segs[-1] == CURRENT
+    for i in range(6):
+        assert j.get(f"s{i}")["slug"] == f"s{i}"
+
+def test_empty_slug_not_indexed_and_rebuild_matches(tmp_path):
+    j = Journal(str(tmp_path), max_bytes=400, fsync=False)
+    j.append([_art("a"), _art("")])
+    j.append([_art("b", "y" * 300), _art("a", "v2")])
+    assert "" not in j.index() and j.get("") is None
+    before = dict(j.index())
+    with open(j.current_path, "ab") as f:
+        f.write(b"{broken\n")
+    os.remove(j.index_path)
+    assert j.rebuild_index() == 3
+    assert j.index() == before
+    assert len(list(j)) == 4  # битая строка пропущена
@@ -0,0 +1,99 @@
+# tests/test_openai_client.py
+# -*- coding: utf-8 -*-
+import threading, time, uuid
+
+import pytest
+
+from scripts import openai_client as oc
+
+@pytest.fixture(autouse=True)
+def _fast_backoff(monkeypatch):
+    monkeypatch.setenv("OPENAI_BACKOFF_BASE_S", "0")
+    monkeypatch.setenv("OPENAI_BACKOFF_CAP_S", "0")
+
+def _name():
+    return "test-" + uuid.uuid4().hex[:8]
+
+class Flaky:
+    """fn(timeout): сначала fails раз бросает exc, потом возвращает "ok"."""
+    def __init__(self, fails, exc=TimeoutError):
+        self.fails, self.exc, self.calls = fails, exc, 0
+
+    def __call__(self, timeout):
+        self.calls += 1
+        if self.calls <= self.fails:
+            raise self.exc("boom")
+        return "ok"
+
+def test_retries_then_succeeds():
+    fn = Flaky(2)
+    with oc.scoped_stats() as c:
+        assert oc.call(fn, name=_name(), max_attempts=4) == "ok"
+    assert fn.calls == 3 and (c["calls"], c["attempts"], c["retries"]) == (1, 3, 2)
+
+def test_fatal_is_not_retried():
+    fn = Flaky(5, ValueError)
+    with pytest.raises(oc.LLMError) as ei:
+        oc.call(fn, name=_name(), max_attempts=4)
+    assert fn.calls == 1 and not ei.value.retryable and ei.value.kind == "unknown"
+
+def test_classify():
+    assert oc.classify(TimeoutError()).kind == "timeout"
+    assert oc.classify(ConnectionResetError()).retryable
+    e = Exception("x")
+    e.status_code = 503
+    assert (oc.classify(e).kind, oc.classify(e).retryable) == ("server", True)
+    e.status_code = 400
+    assert oc.classify(e).retryable is False
+
+def test_retried_burst_does_not_open_breaker():
+    name = _name()
+    br = oc.CircuitBreaker(name, fails=3, cooldown=60)
+    oc._breakers[name] = br
+    for _ in range(3):  # каждый вызов пережил 3 сбоя из 4 попыток
+        assert oc.call(Flaky(3), name=name, max_attempts=4) == "ok"
+    assert br.snapshot() == {"state": "closed", "failures": 0}
+
+def test_breaker_counts_exhausted_calls_and_probes():
+    name = _name()
+    br = oc.CircuitBreaker(name, fails=2, cooldown=0.05)
+    oc._breakers[name] = br
+    for i in range(2):
+        with pytest.raises(oc.LLMError):
+            oc.call(Flaky(10), name=name, max_attempts=3)
+        assert br.failures == i + 1
+    assert br.state == "open"
+    fn = Flaky(0)
+    with pytest.raises(oc.CircuitOpen):
+        oc.call(fn, name=name)
+    assert fn.calls == 0
+
+    time.sleep(0.06)
+    probe = Flaky(10)
+    with pytest.raises(oc.LLMError):
+        oc.call(probe, name=name, max_attempts=3)
+    assert probe.calls == 1 and br.state == "open"  # неудачная проба — без повторов обратно в open
+
+    time.sleep(0.06)
+    assert oc.call(Flaky(0), name=name) == "ok"
+    assert br.snapshot() == {"state": "closed", "failures": 0}
+
+def test_same_key_in_flight_is_shared():
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow(timeout):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    key, name, out = oc.request_key("chat", "тема"), _name(), []
+    t = threading.Thread(target=lambda: out.append(oc.call(slow, name=name, key=key)))
+    t.start()
+    assert started.wait(5)
+    t2 = threading.Thread(target=lambda: out.append(oc.call(slow, name=name, key=key)))
+    t2.start()
+    time.sleep(0.05)
+    release.set()
+    t.join(5); t2.join(5)
+    assert out == ["shared", "shared"] and len(calls) == 1
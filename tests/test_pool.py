@@ -0,0 +1,58 @@
+# tests/test_pool.py
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from server.pool import InferencePool
+
+def test_broken_model_marks_pool_failed_instead_of_respawning(tmp_path):
+    # модель не грузится (нет файла / нет llama_cpp) — воркер падает сразу после spawn
+    pool = InferencePool(str(tmp_path / "missing.gguf"), size=1, threads=1, cfg={"max_tokens": 8, "temperature": 0.0},
+                         restart_max=2, restart_backoff_s=0.05).start()
+    try:
+        t0 = time.monotonic()
+        assert pool.wait_ready(timeout=60) is False
+        assert time.monotonic() - t0 < 60
+        st = pool.status()
+        assert st["error"] and "3 times in a row" in st["error"] and pool.failed == st["error"]
+        assert st["restarts"] == 2 and st["ready"] == 0
+        with pytest.raises(RuntimeError, match="pool failed"):
+            pool.submit_many("client", ["тема"], "")
+        time.sleep(0.3)
+        assert pool.status()["restarts"] == 2  # больше не перезапускается
+    finally:
+        pool.close()
+
+def test_cancel_sent_before_worker_reads_job_is_not_lost(monkeypatch):
+    import multiprocessing as mp
+    import threading
+    from scripts import generate_news as gn
+    from server import pool as pl
+
+    class FakeLlama:
+        def __init__(self, *a, **kw):
+            self.llm = lambda *a, **kw: None
+
+    def fake_stream(llm, topic, context):
+        for w in topic.split():
+            yield "delta", w
+        yield "article", {"title": topic}
+
+    monkeypatch.setattr(gn, "LlamaCppBackend", FakeLlama)
+    monkeypatch.setattr(gn, "generate_one_stream", fake_stream)
+    monkeypatch.setattr(pl, "_pin", lambda cores: None)
+    parent, child = mp.Pipe()
+    cancel = mp.Value("q", 0)
+    t = threading.Thread(target=pl._worker_main, args=(child, cancel, "m.gguf", [0], {"max_tokens": 8, "temperature": 0.0}))
+    t.start()
+    try:
+        assert parent.recv()[0] == "ready"
+        cancel.value = 7  # клиент ушёл, пока задача 7 ещё в трубе
+        parent.send((7, "первая тема", "", False))
+        assert parent.recv() == (7, False, "cancelled")
+        parent.send((8, "вторая тема", "", False))  # старая отмена не задевает следующую задачу
+        assert parent.recv() == (8, True, {"title": "вторая тема"})
+    finally:
+        parent.send(None)
+        t.join(5)
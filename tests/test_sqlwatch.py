@@ -0,0 +1,64 @@
+# tests/test_sqlwatch.py
+# -*- coding: utf-8 -*-
+"""Бюджеты SQL-запросов роутов app.py (@query_budget) — проверяются здесь, а не только вручную."""
+import io, sys
+from contextlib import redirect_stdout
+
+import pytest
+
+from scripts import sqlwatch
+from scripts.sqlwatch import QueryBudgetExceeded, Scope, budget, check_scope
+
+def test_check_scope_strict_and_repeats(capsys):
+    s = Scope("GET /x")
+    s.count = 6
+    s.statements["SELECT * FROM articles WHERE id = ?"] = 6
+    check_scope(s, budget=10, strict=True)
+    assert "N+1?" in capsys.readouterr().out
+    with pytest.raises(QueryBudgetExceeded, match=r"6 > 5"):
+        check_scope(s, budget=5, strict=True)
+    check_scope(s, budget=5, strict=False)  # вне тестового режима — только предупреждение
+    assert "query budget exceeded" in capsys.readouterr().out
+
+def test_budget_block():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.connect() as conn:
+        with budget(2) as s:
+            conn.exec_driver_sql("SELECT 1")
+            conn.exec_driver_sql("SELECT 2")
+        assert s.count == 2
+        with pytest.raises(QueryBudgetExceeded):
+            with budget(1, "два запроса"):
+                conn.exec_driver_sql("SELECT 1")
+                conn.exec_driver_sql("SELECT 1")
+
+@pytest.fixture(scope="module")
+def checked(tmp_path_factory):
+    pytest.importorskip("flask_sqlalchemy")
+    mp = pytest.MonkeyPatch()
+    db_url = "sqlite:///" + str(tmp_path_factory.mktemp("sqlwatch") / "news.db")
+    mp.setenv("DATABASE_URL", db_url)  # check() выставляет его сам; monkeypatch вернёт прежний
+    out = io.StringIO()
+    try:
+        with redirect_stdout(out):
+            failures = sqlwatch.check("app:app", rows=60, db_url=db_url)
+        yield failures, out.getvalue(), sys.modules["app_flat"]
+    finally:
+        mp.undo()
+
+def test_route_budgets_hold(checked):
+    failures, out, _ = checked
+    assert failures == 0, out
+    for route in ("/", "/news/<slug>", "/admin", "/admin/<int:aid>/edit"):
+        assert f"[check] ok   {route}:" in out, out
+
+def test_admin_edit_post_within_budget(checked):
+    _, _, mod = checked
+    with mod.app.app_context():
+        a = mod.Article.query.order_by(mod.Article.id).first()
+        aid, title = a.id, a.title
+    client = mod.app.test_client()
+    with budget(2, "POST /admin/<int:aid>/edit") as s:
+        r = client.post(f"/admin/{aid}/edit", data={"title": title + " (правка)", "section": "list", "text": "<p>текст</p>"})
+    assert r.status_code == 302 and s.count <= 2
@@ -0,0 +1,86 @@
+# tests/test_sync_articles.py
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from tests.conftest import art, db_rows
+
+pytest.importorskip("sqlalchemy")
+from scripts import import_articles as ia  # noqa: E402
+from scripts.sync_articles import sync  # noqa: E402
+from scripts.migrate_add_content_hash import add_column, column_exists  # noqa: E402
+
+def _dump(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    return str(path)
+
+def test_sync_applies_only_changes(articles_db, tmp_path):
+    ia.bulk_upsert([art("a"), art("b"), art("old")])
+    src = _dump(tmp_path / "src.jsonl", [art("a", "правка"), art("b"), art("c")])
+
+    dry = sync(src, delete=True, dry_run=True)
+    assert (dry["inserted"], dry["updated"], dry["unchanged"], dry["deleted"]) == (1, 1, 1, 1)
+    assert set(db_rows(articles_db)) == {"a", "b", "old"}
+
+    s = sync(src, delete=True)
+    assert (s["inserted"], s["updated"], s["unchanged"], s["deleted"], s["errors"]) == (1, 1, 1, 1, 0)
+    rows = db_rows(articles_db)
+    assert set(rows) == {"a", "b", "c"} and rows["a"]["text"] == "правка"
+
+    again = sync(src)
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 3)
+
+def test_sync_does_not_count_failed_rows(articles_db, tmp_path):
+    with articles_db.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TRIGGER reject_bad BEFORE INSERT ON articles WHEN NEW.slug = 'bad' "
+            "BEGIN SELECT RAISE(ABORT, 'bad row'); END"
+        )
+    try:
+        s = sync(_dump(tmp_path / "src.jsonl", [art("a"), art("bad")]))
+    finally:
+        with articles_db.begin() as conn:
+            conn.exec_driver_sql("DROP TRIGGER reject_bad")
+    assert (s["inserted"], s["errors"]) == (1, 1)
+
+def test_delete_refused_for_empty_or_invalid_source(articles_db, tmp_path):
+    ia.bulk_upsert([art("a"), art("b")])
+    empty = _dump(tmp_path / "empty.jsonl", [])
+    s = sync(empty, delete=True)
+    assert s["deleted"] == 0 and "no valid rows" in s["delete_refused"]
+    s = sync(_dump(tmp_path / "bad.jsonl", [art("a"), {"title": "без slug", "text": "x"}]), delete=True)
+    assert s["deleted"] == 0 and "invalid" in s["delete_refused"]
+    assert set(db_rows(articles_db)) == {"a", "b"}
+    s = sync(empty, delete=True, force=True)
+    assert s["deleted"] == 2 and not db_rows(articles_db)
+
+def test_db_hashes_reads_content_only_for_missing_hashes(articles_db):
+    from scripts.sync_articles import _db_hashes
+    ia.bulk_upsert([art("a"), art("b")])
+    with articles_db.begin() as conn:
+        conn.exec_driver_sql("UPDATE articles SET content_hash = NULL WHERE slug = 'b'")
+    stmts = []
+    from sqlalchemy import event
+    listen = lambda *a: stmts.append(a[2])  # noqa: E731
+    event.listen(articles_db, "before_cursor_execute", listen)
+    try:
+        with articles_db.connect() as conn:
+            hashes = _db_hashes(conn, ia._articles_table(articles_db))
+    finally:
+        event.remove(articles_db, "before_cursor_execute", listen)
+    assert hashes["b"] == ia.content_hash(art("b")) and hashes["a"] == ia.content_hash(art("a"))
+    assert "text" not in stmts[0] and "content_hash IS NULL" in stmts[1]
+
+def test_add_column_is_idempotent(tmp_path):
+    from sqlalchemy import create_engine
+    engine = create_engine("sqlite:///" + str(tmp_path / "old.db"))
+    assert add_column(engine) is False  # таблицы ещё нет
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE articles (id INTEGER PRIMARY KEY, slug VARCHAR(255) UNIQUE, "
+                             "title VARCHAR(500), text TEXT, section VARCHAR(20), tags TEXT, created_at DATETIME)")
+    assert add_column(engine) is True
+    assert column_exists(engine, "articles", "content_hash")
+    assert add_column(engine) is False
@@ -0,0 +1,59 @@
+# tests/test_textproc.py
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from scripts import textproc as tp
+from scripts import bench_text as ref  # прежние регулярки из app.py
+
+HERO = '<figure class="article-hero"><img src="data:image/png;base64,AAAA" alt="x"/><figcaption>подпись</figcaption></figure>'
+
+@pytest.fixture(scope="module")
+def corpus():
+    return ref.inputs(seed=3, figure_px=32)
+
+@pytest.mark.parametrize("name,old,new,keys", ref.CASES, ids=[c[0] for c in ref.CASES])
+def test_matches_legacy_helpers(corpus, name, old, new, keys):
+    for key in keys:
+        assert new(corpus[key]) == old(corpus[key]), key
+
+def test_strip_html_matches_legacy_on_fuzz():
+    rnd = random.Random(0)
+    alphabet = ["<", ">", "a", " ", "\n", "<p>", "</p>", HERO, "</figure>", "&amp;", "&laquo;", "б", '"', "<br/>"]
+    for _ in range(5000):
+        s = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 12)))
+        assert tp.strip_html(s) == ref.ref_strip_html(s), s
+
+def test_strip_html_limit_is_a_prefix():
+    html = "<p>" + "слово " * 500 + "</p><p>ещё &amp; ещё</p>"
+    full = tp.strip_html(html)
+    for limit in (1, 10, 100, 2000):
+        cut = tp.strip_html(html, limit=limit)
+        assert len(cut) >= min(limit, len(full)) and full.startswith(cut)
+
+def test_teaser_skips_hero_and_cuts_on_word():
+    html = HERO + "<p>" + "длинный текст " * 40 + "</p>"
+    t = tp.make_teaser(html, 50)
+    assert t.endswith("…") and "подпись" not in t and len(t) <= 51
+    assert tp.teaser_source_text('<figure class="inline"><figcaption>подпись</figcaption></figure>') == "подпись"
+
+def test_teaser_divergence_on_stray_lt_is_documented():
+    s = "<p>a</p> 1<2 " + HERO + " d"
+    assert ref.ref_teaser_source_text(s) == "a 1<2 d"
+    assert tp.teaser_source_text(s) == "a 1 подпись d"
+
+def test_ensure_html():
+    assert tp.ensure_html("") == ""
+    assert tp.ensure_html("<p>уже html</p>") == "<p>уже html</p>"
+    assert tp.ensure_html("абзац один\n\n- пункт\n- второй") == "<p>абзац один</p>\n<ul>\n<li>пункт</li>\n<li>второй</li>\n</ul>"
+    assert tp.ensure_html("a < b") == "<p>a &lt; b</p>"
+
+@pytest.mark.parametrize("title,slug", [
+    ("Щедрый Цифровой рубль: ЁЖИК", "shchedryi-tsifrovoi-rubl-ezhik"),
+    ("  --Hello, World!--  ", "hello-world"),
+    ("!!!", "article"),
+    ("", "article"),
+])
+def test_slugify(title, slug):
+    assert tp.slugify(title) == slug == ref.ref_slugify(title)